@@ -1,91 +1,73 @@
-import math
 import os
-from PIL import Image, ImageDraw, ImageFont
-
-from utilities import PaperSize
-
-# Specify directory locations
-asset_directory = 'assets'
-
-for paper_size in PaperSize:
-    base_filename = f'{paper_size.value}_blank.jpg'
-    base_path = os.path.join(asset_directory, base_filename)
-
-    # Load a base page
-    with Image.open(base_path) as im:
-        font = ImageFont.truetype(os.path.join(asset_directory, 'arial.ttf'), 40)
-        coord_font = ImageFont.truetype(os.path.join(asset_directory, 'arial.ttf'), 25)
-        
-        print_width = im.width
-        print_height = im.height
-        
-        if print_height > print_width:
-            im = im.rotate(90, expand=True)
-            print_width = im.width
-            print_height = im.height
-            
-        front_image = im.copy()
-        front_draw = ImageDraw.Draw(front_image)
-        front_draw.text((print_width - 180, print_height - 180), 'front', fill=(0, 0, 0), anchor="ra", font=font)
-
-        back_image = im.copy()
-        back_draw = ImageDraw.Draw(back_image)
-        back_draw.text((print_width - 180, print_height - 180), 'back', fill=(0, 0, 0), anchor="ra", font=font)
-
-        test_size = 25
-        test_half_size = math.floor(test_size / 2)
-        test_distance = 75
-
-        matrix_size_x = math.floor(print_width / (test_size + test_distance)) - 6
-        matrix_half_size_x = math.floor(matrix_size_x / 2)
-        
-        matrix_size_y = math.floor(print_height / (test_size + test_distance)) - 6
-        matrix_half_size_y = math.floor(matrix_size_y / 2)
-
-
-        start_x = 0
-        if matrix_size_x % 2 > 0:
-            start_x = math.floor(print_width / 2) - (matrix_half_size_x * test_distance) - ((matrix_half_size_x + .5) * test_size)
-        else:
-            if matrix_size_x <= 0:
-                raise Exception(f'matrix_size must be greater than 0; received: {matrix_size_x}')
-            start_x = math.floor(print_width / 2) - ((matrix_half_size_x - .5) * test_distance) - (matrix_half_size_x * test_size)
-
-        start_y = 0
-        if matrix_size_y % 2 > 0:
-            start_y = math.floor(print_height / 2) - (matrix_half_size_y * test_distance) - ((matrix_half_size_y + .5) * test_size)
-        else:
-            if matrix_size_y <= 0:
-                raise Exception(f'matrix_size must be greater than 0; received: {matrix_size_y}')
-            start_y = math.floor(print_height / 2) - ((matrix_half_size_y - .5) * test_distance) - (matrix_half_size_y * test_size)
-
-
-        front_draw = ImageDraw.Draw(front_image)
-        back_draw = ImageDraw.Draw(back_image)
-
-        for x_index in range(matrix_size_x):
-            for y_index in range(matrix_size_y):
-                offset_x = x_index * (test_distance + test_size)
-                offset_y = y_index * (test_distance + test_size)
-
-                front_element_x = start_x + offset_x
-                front_element_y = start_y + offset_y
-                front_shape = [(front_element_x, front_element_y), (front_element_x + test_size, front_element_y + test_size)]
-                
-                fill="black"
-                if x_index == matrix_half_size_x or y_index == matrix_half_size_y:
-                    fill="blue"
-
-                front_draw.rectangle(front_shape, fill=fill)
-
-                back_element_x = front_element_x + x_index - matrix_half_size_x
-                back_element_y = front_element_y + y_index - matrix_half_size_y
-                back_shape = [(back_element_x, back_element_y), (back_element_x + test_size, back_element_y + test_size)]
-
-                back_draw.rectangle(back_shape, fill=fill)
-                
-                back_draw.text((back_element_x + test_half_size, back_element_y + test_half_size + 30), f'({x_index - matrix_half_size_x}, {y_index - matrix_half_size_y})', fill="red", anchor="mm", font=coord_font)
-
-        card_list = [front_image, back_image]
-        pdf_path = os.path.join("calibration", f"{paper_size.value}_calibration.pdf")
-        card_list[0].save(pdf_path, save_all=True, append_images=card_list[1:], resolution=300, speed=0, subsampling=0, quality=100)
\ No newline at end of file
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import click
+
+from utilities import PaperSize, PdfPageWriter, ShapePage, ShapeText, get_calibration_grid, get_calibration_page_size
+
+output_directory = 'calibration'
+
+black = (0.0, 0.0, 0.0)
+blue = (0.0, 0.0, 1.0)
+red = (1.0, 0.0, 0.0)
+
+def get_calibration_pages(paper_size: PaperSize, ppi: int = 300, step: float = 1) -> tuple[ShapePage, ShapePage]:
+    """
+    Lay out the front and back pages of a calibration sheet. The squares on the back page are moved by their label,
+    in steps of `step` pixels at 300 PPI.
+    """
+    page_width, page_height = get_calibration_page_size(paper_size)
+    grid = get_calibration_grid(page_width, page_height, step=step, ppi=ppi)
+    square_size = grid.square_size
+
+    front_rects = []
+    back_rects = []
+    labels = []
+    for square in grid.squares:
+        color = blue if square.center else black
+        front_rects.append(((square.x, square.y, square.x + square_size, square.y + square_size), color))
+
+        back_x, back_y = square.x + square.x_offset, square.y + square.y_offset
+        back_rects.append(((back_x, back_y, back_x + square_size, back_y + square_size), color))
+
+        labels.append(ShapeText(f'({square.x_offset:g}, {square.y_offset:g})', back_x + square_size / 2, back_y + square_size / 2 + 30, 25, red, 'mm'))
+
+    front_page = ShapePage((page_width, page_height), front_rects, [ShapeText('front', page_width - 180, page_height - 180, 40, black, 'ra')])
+    back_page = ShapePage((page_width, page_height), back_rects, labels + [ShapeText('back', page_width - 180, page_height - 180, 40, black, 'ra')])
+    return front_page, back_page
+
+def create_calibration_pdf(paper_size: PaperSize, ppi: int = 300, step: float = 1, output_dir: str = output_directory) -> str:
+    pdf_path = os.path.join(output_dir, f'{paper_size.value}_calibration.pdf')
+
+    with PdfPageWriter(pdf_path, 300, 100) as page_writer:
+        for page in get_calibration_pages(paper_size, ppi, step):
+            page_writer.add_page(page)
+
+    return pdf_path
+
+@click.command()
+@click.option("--paper_size", "paper_sizes", multiple=True, type=click.Choice([t.value for t in PaperSize], case_sensitive=False), help="The paper size of the calibration sheet. Can be given several times. Defaults to every paper size.")
+@click.option("--ppi", default=300, type=click.IntRange(min=1), show_default=True, help="Pixels per inch (PPI) of the printer. Squares are placed on whole printer dots.")
+@click.option("--step", default=1, type=click.FloatRange(min=0, min_open=True), show_default=True, help="How many pixels at 300 PPI each back square is moved more than its neighbor. Use fractions of a pixel with a higher --ppi.")
+@click.option("--output_dir", default=output_directory, type=click.Path(file_okay=False), show_default=True, help="The directory to write the calibration sheets to.")
+@click.option("--workers", default=1, type=click.IntRange(min=1), show_default=True, help="The number of processes used to create calibration sheets in parallel.")
+
+def cli(paper_sizes, ppi, step, output_dir, workers):
+    selected_paper_sizes = [PaperSize(paper_size) for paper_size in paper_sizes] or list(PaperSize)
+    os.makedirs(output_dir, exist_ok=True)
+
+    create_pdf = partial(create_calibration_pdf, ppi=ppi, step=step, output_dir=output_dir)
+
+    # Do not start more workers than there are sheets
+    workers = min(workers, len(selected_paper_sizes))
+    if workers <= 1:
+        for pdf_path in map(create_pdf, selected_paper_sizes):
+            print(f'Generated calibration sheet: {pdf_path}')
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for pdf_path in executor.map(create_pdf, selected_paper_sizes):
+            print(f'Generated calibration sheet: {pdf_path}')
+
+if __name__ == '__main__':
+    cli()
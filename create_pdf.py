@@ -2,7 +2,7 @@ import os
 import re
 
 import click
-from utilities import Registration, CardSize, PaperSize, generate_pdf
+from utilities import Registration, CardSize, PaperSize, Resample, generate_pdf
 
 front_directory = os.path.join('game', 'front')
 back_directory = os.path.join('game', 'back')
@@ -12,9 +12,9 @@ output_directory = os.path.join('game', 'output')
 default_output_path = os.path.join(output_directory, 'game.pdf')
 
 @click.command()
-@click.option("--front_dir_path", default=front_directory, show_default=True, help="The path to the directory containing the card fronts.")
-@click.option("--back_dir_path", default=back_directory, show_default=True, help="The path to the directory containing one or more card backs.")
-@click.option("--double_sided_dir_path", default=double_sided_directory, show_default=True, help="The path to the directory containing card backs for double-sided cards.")
+@click.option("--front_dir_path", default=front_directory, show_default=True, help="The path to the directory containing the card fronts. Can be a zip or tar archive, or a directory in one such as deck.zip!/front.")
+@click.option("--back_dir_path", default=back_directory, show_default=True, help="The path to the directory containing one or more card backs. Can be in an archive like the card fronts.")
+@click.option("--double_sided_dir_path", default=double_sided_directory, show_default=True, help="The path to the directory containing card backs for double-sided cards. Can be in an archive like the card fronts.")
 @click.option("--output_path", default=default_output_path, show_default=True, help="The desired path to the output PDF.")
 @click.option("--output_images", default=False, is_flag=True, help="Create images instead of a PDF.")
 @click.option("--card_size", default=CardSize.STANDARD.value, type=click.Choice([t.value for t in CardSize], case_sensitive=False), show_default=True, help="The desired card size.")
@@ -26,9 +26,22 @@ default_output_path = os.path.join(output_directory, 'game.pdf')
 @click.option("--extend_corners", default=0, type=click.IntRange(min=0), show_default=True, help="Reduce artifacts produced by rounded corners in card images.")
 @click.option("--ppi", default=300, type=click.IntRange(min=0), show_default=True, help="Pixels per inch (PPI) when creating PDF.")
 @click.option("--quality", default=75, type=click.IntRange(min=0, max=100), show_default=True, help="File compression. A higher value corresponds to better quality and larger file size.")
+@click.option("--resample", default=Resample.STANDARD.value, type=click.Choice([t.value for t in Resample], case_sensitive=False), show_default=True, help="The trade-off between speed and quality when scaling card images.")
 @click.option("--load_offset", default=False, is_flag=True, help="Apply saved offsets. See `offset_pdf.py` for more information.")
 @click.option("--skip", type=click.IntRange(min=0), multiple=True, help="Skip a card based on its index. Useful for registration issues. Examples: 0, 4.")
 @click.option("--name", help="Label each page of the PDF with a name.")
+@click.option("--workers", default=1, type=click.IntRange(min=1), show_default=True, help="The number of processes used to render sheets in parallel.")
+@click.option("--prefetch", default=2, type=click.IntRange(min=0), show_default=True, help="The number of sheets to load ahead while the current sheet is drawn.")
+@click.option("--strip_height", default=0, type=click.IntRange(min=0), show_default=True, help="Draw pages in strips of this many pixels to limit memory use at high PPI. 0 draws whole pages.")
+@click.option("--vector", default=False, is_flag=True, help="Store every unique card image once in the PDF and place it on the pages, instead of storing an image of every page.")
+@click.option("--shard", help="Only render one part of the sheets, such as 2/4 for the second of four parts. Combine the parts with merge_pdf.py.")
+@click.option("--manifest", type=click.Path(exists=True, dir_okay=False), help="Use the card images listed in a JSON manifest with their quantities, instead of the front and double-sided image directories.")
+@click.option("--sheets", help="Only render these sheets of the full PDF. Examples: 3, 7-9, 1,4-5.")
+@click.option("--cards", multiple=True, help="Only render these cards, by filename or pattern, in their usual slots. Examples: 000101.png, 000101, \"*dragon*\".")
+@click.option("--repack", default=False, is_flag=True, help="Place the cards chosen with --sheets or --cards on as few new sheets as possible.")
+@click.option("--plan", type=click.Path(dir_okay=False), help="Write which card goes in which slot of which sheet to this JSON file, without loading any images or creating the PDF.")
+@click.option("--incremental", default=False, is_flag=True, help="Keep the pages next to the output and only render the sheets whose images or options changed since the last run.")
+@click.option("--tile_cache", default=False, is_flag=True, help="Keep scaled card images in data/tile_cache so later runs can skip decoding and resizing them.")
 @click.version_option("1.7.0")
 
 def cli(
@@ -48,7 +61,20 @@ def cli(
     quality,
     skip,
     load_offset,
-    name
+    name,
+    workers,
+    tile_cache,
+    resample,
+    prefetch,
+    strip_height,
+    vector,
+    shard,
+    manifest,
+    incremental,
+    sheets,
+    cards,
+    repack,
+    plan
 ):
     generate_pdf(
         front_dir_path,
@@ -67,7 +93,20 @@ def cli(
         quality,
         skip,
         load_offset,
-        name
+        name,
+        workers,
+        tile_cache,
+        resample,
+        prefetch,
+        strip_height,
+        vector,
+        shard,
+        manifest,
+        incremental,
+        sheets,
+        cards,
+        repack,
+        plan
     )
 
 if __name__ == '__main__':
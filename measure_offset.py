@@ -0,0 +1,359 @@
+import math
+from typing import Callable, List, NamedTuple
+import click
+import numpy as np
+from PIL import Image, ImageOps
+
+from utilities import CalibrationGrid, OffsetData, PaperSize, get_calibration_grid, get_calibration_page_size, save_offset
+
+class Blob(NamedTuple):
+    area: int
+    # Center of the blob, where pixel (0, 0) covers the area from (0, 0) to (1, 1)
+    x: float
+    y: float
+    width: int
+    height: int
+
+def find_blobs(mask: np.ndarray) -> List[Blob]:
+    """
+    Find the connected areas of a mask by joining the runs of each row with the overlapping runs of the row above.
+    """
+    parents: List[int] = []
+    stats: List[List[float]] = []
+
+    def find_root(label: int) -> int:
+        while parents[label] != label:
+            parents[label] = parents[parents[label]]
+            label = parents[label]
+        return label
+
+    previous_runs: List[tuple[int, int, int]] = []
+    for y in range(mask.shape[0]):
+        edges = np.diff(np.concatenate(([0], mask[y].view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        runs = []
+        first_previous = 0
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            # Runs of the row above that end before this run starts cannot touch any later run either
+            while first_previous < len(previous_runs) and previous_runs[first_previous][1] <= start:
+                first_previous += 1
+
+            label = None
+            i = first_previous
+            while i < len(previous_runs) and previous_runs[i][0] < end:
+                previous_label = find_root(previous_runs[i][2])
+                if label is None:
+                    label = previous_label
+                elif previous_label != label:
+                    parents[previous_label] = label
+                i += 1
+
+            if label is None:
+                label = len(parents)
+                parents.append(label)
+                stats.append([0, 0.0, 0.0, start, y, end, y + 1])
+
+            # Area, sums of the pixel centers and bounding box
+            length = end - start
+            run_stats = stats[label]
+            run_stats[0] += length
+            run_stats[1] += (start + end) / 2 * length
+            run_stats[2] += (y + 0.5) * length
+            run_stats[3] = min(run_stats[3], start)
+            run_stats[5] = max(run_stats[5], end)
+            run_stats[6] = y + 1
+
+            runs.append((start, end, label))
+
+        previous_runs = runs
+
+    # Combine the stats of runs that were joined after they were counted
+    blob_stats: dict[int, List[float]] = {}
+    for label, (area, sum_x, sum_y, left, top, right, bottom) in enumerate(stats):
+        if area == 0:
+            continue
+
+        root = find_root(label)
+        if root not in blob_stats:
+            blob_stats[root] = [area, sum_x, sum_y, left, top, right, bottom]
+        else:
+            root_stats = blob_stats[root]
+            root_stats[0] += area
+            root_stats[1] += sum_x
+            root_stats[2] += sum_y
+            root_stats[3] = min(root_stats[3], left)
+            root_stats[4] = min(root_stats[4], top)
+            root_stats[5] = max(root_stats[5], right)
+            root_stats[6] = max(root_stats[6], bottom)
+
+    return [
+        Blob(int(area), sum_x / area, sum_y / area, int(right - left), int(bottom - top))
+        for area, sum_x, sum_y, left, top, right, bottom in blob_stats.values()
+    ]
+
+def fit_transform(source: np.ndarray, target: np.ndarray, allow_scale: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the rotation, uniform scale and translation that best map the source points to the target points.
+
+    Returns the matrix and translation, so that target = source @ matrix.T + translation.
+    """
+    source_mean = source.mean(axis=0)
+    target_mean = target.mean(axis=0)
+    centered_source = source - source_mean
+    centered_target = target - target_mean
+
+    # The rotation that minimizes the squared distances, from the dot and cross products of the centered points
+    dot = (centered_source * centered_target).sum()
+    cross = (centered_source[:, 0] * centered_target[:, 1] - centered_source[:, 1] * centered_target[:, 0]).sum()
+    angle = math.atan2(cross, dot)
+    cos, sin = math.cos(angle), math.sin(angle)
+
+    scale = 1.0
+    if allow_scale:
+        scale = (dot * cos + cross * sin) / (centered_source ** 2).sum()
+
+    matrix = scale * np.array([[cos, -sin], [sin, cos]])
+    return matrix, target_mean - source_mean @ matrix.T
+
+def get_scan_channels(scan_path: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Load a scan as how dark every pixel is compared to the paper, and where the ink of the squares, the blue squares and the red labels are.
+    """
+    with Image.open(scan_path) as scan_image:
+        scan_image = ImageOps.exif_transpose(scan_image).convert('RGB')
+        red, green, blue = (np.asarray(channel, dtype=np.float32) for channel in scan_image.split())
+
+    # The red channel hides the red labels and shows the blue squares as dark as the black ones
+    paper = max(float(np.percentile(red, 95)), 1.0)
+    darkness = np.clip(1 - red / paper, 0, 1)
+
+    ink = darkness > 0.5
+    labels = (red - green) / paper > 0.25
+    blue_squares = ink & ((blue - red) / paper > 0.25)
+
+    return darkness, ink, blue_squares, labels
+
+def grow_mask(mask: np.ndarray, pixels: int) -> np.ndarray:
+    grown_mask = mask.copy()
+    for _ in range(pixels):
+        previous_mask = grown_mask.copy()
+        grown_mask[1:, :] |= previous_mask[:-1, :]
+        grown_mask[:-1, :] |= previous_mask[1:, :]
+        grown_mask[:, 1:] |= previous_mask[:, :-1]
+        grown_mask[:, :-1] |= previous_mask[:, 1:]
+
+    return grown_mask
+
+def locate_back_squares(ink: np.ndarray, blue_squares: np.ndarray, labels: np.ndarray, grid: CalibrationGrid) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the squares printed on the back page and fit where the back page is in the scan.
+
+    Returns the matrix and translation from the back page, in pixels at 300 PPI, to the scan.
+    """
+    # Squares are about as wide as they are high and fill most of their bounding box
+    blobs = [
+        blob for blob in find_blobs(ink)
+        if blob.area >= 16 and 0.7 < blob.width / blob.height < 1.4 and blob.area > 0.7 * blob.width * blob.height
+    ]
+    if len(blobs) == 0:
+        raise Exception('Cannot find any calibration squares in the scan.')
+
+    median_area = float(np.median([blob.area for blob in blobs]))
+    blobs = [blob for blob in blobs if 0.6 * median_area < blob.area < 1.5 * median_area]
+    if len(blobs) < len(grid.squares) // 2:
+        raise Exception(f'Cannot find the calibration squares in the scan, only found {len(blobs)} of {len(grid.squares)}.')
+
+    points = np.array([(blob.x, blob.y) for blob in blobs])
+    is_blue = np.array([blue_squares[min(int(blob.y), blue_squares.shape[0] - 1), min(int(blob.x), blue_squares.shape[1] - 1)] for blob in blobs])
+    if not is_blue.any():
+        raise Exception('Cannot find the blue squares in the middle of the calibration sheet.')
+
+    # The direction and spacing of the grid, from the nearest neighbor of every square
+    distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=2)
+    np.fill_diagonal(distances, np.inf)
+    neighbor_vectors = points[distances.argmin(axis=1)] - points
+    spacing = float(np.median(distances.min(axis=1)))
+    grid_angle = np.angle(np.exp(4j * np.arctan2(neighbor_vectors[:, 1], neighbor_vectors[:, 0])).mean()) / 4
+
+    # Count squares along the grid from the middle row and column, which are blue
+    cos, sin = math.cos(grid_angle), math.sin(grid_angle)
+    columns = np.rint(((points[:, 0] - points[0, 0]) * cos + (points[:, 1] - points[0, 1]) * sin) / spacing).astype(int)
+    rows = np.rint((-(points[:, 0] - points[0, 0]) * sin + (points[:, 1] - points[0, 1]) * cos) / spacing).astype(int)
+    middle_column = np.bincount(columns[is_blue] - columns.min()).argmax() + columns.min()
+    middle_row = np.bincount(rows[is_blue] - rows.min()).argmax() + rows.min()
+
+    squares = {(square.column, square.row): square for square in grid.squares}
+
+    # The labels are printed below the squares, which tells a scan from one turned upside down, as the squares alone line up either way
+    label_area = np.array([(x, y) for x in range(-24, 25, 4) for y in range(24, 37, 4)])
+
+    # The scan can be turned any way, so try every quarter turn and keep the fit that finds the labels
+    best_fit = None
+    for quarter_turns in range(4):
+        square_columns, square_rows = columns - middle_column, rows - middle_row
+        for _ in range(quarter_turns):
+            square_columns, square_rows = square_rows, -square_columns
+
+        matched = [i for i in range(len(points)) if (square_columns[i], square_rows[i]) in squares]
+        if len(matched) < len(grid.squares) // 2:
+            continue
+
+        # Squares on the back page are moved by their label
+        matched_squares = [squares[(square_columns[i], square_rows[i])] for i in matched]
+        back_centers = np.array([
+            (square.x + square.x_offset + grid.square_size / 2, square.y + square.y_offset + grid.square_size / 2)
+            for square in matched_squares
+        ])
+
+        matrix, translation = fit_transform(back_centers, points[matched])
+
+        # How far the squares are from the fit, in pixels at 300 PPI
+        error = float(np.sqrt(((back_centers @ matrix.T + translation - points[matched]) ** 2).sum(axis=1).mean() / abs(np.linalg.det(matrix))))
+        if error > grid.square_size / 4:
+            continue
+
+        label_points = np.rint((back_centers[:, None, :] + label_area).reshape(-1, 2) @ matrix.T + translation).astype(int)
+        inside = (label_points[:, 0] >= 0) & (label_points[:, 0] < labels.shape[1]) & (label_points[:, 1] >= 0) & (label_points[:, 1] < labels.shape[0])
+        label_coverage = labels[label_points[inside, 1], label_points[inside, 0]].sum() / len(label_points)
+        if best_fit is None or label_coverage > best_fit[0]:
+            best_fit = (label_coverage, matrix, translation)
+
+    if best_fit is None:
+        raise Exception('Cannot match the squares in the scan to the calibration sheet. Check that the paper size is right.')
+
+    _, matrix, translation = best_fit
+    return matrix, translation
+
+def sample_integral(integral: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """
+    Get the sum of the pixels above and to the left of fractional positions, by interpolating a summed-area table.
+    """
+    x = np.clip(x, 0, integral.shape[1] - 1)
+    y = np.clip(y, 0, integral.shape[0] - 1)
+    left = np.minimum(np.floor(x).astype(int), integral.shape[1] - 2)
+    top = np.minimum(np.floor(y).astype(int), integral.shape[0] - 2)
+    x_weight = x - left
+    y_weight = y - top
+
+    upper = integral[top, left] * (1 - x_weight) + integral[top, left + 1] * x_weight
+    lower = integral[top + 1, left] * (1 - x_weight) + integral[top + 1, left + 1] * x_weight
+    return upper * (1 - y_weight) + lower * y_weight
+
+def get_box_sums(integral: np.ndarray, left: np.ndarray, top: np.ndarray, right: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    return sample_integral(integral, right, bottom) - sample_integral(integral, right, top) - sample_integral(integral, left, bottom) + sample_integral(integral, left, top)
+
+def find_peak(score: Callable[[float], float], start: float, distance: float, step: float, side_samples: int) -> float:
+    """
+    Find the top of a pointed peak of a score around `start`, where lines through the samples on either side of the highest
+    sample meet. The samples next to the highest one are left out, as the top of the peak is rounded.
+    """
+    positions = np.arange(start - distance, start + distance + step / 2, step)
+    scores = np.array([score(position) for position in positions])
+
+    peak = int(scores.argmax())
+    if peak < side_samples + 1 or peak >= len(positions) - side_samples - 1:
+        return float(positions[peak])
+
+    left = slice(peak - side_samples - 1, peak - 1)
+    right = slice(peak + 2, peak + side_samples + 2)
+    left_slope, left_intercept = np.polyfit(positions[left], scores[left], 1)
+    right_slope, right_intercept = np.polyfit(positions[right], scores[right], 1)
+    if left_slope <= right_slope:
+        return float(positions[peak])
+
+    top = (right_intercept - left_intercept) / (left_slope - right_slope)
+    return float(np.clip(top, positions[peak - 1], positions[peak + 1]))
+
+def measure_offset(scan_path: str, paper_size: PaperSize, step: float = 1, ppi: int = 300) -> OffsetData:
+    """
+    Measure the offset of the back page from a scan of the back of a printed calibration sheet, lit from the front
+    so that the squares of the front page show through.
+
+    `step` and `ppi` must match the options the calibration sheet was created with.
+    """
+    page_width, page_height = get_calibration_page_size(paper_size)
+    grid = get_calibration_grid(page_width, page_height, step=step, ppi=ppi)
+
+    darkness, ink, blue_squares, labels = get_scan_channels(scan_path)
+    matrix, translation = locate_back_squares(ink, blue_squares, labels, grid)
+
+    # Only the parts of the front squares that are not behind the ink of the back page can be seen, leaving out blurry edges
+    visible = ~grow_mask(ink | labels, 2)
+
+    visible_integral = np.pad(visible.astype(np.float64).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    darkness_integral = np.pad((darkness * visible).astype(np.float64).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+
+    # The front page is seen mirrored through the paper, which moves the squares when the grid is not exactly centered
+    front_centers = np.array([(page_width - square.x - grid.square_size / 2, square.y + grid.square_size / 2) for square in grid.squares])
+    page_center = np.array([page_width / 2, page_height / 2])
+    half_size = grid.square_size / 2 * math.sqrt(abs(np.linalg.det(matrix)))
+
+    def get_front_boxes(x_offset: float, y_offset: float, angle_offset: float) -> tuple[np.ndarray, ...]:
+        angle = math.radians(angle_offset)
+        rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+        centers = ((front_centers - page_center) @ rotation.T + page_center + (x_offset, y_offset)) @ matrix.T + translation
+
+        left, top = (centers - half_size).T
+        right, bottom = (centers + half_size).T
+        return left, top, right, bottom
+
+    def score(x_offset: float, y_offset: float, angle_offset: float) -> float:
+        """
+        How dark the visible parts of the front squares are if the front page is at this offset from the back page.
+        """
+        left, top, right, bottom = get_front_boxes(x_offset, y_offset, angle_offset)
+        visible_area = get_box_sums(visible_integral, left, top, right, bottom).sum()
+        if visible_area <= 0:
+            return 0.0
+
+        return get_box_sums(darkness_integral, left, top, right, bottom).sum() / visible_area
+
+    # Search the whole space between squares without rotation, then narrow down the rotation and offset
+    search_distance = 50
+    candidates = [(x, y, 0.0) for x in range(-search_distance, search_distance + 1, 2) for y in range(-search_distance, search_distance + 1, 2)]
+    x, y, angle_offset = max(candidates, key=lambda candidate: score(*candidate))
+
+    candidates = [(x + dx, y + dy, angle / 20) for dx in range(-2, 3) for dy in range(-2, 3) for angle in range(-40, 41)]
+    x, y, angle_offset = max(candidates, key=lambda candidate: score(*candidate))
+
+    # Without squares showing through, the darkest offset is no darker than the paper between the squares
+    background = score(x + search_distance, y + search_distance, angle_offset)
+    if score(x, y, angle_offset) - background < 0.02:
+        raise Exception('Cannot see the squares of the front page in the scan. Light the front of the sheet so the squares show through.')
+
+    # The match falls off on either side of the right offset, so find where it peaks, one value at a time until they settle
+    for _ in range(10):
+        previous = (x, y, angle_offset)
+        x = find_peak(lambda position: score(position, y, angle_offset), x, 6, 0.25, 12)
+        y = find_peak(lambda position: score(x, position, angle_offset), y, 6, 0.25, 12)
+        angle_offset = find_peak(lambda position: score(x, y, position), angle_offset, 0.15, 0.01, 8)
+
+        if abs(x - previous[0]) < 0.1 and abs(y - previous[1]) < 0.1 and abs(angle_offset - previous[2]) < 0.005:
+            break
+
+    # offset_image() moves the page before rotating it about the center
+    angle = math.radians(angle_offset)
+    x_offset = x * math.cos(angle) + y * math.sin(angle)
+    y_offset = -x * math.sin(angle) + y * math.cos(angle)
+
+    # Adding zero turns a rounded -0.0 into 0.0
+    return OffsetData(x_offset=round(x_offset, 1) + 0.0, y_offset=round(y_offset, 1) + 0.0, angle_offset=round(angle_offset, 2) + 0.0)
+
+@click.command()
+@click.option("--scan_path", required=True, type=click.Path(exists=True, dir_okay=False), help="The path of a scan or photo of the back of a printed calibration sheet, lit from the front.")
+@click.option("--paper_size", default=PaperSize.LETTER.value, type=click.Choice([t.value for t in PaperSize], case_sensitive=False), show_default=True, help="The paper size of the calibration sheet.")
+@click.option("--ppi", default=300, type=click.IntRange(min=1), show_default=True, help="The --ppi the calibration sheet was created with.")
+@click.option("--step", default=1, type=click.FloatRange(min=0, min_open=True), show_default=True, help="The --step the calibration sheet was created with.")
+@click.option("-s", "--save", default=False, is_flag=True, help="Save the measured offset values.")
+
+def cli(scan_path, paper_size, ppi, step, save):
+    offset = measure_offset(scan_path, PaperSize(paper_size), step, ppi)
+    print(f'Measured x offset: {offset.x_offset}, y offset: {offset.y_offset}, angle offset: {offset.angle_offset}')
+
+    if save:
+        save_offset(offset.x_offset, offset.y_offset, offset.angle_offset)
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,57 @@
+import os
+import click
+import pypdfium2 as pdfium
+
+from utilities import parse_shard_keywords
+
+output_directory = os.path.join('game', 'output')
+default_output_pdf_path = os.path.join(output_directory, 'game.pdf')
+
+@click.command()
+@click.argument("shard_pdf_paths", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--output_pdf_path", default=default_output_pdf_path, show_default=True, help="The desired path of the merged PDF.")
+
+def merge_pdf(shard_pdf_paths, output_pdf_path):
+    # Read which sheets are in every shard
+    shards = []
+    for shard_pdf_path in shard_pdf_paths:
+        shard_pdf = pdfium.PdfDocument(shard_pdf_path)
+        shard_info = parse_shard_keywords(shard_pdf.get_metadata_dict().get('Keywords', ''))
+        if shard_info is None:
+            raise Exception(f'Cannot merge "{shard_pdf_path}" because it was not created with "--shard".')
+
+        shards.append((shard_info, shard_pdf_path, shard_pdf))
+
+    shards.sort(key=lambda shard: shard[0].first_sheet)
+
+    # The shards must cover every sheet exactly once
+    shard_count = shards[0][0].count
+    next_sheet = 1
+    for shard_info, shard_pdf_path, _ in shards:
+        if shard_info.count != shard_count:
+            raise Exception(f'Cannot merge "{shard_pdf_path}" because it is shard {shard_info.index}/{shard_info.count} and not one of {shard_count} shards.')
+
+        if shard_info.first_sheet < next_sheet:
+            raise Exception(f'Cannot merge "{shard_pdf_path}" because sheets {shard_info.first_sheet}-{shard_info.last_sheet} overlap another shard.')
+
+        if shard_info.first_sheet > next_sheet:
+            raise Exception(f'Cannot merge "{shard_pdf_path}" because sheets {next_sheet}-{shard_info.first_sheet - 1} are missing.')
+
+        next_sheet = shard_info.last_sheet + 1
+
+    # The last shard always has the last sheet
+    last_shard_info, last_shard_pdf_path, _ = shards[-1]
+    if last_shard_info.index != shard_count:
+        raise Exception(f'Cannot merge shards because the sheets after sheet {last_shard_info.last_sheet} in "{last_shard_pdf_path}" are missing.')
+
+    # Copy the pages without rendering them
+    merged_pdf = pdfium.PdfDocument.new()
+    for shard_info, shard_pdf_path, shard_pdf in shards:
+        print(f'Shard {shard_info.index}/{shard_info.count}: sheets {shard_info.first_sheet}-{shard_info.last_sheet} from "{shard_pdf_path}"')
+        merged_pdf.import_pages(shard_pdf)
+
+    merged_pdf.save(output_pdf_path)
+    print(f'Merged PDF: {output_pdf_path}')
+
+if __name__ == '__main__':
+    merge_pdf()
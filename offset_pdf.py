@@ -1,22 +1,136 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator
 import click
 import pypdfium2 as pdfium
+from PIL import Image
 
-from utilities import load_saved_offset, offset_images, save_offset
+from utilities import EncodedImage, PdfPageWriter, encode_image, get_offset_matrix, load_saved_offset, offset_image, save_offset, submit_in_order
 
 output_directory = os.path.join('game', 'output')
 default_output_pdf_path = os.path.join(output_directory, 'game.pdf')
 
+def get_page_pixel_size(page: pdfium.PdfPage, ppi: int) -> tuple[int, int]:
+    page_width, page_height = page.get_size()
+    return round(page_width * ppi / 72), round(page_height * ppi / 72)
+
+def render_page(page: pdfium.PdfPage, ppi: int) -> Image.Image:
+    # Rendering can round up to an extra row or column of pixels
+    return page.render(ppi/72).to_pil().crop((0, 0, *get_page_pixel_size(page, ppi)))
+
+def offset_pdf_vector(pdf: pdfium.PdfDocument, output_pdf_path: str, x_offset: float, y_offset: float, angle_offset: float = 0.0) -> None:
+    """
+    Offset the back pages by wrapping their content in a transform. Page content, including image streams, is copied as is.
+    """
+    output_pdf = pdfium.PdfDocument.new()
+
+    for page_number in range(len(pdf)):
+        print(f"Page {page_number + 1}")
+
+        # Front pages are copied as they are
+        if page_number % 2 == 0:
+            output_pdf.import_pages(pdf, [page_number])
+            continue
+
+        # Back pages become a form XObject drawn with the offset transform on a new page of the same size
+        page_width, page_height = pdf.get_page_size(page_number)
+        page_object = pdf.page_as_xobject(page_number, output_pdf).as_pageobject()
+        page_object.transform(pdfium.PdfMatrix(*get_offset_matrix(page_width, page_height, x_offset, y_offset, angle_offset)))
+
+        offset_page = output_pdf.new_page(page_width, page_height)
+        offset_page.insert_obj(page_object)
+        offset_page.gen_content()
+
+    output_pdf.save(output_pdf_path)
+
+# Each worker process renders from its own handle of the input PDF, since documents cannot be shared between processes
+_worker_pdf: pdfium.PdfDocument | None = None
+
+def _init_offset_worker(pdf_path: str):
+    global _worker_pdf
+    _worker_pdf = pdfium.PdfDocument(pdf_path)
+
+def render_offset_page(pdf: pdfium.PdfDocument, page_number: int, x_offset: float, y_offset: float, ppi: int, angle_offset: float = 0.0) -> EncodedImage:
+    """
+    Render a page at the given PPI, shift its pixels and compress it as a JPEG.
+    """
+    page = pdf.get_page(page_number)
+    try:
+        return encode_image(offset_image(render_page(page, ppi), x_offset, y_offset, ppi, angle_offset), 'DCTDecode', 100)
+    finally:
+        page.close()
+
+def _render_offset_page_in_worker(page_number: int, x_offset: float, y_offset: float, ppi: int, angle_offset: float) -> EncodedImage:
+    return render_offset_page(_worker_pdf, page_number, x_offset, y_offset, ppi, angle_offset)
+
+def render_offset_pages(
+    pdf: pdfium.PdfDocument,
+    pdf_path: str,
+    page_numbers: Iterable[int],
+    x_offset: float,
+    y_offset: float,
+    ppi: int,
+    angle_offset: float,
+    workers: int
+) -> Iterator[EncodedImage]:
+    """
+    Render and offset pages in order, either serially or with a pool of worker processes.
+    """
+    if workers <= 1:
+        for page_number in page_numbers:
+            yield render_offset_page(pdf, page_number, x_offset, y_offset, ppi, angle_offset)
+        return
+
+    render_page_in_worker = partial(_render_offset_page_in_worker, x_offset=x_offset, y_offset=y_offset, ppi=ppi, angle_offset=angle_offset)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_offset_worker, initargs=(pdf_path,)) as executor:
+        for _, page_jpeg in submit_in_order(executor, render_page_in_worker, page_numbers, 2 * workers):
+            yield page_jpeg
+
+def offset_pdf_raster(pdf: pdfium.PdfDocument, pdf_path: str, output_pdf_path: str, x_offset: float, y_offset: float, ppi: int, angle_offset: float = 0.0, workers: int = 1) -> None:
+    """
+    Offset the back pages by rendering them at the given PPI and shifting the pixels.
+
+    Only the back pages are rendered, and only a few of them are in flight at a time. Front pages are copied as they are.
+    Each back page is written to the output as soon as it is rendered, so the rendered pages are never all in memory.
+    """
+    # Copy the front pages and leave blank back pages of the same size to replace
+    output_pdf = pdfium.PdfDocument.new()
+    for page_number in range(len(pdf)):
+        if page_number % 2 == 0:
+            output_pdf.import_pages(pdf, [page_number])
+        else:
+            output_pdf.new_page(*pdf.get_page_size(page_number)).close()
+
+    output_pdf.save(output_pdf_path)
+    output_pdf.close()
+
+    # Do not start more workers than there are back pages
+    back_page_numbers = range(1, len(pdf), 2)
+    workers = min(workers, len(back_page_numbers))
+    back_page_jpegs = render_offset_pages(pdf, pdf_path, back_page_numbers, x_offset, y_offset, ppi, angle_offset, workers)
+
+    with PdfPageWriter(output_pdf_path, ppi, 100, append=True) as page_writer:
+        for page_number in range(len(pdf)):
+            print(f"Page {page_number + 1}")
+
+            if page_number % 2 == 1:
+                page_writer.add_page(next(back_page_jpegs), page_index=page_number)
+
+    back_page_jpegs.close()
+
 @click.command()
 @click.option("--pdf_path", default=default_output_pdf_path, help="The path of the input PDF.")
 @click.option("--output_pdf_path", help="The desired path of the offset PDF.")
-@click.option("-x", "--x_offset", type=int, help="The desired offset in the x-axis.")
-@click.option("-y", "--y_offset", type=int, help="The desired offset in the y-axis.")
+@click.option("-x", "--x_offset", type=float, help="The desired offset in the x-axis, in pixels at 300 PPI.")
+@click.option("-y", "--y_offset", type=float, help="The desired offset in the y-axis, in pixels at 300 PPI.")
 @click.option("-a", "--angle", type=float, help="The desired angle offset in degrees (positive = clockwise).")
 @click.option("-s", "--save", default=False, is_flag=True, help="Save the offset values.")
-@click.option("--ppi", default=300, type=click.IntRange(min=0), show_default=True, help="Pixels per inch (PPI) when creating PDF.")
+@click.option("--raster", default=False, is_flag=True, help="Render the back pages to images and shift the pixels instead of transforming the page content.")
+@click.option("--ppi", default=300, type=click.IntRange(min=0), show_default=True, help="Pixels per inch (PPI) when rendering pages with --raster.")
+@click.option("--workers", default=1, type=click.IntRange(min=1), show_default=True, help="The number of processes used to render pages in parallel with --raster.")
 
-def offset_pdf(pdf_path, output_pdf_path, x_offset, y_offset, angle, save, ppi):
+def offset_pdf(pdf_path, output_pdf_path, x_offset, y_offset, angle, save, raster, ppi, workers):
     new_x_offset = 0
     new_y_offset = 0
     new_angle_offset = 0.0
@@ -49,21 +163,15 @@ def offset_pdf(pdf_path, output_pdf_path, x_offset, y_offset, angle, save, ppi):
     try:
         pdf = pdfium.PdfDocument(pdf_path)
 
-        # Get all the raw page images from the PDF
-        raw_images = []
-        for page_number in range(len(pdf)):
-            print(f"Page {page_number + 1}")
-            page = pdf.get_page(page_number)
-            raw_images.append(page.render(ppi/72).to_pil())
-
-        # Offset images
-        final_images = offset_images(raw_images, new_x_offset, new_y_offset, ppi, new_angle_offset)
-
         # The default for output_pdf_path is the original path but with _offset.py appended to the end.
         if output_pdf_path is None:
             output_pdf_path = f'{pdf_path.removesuffix(".pdf")}_offset.pdf'
 
-        final_images[0].save(output_pdf_path, save_all=True, append_images=final_images[1:], resolution=ppi, speed=0, subsampling=0, quality=100)
+        if raster:
+            offset_pdf_raster(pdf, pdf_path, output_pdf_path, new_x_offset, new_y_offset, ppi, new_angle_offset, workers)
+        else:
+            offset_pdf_vector(pdf, output_pdf_path, new_x_offset, new_y_offset, new_angle_offset)
+
         print(f'Offset PDF: {output_pdf_path}')
     except FileNotFoundError as e:
         print(f"Cannot offset nonexistent PDF: {e}")
@@ -1,4 +1,27 @@
+import json
+import os
 import re
 
 def remove_nonalphanumeric(s: str) -> str:
-    return re.sub(r'[^\w]', '', s)
\ No newline at end of file
+    return re.sub(r'[^\w]', '', s)
+
+class CardManifest:
+    """
+    Records every unique card image with its quantity, so create_pdf.py --manifest can place the copies without a file per copy.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.cards = []
+
+    def add(self, front_path: str, back_path: str | None, quantity: int):
+        # Image paths are relative to the manifest
+        manifest_dir_path = os.path.dirname(os.path.abspath(self.path))
+        card = {'front': os.path.relpath(front_path, manifest_dir_path), 'quantity': quantity}
+        if back_path is not None:
+            card['back'] = os.path.relpath(back_path, manifest_dir_path)
+
+        self.cards.append(card)
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({'cards': self.cards}, manifest_file, indent=2)
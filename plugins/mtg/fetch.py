@@ -1,6 +1,7 @@
 import os
 
 import click
+from common import CardManifest
 from deck_formats import DeckFormat, parse_deck
 from scryfall import get_handle_card as scryfall_get_handle_card
 from mpcfill import get_handle_card as mpc_get_handle_card
@@ -19,6 +20,7 @@ double_sided_directory = os.path.join('game', 'double_sided')
 @click.option('--prefer_showcase', default=False, is_flag=True, show_default=True, help="Prefer fetching cards with showcase treatment")
 @click.option('--prefer_extra_art', default=False, is_flag=True, show_default=True, help="Prefer fetching cards with full art, borderless, or extended art.")
 @click.option('--tokens', default=False, is_flag=True, show_default=True, help="Fetch related tokens when fetching cards")
+@click.option('--manifest', help="Save one image per card and write the quantities to this JSON manifest for create_pdf.py --manifest.")
 
 def cli(
     deck_path: str,
@@ -30,16 +32,20 @@ def cli(
 
     prefer_showcase: bool,
     prefer_extra_art: bool,
-    tokens: bool
+    tokens: bool,
+    manifest: str | None
 ):
     if not os.path.isfile(deck_path) and not format == DeckFormat.URL:
         print(f'{deck_path} is not a valid file.')
         return
-    
+
+    card_manifest = CardManifest(manifest) if manifest is not None else None
+
     if format == DeckFormat.MPCFILL_XML:
         get_handle_card = mpc_get_handle_card(
             front_directory,
-            double_sided_directory
+            double_sided_directory,
+            card_manifest
         )
     else:
         get_handle_card = scryfall_get_handle_card(
@@ -53,21 +59,25 @@ def cli(
             tokens,
 
             front_directory,
-            double_sided_directory
+            double_sided_directory,
+            card_manifest
         )
 
     # If format is URL, skip reading file and pass URL as deck_text (deck_url for parse_url()).
     if format == DeckFormat.URL:
         parse_deck(deck_path, format, get_handle_card)
-        return
+    else:
+        with open(deck_path, 'r', encoding='utf-8') as deck_file:
+            deck_text = deck_file.read()
+            parse_deck(
+                deck_text,
+                format,
+                get_handle_card,
+            )
 
-    with open(deck_path, 'r', encoding='utf-8') as deck_file:
-        deck_text = deck_file.read()
-        parse_deck(
-            deck_text,
-            format,
-            get_handle_card,
-        )
+    if card_manifest is not None:
+        card_manifest.save()
+        print(f'Manifest: {manifest}')
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
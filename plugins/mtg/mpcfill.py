@@ -3,7 +3,7 @@ from base64 import b64decode
 import requests
 from filetype.filetype import guess_extension
 
-from common import remove_nonalphanumeric
+from common import CardManifest, remove_nonalphanumeric
 
 def request_mpcfill(card_id: str) -> requests.Response:
     base_url = "https://script.google.com/macros/s/AKfycbw8laScKBfxda2Wb0g63gkYDBdy8NWNxINoC4xDOwnCQ3JMFdruam1MdmNmN4wI5k4/exec?id="
@@ -24,35 +24,45 @@ def fetch_card(
         front_img_dir: str,
         double_sided_dir: str,
 
+        manifest: CardManifest | None = None
 ) -> None:
     card_art = request_mpcfill(card_id).content
 
     clean_card_name = remove_nonalphanumeric(name)
 
+    # A manifest records the quantity, so only one copy is saved
+    copies = quantity if manifest is None else 1
+
+    front_image_path = None
     if card_art is not None:
         card_art = b64decode(card_art)
         card_art_ext = guess_extension(card_art)
-        for counter in range(quantity):
-            image_path = os.path.join(front_img_dir, f'{str(index)}{clean_card_name}{str(counter + 1)}.{card_art_ext}')
+        for counter in range(copies):
+            front_image_path = os.path.join(front_img_dir, f'{str(index)}{clean_card_name}{str(counter + 1)}.{card_art_ext}')
 
-            with open(image_path, 'wb') as f:
+            with open(front_image_path, 'wb') as f:
                 f.write(card_art)
 
+    back_image_path = None
     if back_card_id:
         card_art = request_mpcfill(back_card_id).content
 
         if card_art is not None:
             card_art = b64decode(card_art)
             card_art_ext = guess_extension(card_art)
-            for counter in range(quantity):
-                image_path = os.path.join(double_sided_dir, f'{str(index)}{clean_card_name}{str(counter + 1)}.{card_art_ext}')
+            for counter in range(copies):
+                back_image_path = os.path.join(double_sided_dir, f'{str(index)}{clean_card_name}{str(counter + 1)}.{card_art_ext}')
 
-                with open(image_path, 'wb') as f:
+                with open(back_image_path, 'wb') as f:
                     f.write(card_art)
 
+    if manifest is not None and front_image_path is not None:
+        manifest.add(front_image_path, back_image_path, quantity)
+
 def get_handle_card(
     front_img_dir: str,
-    double_sided_dir: str
+    double_sided_dir: str,
+    manifest: CardManifest | None = None
 ):
     def configured_fetch_card(index: int, card_id, name: str, back_card_id: str | None, quantity: int = 1):
         fetch_card(
@@ -65,5 +75,7 @@ def get_handle_card(
 
             front_img_dir,
             double_sided_dir,
+
+            manifest
         )
     return configured_fetch_card
\ No newline at end of file
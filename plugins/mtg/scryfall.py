@@ -3,7 +3,7 @@ from typing import List, Set, Tuple
 import requests
 import time
 
-from common import remove_nonalphanumeric
+from common import CardManifest, remove_nonalphanumeric
 
 double_sided_layouts = ['transform', 'modal_dfc', 'double_faced_token', 'reversible_card']
 
@@ -31,33 +31,42 @@ def fetch_card_art(
     layout: str,
 
     front_img_dir: str,
-    double_sided_dir: str
+    double_sided_dir: str,
+    manifest: CardManifest | None = None
 ) -> None:
+    # A manifest records the quantity, so only one copy is saved
+    copies = quantity if manifest is None else 1
+
     # Query for the front side
+    front_image_path = None
     card_front_image_query = f'https://api.scryfall.com/cards/{card_set}/{card_collector_number}/?format=image&version=png'
     card_art = request_scryfall(card_front_image_query).content
     if card_art is not None:
 
         # Save image based on quantity
-        for counter in range(quantity):
-            image_path = os.path.join(front_img_dir, f'{index:03}{clean_card_name}{str(counter + 1)}.png')
+        for counter in range(copies):
+            front_image_path = os.path.join(front_img_dir, f'{index:03}{clean_card_name}{str(counter + 1)}.png')
 
-            with open(image_path, 'wb') as f:
+            with open(front_image_path, 'wb') as f:
                 f.write(card_art)
 
     # Get backside of card, if it exists
+    back_image_path = None
     if layout in double_sided_layouts:
         card_back_image_query = f'{card_front_image_query}&face=back'
         card_art = request_scryfall(card_back_image_query).content
         if card_art is not None:
 
             # Save image based on quantity
-            for counter in range(quantity):
-                image_path = os.path.join(double_sided_dir, f'{index:03}{clean_card_name}{str(counter + 1)}.png')
+            for counter in range(copies):
+                back_image_path = os.path.join(double_sided_dir, f'{index:03}{clean_card_name}{str(counter + 1)}.png')
 
-                with open(image_path, 'wb') as f:
+                with open(back_image_path, 'wb') as f:
                     f.write(card_art)
 
+    if manifest is not None and front_image_path is not None:
+        manifest.add(front_image_path, back_image_path, quantity)
+
 def partition_printings(printings: List, condition: List) -> Tuple[List, List]:
     matches = []
     non_matches = []
@@ -103,7 +112,8 @@ def fetch_card(
     tokens: bool,
 
     front_img_dir: str,
-    double_sided_dir: str
+    double_sided_dir: str,
+    manifest: CardManifest | None = None
 ):
     # Query based on card set and card collector number if provided
     if not ignore_set_and_collector_number and card_set != "" and card_collector_number != "":
@@ -120,7 +130,8 @@ def fetch_card(
             card_collector_number,
             card_json['layout'],
             front_img_dir,
-            double_sided_dir
+            double_sided_dir,
+            manifest
         )
 
         # Fetch tokens
@@ -139,7 +150,8 @@ def fetch_card(
                             card_json["collector_number"],
                             card_json["layout"],
                             front_img_dir,
-                            double_sided_dir
+                            double_sided_dir,
+                            manifest
                         )
 
     # Query based on card name
@@ -196,7 +208,8 @@ def fetch_card(
             collector_number,
             card_json['layout'],
             front_img_dir,
-            double_sided_dir
+            double_sided_dir,
+            manifest
         )
 
         # Fetch tokens
@@ -215,7 +228,8 @@ def fetch_card(
                             card_json["collector_number"],
                             card_json["layout"],
                             front_img_dir,
-                            double_sided_dir
+                            double_sided_dir,
+                            manifest
                         )
 
 def get_handle_card(
@@ -229,7 +243,8 @@ def get_handle_card(
     tokens: bool,
 
     front_img_dir: str,
-    double_sided_dir: str
+    double_sided_dir: str,
+    manifest: CardManifest | None = None
 ):
     def configured_fetch_card(index: int, name: str, card_set: str = None, card_collector_number: int = None, quantity: int = 1):
         fetch_card(
@@ -250,6 +265,7 @@ def get_handle_card(
             tokens,
 
             front_img_dir,
-            double_sided_dir
+            double_sided_dir,
+            manifest
         )
     return configured_fetch_card
\ No newline at end of file
@@ -0,0 +1,59 @@
+import random
+
+from PIL import Image
+
+from utilities import draw_card_with_bleed, extend_image_edges
+
+
+def paste_loop_bleed(card_image, base_image, x, y, bleed_width, bleed_height):
+    # Reference implementation that extends the edges one row, column and corner pixel at a time
+    width, height = card_image.size
+    base_image.paste(card_image, (x, y))
+
+    for i in range(bleed_height):
+        base_image.paste(card_image.crop((0, 0, width, 1)), (x, y - bleed_height + i))
+        base_image.paste(card_image.crop((0, height - 1, width, height)), (x, y + height + i))
+
+    for i in range(bleed_width):
+        base_image.paste(card_image.crop((0, 0, 1, height)), (x - bleed_width + i, y))
+        base_image.paste(card_image.crop((width - 1, 0, width, height)), (x + width + i, y))
+
+    for crop_x, pos_x in [(0, x - bleed_width), (width - 1, x + width)]:
+        for crop_y, pos_y in [(0, y - bleed_height), (height - 1, y + height)]:
+            for x_i in range(bleed_width):
+                for y_i in range(bleed_height):
+                    base_image.paste(card_image.crop((crop_x, crop_y, crop_x + 1, crop_y + 1)), (pos_x + x_i, pos_y + y_i))
+
+    return base_image
+
+
+def random_image(mode, width, height):
+    rng = random.Random(width * height)
+    image = Image.frombytes('RGB', (width, height), bytes(rng.randrange(256) for _ in range(width * height * 3)))
+    return image.convert(mode)
+
+
+def test_extend_image_edges_size():
+    card_image = random_image('RGB', 7, 5)
+    bleed_image = extend_image_edges(card_image, 3, 2)
+
+    assert bleed_image.size == (13, 9)
+    assert bleed_image.getpixel((0, 0)) == card_image.getpixel((0, 0))
+    assert bleed_image.getpixel((12, 8)) == card_image.getpixel((6, 4))
+    assert bleed_image.crop((3, 2, 10, 7)).tobytes() == card_image.tobytes()
+
+
+def test_extend_image_edges_without_bleed():
+    card_image = random_image('RGB', 7, 5)
+    assert extend_image_edges(card_image, 0, 0) is card_image
+
+
+def test_draw_card_with_bleed_matches_paste_loop():
+    for mode in ['RGB', 'RGBA', 'L', 'P']:
+        for x, y, bleed_width, bleed_height in [(10, 10, 4, 6), (2, 3, 5, 5), (20, 15, 0, 3)]:
+            card_image = random_image(mode, 9, 12)
+
+            expected = paste_loop_bleed(card_image, Image.new('RGB', (40, 40), 'white'), x, y, bleed_width, bleed_height)
+            actual = draw_card_with_bleed(card_image, Image.new('RGB', (40, 40), 'white'), x, y, (bleed_width, bleed_height))
+
+            assert actual.tobytes() == expected.tobytes()
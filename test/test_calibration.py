@@ -0,0 +1,51 @@
+import os
+
+from click.testing import CliRunner
+import numpy as np
+import pypdfium2 as pdfium
+
+from calibration import cli
+from utilities import PaperSize, get_calibration_grid, get_calibration_page_size
+
+
+def test_calibration_sheets(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--paper_size letter --paper_size a4 --output_dir {tmp_path} --workers 2")
+  assert result.exit_code == 0
+  assert sorted(os.listdir(tmp_path)) == ['a4_calibration.pdf', 'letter_calibration.pdf']
+
+  page_width, page_height = get_calibration_page_size(PaperSize.LETTER)
+  grid = get_calibration_grid(page_width, page_height)
+
+  pdf = pdfium.PdfDocument(str(tmp_path / 'letter_calibration.pdf'))
+  assert len(pdf) == 2
+  assert pdf[0].get_size() == (page_width * 72 / 300, page_height * 72 / 300)
+
+  # Every square is a vector path and every label is text, with no images
+  back_objects = list(pdf[1].get_objects())
+  assert sum(isinstance(page_object, pdfium.PdfImage) for page_object in back_objects) == 0
+  assert sum(page_object.type == pdfium.raw.FPDF_PAGEOBJ_PATH for page_object in back_objects) == len(grid.squares)
+  assert '(-1, 2)' in pdf[1].get_textpage().get_text_range()
+
+  # The middle square is blue and is not moved on the back page
+  middle_square = next(square for square in grid.squares if square.x_offset == 0 and square.y_offset == 0)
+  for page in pdf:
+    pixels = np.asarray(page.render(1).to_pil().convert('RGB'), dtype=int)
+    middle_x, middle_y = [round((position + grid.square_size / 2) * 72 / 300) for position in (middle_square.x, middle_square.y)]
+    assert tuple(pixels[middle_y, middle_x]) == (0, 0, 255)
+
+def test_calibration_sheet_steps(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--paper_size letter --ppi 600 --step 0.5 --output_dir {tmp_path}")
+  assert result.exit_code == 0
+
+  pdf = pdfium.PdfDocument(str(tmp_path / 'letter_calibration.pdf'))
+  text = pdf[1].get_textpage().get_text_range()
+  assert '(0.5, -1)' in text
+  assert '(-1.5, 0)' in text
+
+  # Steps smaller than a printer dot cannot be printed
+  result = runner.invoke(cli, f"--paper_size a4 --ppi 300 --step 0.5 --output_dir {tmp_path}")
+  assert result.exit_code != 0
+  assert 'whole number of printer dots' in str(result.exception)
+  assert not os.path.exists(tmp_path / 'a4_calibration.pdf')
@@ -1,9 +1,296 @@
+import json
 import os
+import shutil
+import tarfile
+import zipfile
 from click.testing import CliRunner
+import pypdfium2 as pdfium
+from PIL import Image
 from create_pdf import cli
+from merge_pdf import merge_pdf
+import utilities
+from utilities import SheetPlan
 
 def test_basic_create_pdf():
   runner = CliRunner()
   result = runner.invoke(cli, "--front_dir_path test/basic/front --back_dir_path test/basic/back --output_path test/basic/output/game.pdf")
   assert result.exit_code == 0
-  assert os.path.exists("test/basic/output/game.pdf")
\ No newline at end of file
+  assert os.path.exists("test/basic/output/game.pdf")
+
+def test_workers_create_pdf(tmp_path):
+  # Skipping most slots spreads the basic images across several sheets
+  args = "--front_dir_path test/basic/front --back_dir_path test/basic/back --output_images --skip 0 --skip 1 --skip 2 --skip 3 --skip 4"
+  runner = CliRunner()
+  os.makedirs(tmp_path / 'serial')
+  os.makedirs(tmp_path / 'parallel')
+
+  serial_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'serial'}/")
+  assert serial_result.exit_code == 0
+
+  parallel_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'parallel'}/ --workers 2")
+  assert parallel_result.exit_code == 0
+
+  serial_pages = sorted(os.listdir(tmp_path / 'serial'))
+  assert len(serial_pages) == 6
+  assert serial_pages == sorted(os.listdir(tmp_path / 'parallel'))
+  for page in serial_pages:
+    with Image.open(tmp_path / 'serial' / page) as serial_page, Image.open(tmp_path / 'parallel' / page) as parallel_page:
+      assert serial_page.tobytes() == parallel_page.tobytes()
+
+def test_strip_height_create_pdf(tmp_path):
+  args = "--front_dir_path test/basic/front --back_dir_path test/basic/back --output_images --ppi 150"
+  runner = CliRunner()
+  os.makedirs(tmp_path / 'pages')
+  os.makedirs(tmp_path / 'strips')
+
+  page_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'pages'}/")
+  assert page_result.exit_code == 0
+
+  # A strip height that does not divide the page clips cards at the strip edges
+  strip_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'strips'}/ --strip_height 97")
+  assert strip_result.exit_code == 0
+
+  pages = sorted(os.listdir(tmp_path / 'pages'))
+  assert pages == sorted(os.listdir(tmp_path / 'strips'))
+  for page in pages:
+    with Image.open(tmp_path / 'pages' / page) as whole_page, Image.open(tmp_path / 'strips' / page) as strip_page:
+      assert whole_page.mode == strip_page.mode
+      assert whole_page.tobytes() == strip_page.tobytes()
+
+def test_shard_create_pdf(tmp_path):
+  args = "--front_dir_path test/basic/front --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4"
+  runner = CliRunner()
+
+  full_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'full.pdf'}")
+  assert full_result.exit_code == 0
+
+  for shard in [1, 2]:
+    shard_result = runner.invoke(cli, f"{args} --output_path {tmp_path / f'shard{shard}.pdf'} --shard {shard}/2")
+    assert shard_result.exit_code == 0
+
+  # Shards can be given in any order
+  merge_result = runner.invoke(merge_pdf, f"{tmp_path / 'shard2.pdf'} {tmp_path / 'shard1.pdf'} --output_pdf_path {tmp_path / 'merged.pdf'}")
+  assert merge_result.exit_code == 0
+
+  full_pdf = pdfium.PdfDocument(str(tmp_path / 'full.pdf'))
+  merged_pdf = pdfium.PdfDocument(str(tmp_path / 'merged.pdf'))
+  assert len(full_pdf) == len(merged_pdf) == 6
+  for full_page, merged_page in zip(full_pdf, merged_pdf):
+    full_image, = full_page.get_objects()
+    merged_image, = merged_page.get_objects()
+    assert bytes(full_image.get_data(decode_simple=False)) == bytes(merged_image.get_data(decode_simple=False))
+
+def test_manifest_create_pdf(tmp_path):
+  args = "--back_dir_path test/basic/back --output_images"
+  runner = CliRunner()
+  os.makedirs(tmp_path / 'front')
+  os.makedirs(tmp_path / 'copies')
+  os.makedirs(tmp_path / 'manifest')
+
+  # The same deck once as copies of the images and once as a manifest with quantities
+  copies = [('000001.png', 3), ('000010.png', 1), ('000011.png', 5)]
+  for file, quantity in copies:
+    with Image.open(f'test/basic/front/{file}') as card_image:
+      for counter in range(quantity):
+        card_image.save(tmp_path / 'front' / f'{file[:-4]}_{counter + 1}.png')
+
+  with open(tmp_path / 'deck.json', 'w') as manifest_file:
+    cards = [{'front': os.path.abspath(f'test/basic/front/{file}'), 'quantity': quantity} for file, quantity in copies]
+    json.dump({'cards': cards}, manifest_file)
+
+  copies_result = runner.invoke(cli, f"{args} --front_dir_path {tmp_path / 'front'} --output_path {tmp_path / 'copies'}/")
+  assert copies_result.exit_code == 0
+
+  manifest_result = runner.invoke(cli, f"{args} --manifest {tmp_path / 'deck.json'} --output_path {tmp_path / 'manifest'}/")
+  assert manifest_result.exit_code == 0
+
+  pages = sorted(os.listdir(tmp_path / 'copies'))
+  assert len(pages) == 4
+  assert pages == sorted(os.listdir(tmp_path / 'manifest'))
+  for page in pages:
+    with Image.open(tmp_path / 'copies' / page) as copies_page, Image.open(tmp_path / 'manifest' / page) as manifest_page:
+      assert copies_page.tobytes() == manifest_page.tobytes()
+
+def test_archive_create_pdf(tmp_path):
+  args = "--output_images --ppi 100"
+  runner = CliRunner()
+  os.makedirs(tmp_path / 'directory')
+  os.makedirs(tmp_path / 'archive')
+
+  with zipfile.ZipFile(tmp_path / 'basic.zip', 'w') as archive:
+    for folder in ['front', 'back']:
+      for file in os.listdir(f'test/basic/{folder}'):
+        archive.write(f'test/basic/{folder}/{file}', f'{folder}/{file}')
+
+  directory_result = runner.invoke(cli, f"{args} --front_dir_path test/basic/front --back_dir_path test/basic/back --output_path {tmp_path / 'directory'}/")
+  assert directory_result.exit_code == 0
+
+  archive_path = tmp_path / 'basic.zip'
+  archive_result = runner.invoke(cli, [*args.split(), '--front_dir_path', f'{archive_path}!/front', '--back_dir_path', f'{archive_path}!/back', '--output_path', f"{tmp_path / 'archive'}/"])
+  assert archive_result.exit_code == 0
+
+  pages = sorted(os.listdir(tmp_path / 'directory'))
+  assert len(pages) == 2
+  assert pages == sorted(os.listdir(tmp_path / 'archive'))
+  for page in pages:
+    with Image.open(tmp_path / 'directory' / page) as directory_page, Image.open(tmp_path / 'archive' / page) as archive_page:
+      assert directory_page.tobytes() == archive_page.tobytes()
+
+def test_compressed_tar_archive_create_pdf(tmp_path):
+  args = "--output_images --ppi 100 --incremental"
+  runner = CliRunner()
+  os.makedirs(tmp_path / 'directory')
+  os.makedirs(tmp_path / 'archive')
+
+  with tarfile.open(tmp_path / 'basic.tar.gz', 'w:gz') as archive:
+    for folder in ['front', 'back']:
+      for file in os.listdir(f'test/basic/{folder}'):
+        archive.add(f'test/basic/{folder}/{file}', f'{folder}/{file}')
+
+  directory_result = runner.invoke(cli, f"{args} --front_dir_path test/basic/front --back_dir_path test/basic/back --output_path {tmp_path / 'directory'}/")
+  assert directory_result.exit_code == 0
+
+  # The card images of an incremental build are hashed and then read from the archive
+  archive_path = tmp_path / 'basic.tar.gz'
+  for _ in range(2):
+    archive_result = runner.invoke(cli, [*args.split(), '--front_dir_path', f'{archive_path}!/front', '--back_dir_path', f'{archive_path}!/back', '--output_path', f"{tmp_path / 'archive'}/"])
+    assert archive_result.exit_code == 0
+  assert 'Reusing 1 unchanged sheets, rendering 0 sheets' in archive_result.output
+
+  pages = sorted(page for page in os.listdir(tmp_path / 'directory') if page.endswith('.png'))
+  assert len(pages) == 2
+  assert pages == sorted(page for page in os.listdir(tmp_path / 'archive') if page.endswith('.png'))
+  for page in pages:
+    with Image.open(tmp_path / 'directory' / page) as directory_page, Image.open(tmp_path / 'archive' / page) as archive_page:
+      assert directory_page.tobytes() == archive_page.tobytes()
+
+def test_incremental_create_pdf(tmp_path):
+  shutil.copytree('test/basic/front', tmp_path / 'front')
+  args = f"--front_dir_path {tmp_path / 'front'} --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4"
+  runner = CliRunner()
+
+  first_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'game.pdf'} --incremental")
+  assert first_result.exit_code == 0
+  assert 'Reusing 0 unchanged sheets, rendering 3 sheets' in first_result.output
+
+  # Replace one card, which changes only the second sheet
+  with Image.open(tmp_path / 'front' / '000100.png') as card_image:
+    card_image.rotate(180).save(tmp_path / 'front' / '000100.png')
+
+  second_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'game.pdf'} --incremental")
+  assert second_result.exit_code == 0
+  assert 'Reusing 2 unchanged sheets, rendering 1 sheets' in second_result.output
+
+  full_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'full.pdf'}")
+  assert full_result.exit_code == 0
+
+  full_pdf = pdfium.PdfDocument(str(tmp_path / 'full.pdf'))
+  incremental_pdf = pdfium.PdfDocument(str(tmp_path / 'game.pdf'))
+  assert len(full_pdf) == len(incremental_pdf) == 6
+  for full_page, incremental_page in zip(full_pdf, incremental_pdf):
+    full_image, = full_page.get_objects()
+    incremental_image, = incremental_page.get_objects()
+    assert bytes(full_image.get_data(decode_simple=False)) == bytes(incremental_image.get_data(decode_simple=False))
+
+def test_incremental_workers_create_pdf(tmp_path):
+  shutil.copytree('test/basic/front', tmp_path / 'front')
+  args = f"--front_dir_path {tmp_path / 'front'} --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4 --output_path {tmp_path / 'game.pdf'} --incremental --workers 2"
+  runner = CliRunner()
+
+  first_result = runner.invoke(cli, args)
+  assert first_result.exit_code == 0
+
+  # Only one sheet changes, so it is rendered without starting the workers
+  with Image.open(tmp_path / 'front' / '000100.png') as card_image:
+    card_image.rotate(180).save(tmp_path / 'front' / '000100.png')
+
+  second_result = runner.invoke(cli, args)
+  assert second_result.exit_code == 0, second_result.output
+  assert 'Reusing 2 unchanged sheets, rendering 1 sheets' in second_result.output
+  assert len(pdfium.PdfDocument(str(tmp_path / 'game.pdf'))) == 6
+
+def test_incremental_sheets_create_pdf(tmp_path):
+  args = f"--front_dir_path test/basic/front --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4 --output_path {tmp_path / 'game.pdf'} --incremental"
+  runner = CliRunner()
+
+  first_result = runner.invoke(cli, args)
+  assert first_result.exit_code == 0
+  assert 'Reusing 0 unchanged sheets, rendering 3 sheets' in first_result.output
+
+  # Building one sheet keeps the other sheets of the previous build
+  sheet_result = runner.invoke(cli, f"{args} --sheets 2")
+  assert sheet_result.exit_code == 0
+  assert 'Reusing 1 unchanged sheets, rendering 0 sheets' in sheet_result.output
+
+  full_result = runner.invoke(cli, args)
+  assert full_result.exit_code == 0
+  assert 'Reusing 3 unchanged sheets, rendering 0 sheets' in full_result.output
+
+def test_incremental_repack_create_pdf(tmp_path):
+  args = f"--front_dir_path test/basic/front --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4 --output_path {tmp_path / 'game.pdf'} --incremental"
+  runner = CliRunner()
+
+  first_result = runner.invoke(cli, args)
+  assert first_result.exit_code == 0
+
+  # A card of the second sheet is repacked onto a new first sheet, which must not replace the real first sheet
+  repack_result = runner.invoke(cli, f"{args} --cards 000100.png --repack")
+  assert repack_result.exit_code == 0
+  assert 'Reusing 0 unchanged sheets, rendering 1 sheets' in repack_result.output
+
+  full_result = runner.invoke(cli, args)
+  assert full_result.exit_code == 0
+  assert 'Reusing 3 unchanged sheets, rendering 0 sheets' in full_result.output
+
+def test_sheets_and_cards_create_pdf(tmp_path):
+  args = "--front_dir_path test/basic/front --back_dir_path test/basic/back --output_images --ppi 100 --skip 0 --skip 1 --skip 2 --skip 3 --skip 4"
+  runner = CliRunner()
+  for folder in ['full', 'sheets', 'cards']:
+    os.makedirs(tmp_path / folder)
+
+  full_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'full'}/")
+  assert full_result.exit_code == 0
+
+  # A reprint of sheet 2 is identical to the sheet in the full output
+  sheets_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'sheets'}/ --sheets 2")
+  assert sheets_result.exit_code == 0
+  assert sorted(os.listdir(tmp_path / 'sheets')) == ['page3.png', 'page4.png']
+  for page in ['page3.png', 'page4.png']:
+    with Image.open(tmp_path / 'full' / page) as full_page, Image.open(tmp_path / 'sheets' / page) as sheet_page:
+      assert full_page.tobytes() == sheet_page.tobytes()
+
+  # Cards from three sheets fit on one sheet when repacked
+  cards_result = runner.invoke(cli, f"{args} --output_path {tmp_path / 'cards'}/ --cards 000001 --cards 000110.png --cards 001* --repack")
+  assert cards_result.exit_code == 0
+  assert sorted(os.listdir(tmp_path / 'cards')) == ['page1.png', 'page2.png']
+  assert 'Image 3: 001000.png' in cards_result.output
+
+def test_plan_create_pdf(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/back --skip 0 --skip 1 --skip 2 --skip 3 --skip 4 --output_path {tmp_path / 'game.pdf'} --plan {tmp_path / 'plan.json'}")
+  assert result.exit_code == 0
+  assert 'Planned 3 sheets (6 pages)' in result.output
+
+  # Planning does not create the PDF
+  assert not os.path.exists(tmp_path / 'game.pdf')
+
+  plan = SheetPlan.model_validate_json((tmp_path / 'plan.json').read_text())
+  assert plan.template == 'letter_standard_v4'
+  assert len(plan.front_positions) == len(plan.back_positions) == 8
+  assert [sheet.number for sheet in plan.sheets] == [1, 2, 3]
+  assert [slot.name for slot in plan.sheets[0].slots if slot is not None] == ['000001.png', '000010.png', '000011.png']
+  assert plan.sheets[0].slots[:5] == [None] * 5
+
+
+def test_plan_create_pdf_without_back_image(tmp_path, monkeypatch):
+  # Planning does not ask which back image to use or open it
+  def fail(*args, **kwargs):
+    raise AssertionError('Planning asked for or opened the back image')
+
+  monkeypatch.setattr('builtins.input', fail)
+  monkeypatch.setattr(utilities, 'open_card_image', fail)
+
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/front --output_path {tmp_path / 'game.png'} --plan {tmp_path / 'plan.json'}")
+  assert result.exit_code == 0, result.output
+  assert 'Planned 1 sheets (2 pages)' in result.output
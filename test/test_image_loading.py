@@ -0,0 +1,42 @@
+from PIL import Image
+
+from utilities import open_card_image
+
+
+def save_card_image(path, size, orientation=None):
+    card_image = Image.new('RGB', size, 'green')
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+
+    card_image.save(path, exif=exif)
+
+
+def test_open_card_image_reduces_large_images(tmp_path):
+    for extension in ['jpg', 'png']:
+        path = str(tmp_path / f'card.{extension}')
+        save_card_image(path, (4000, 5600))
+
+        card_image = open_card_image(path, 'front', (500, 700))
+
+        # Reduced, but still at least twice the needed size
+        assert card_image.width < 4000
+        assert card_image.width >= 1000 and card_image.height >= 1400
+
+
+def test_open_card_image_keeps_small_images(tmp_path):
+    path = str(tmp_path / 'card.png')
+    save_card_image(path, (1500, 2100))
+
+    assert open_card_image(path, 'front', (750, 1050)).size == (1500, 2100)
+
+
+def test_open_card_image_applies_orientation_after_reducing(tmp_path):
+    # Orientation 6 rotates the stored landscape image into portrait
+    path = str(tmp_path / 'card.png')
+    save_card_image(path, (5600, 4000), orientation=6)
+
+    card_image = open_card_image(path, 'front', (500, 700))
+
+    assert card_image.width < card_image.height
+    assert card_image.width >= 1000 and card_image.height >= 1400
@@ -0,0 +1,74 @@
+import math
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+import pytest
+
+from measure_offset import measure_offset
+from utilities import OffsetData, PaperSize, get_calibration_grid, get_calibration_page_size
+
+
+def make_scan(path, paper_size: PaperSize, offset: OffsetData, scale: float, quarter_turns: int, step: float = 1, ppi: int = 300):
+  """
+  Make a scan of the back of a calibration sheet, where the front page shows through moved by the offset that would fix it.
+
+  The sheet is drawn at twice the size and scaled down at the end, so squares and offsets on half pixels are drawn exactly.
+  """
+  page_width, page_height = get_calibration_page_size(paper_size)
+  grid = get_calibration_grid(page_width, page_height, step=step, ppi=ppi)
+  font = ImageFont.truetype(os.path.join('assets', 'arial.ttf'), 50)
+
+  width, height = page_width * 2, page_height * 2
+  front = Image.new('L', (width, height), 255)
+  back = Image.new('RGB', (width, height), 'white')
+  front_draw = ImageDraw.Draw(front)
+  back_draw = ImageDraw.Draw(back)
+
+  # Pillow includes the bottom right corner of rectangles, so end one pixel before it
+  square_size = grid.square_size * 2
+  for square in grid.squares:
+    fill = 'blue' if square.center else 'black'
+    front_x, front_y = round(square.x * 2), round(square.y * 2)
+    front_draw.rectangle([(front_x, front_y), (front_x + square_size - 1, front_y + square_size - 1)], fill=0)
+
+    back_x, back_y = round((square.x + square.x_offset) * 2), round((square.y + square.y_offset) * 2)
+    back_draw.rectangle([(back_x, back_y), (back_x + square_size - 1, back_y + square_size - 1)], fill=fill)
+    back_draw.text((back_x + square_size / 2, back_y + square_size / 2 + 60), f'({square.x_offset:g}, {square.y_offset:g})', fill='red', anchor='mm', font=font)
+
+  # Move the mirrored front page like offset_image() would, mapping every pixel back to where it came from
+  angle = math.radians(offset.angle_offset)
+  cos, sin = math.cos(angle), math.sin(angle)
+  center_x, center_y = width / 2, height / 2
+  inverse = (
+    cos, sin, center_x - cos * center_x - sin * center_y - offset.x_offset * 2,
+    -sin, cos, center_y + sin * center_x - cos * center_y - offset.y_offset * 2
+  )
+  front = front.transpose(Image.Transpose.FLIP_LEFT_RIGHT).transform((width, height), Image.Transform.AFFINE, inverse, resample=Image.Resampling.BILINEAR, fillcolor=255)
+
+  shadow = 1 - 0.35 * (1 - np.asarray(front, dtype=np.float32)[:, :, None] / 255)
+  scan = Image.fromarray(np.uint8(np.asarray(back, dtype=np.float32) * shadow * 0.9 + 15))
+  scan = scan.resize((round(width * scale / 2), round(height * scale / 2)), Image.Resampling.LANCZOS).rotate(90 * quarter_turns, expand=True)
+  scan.save(path, quality=90)
+
+def test_measure_offset(tmp_path):
+  offset = OffsetData(x_offset=12, y_offset=-9, angle_offset=0.5)
+  make_scan(tmp_path / 'scan.jpg', PaperSize.LETTER, offset, 0.8, 2)
+
+  measured_offset = measure_offset(str(tmp_path / 'scan.jpg'), PaperSize.LETTER)
+  assert measured_offset.x_offset == pytest.approx(offset.x_offset, abs=0.5)
+  assert measured_offset.y_offset == pytest.approx(offset.y_offset, abs=0.5)
+  assert measured_offset.angle_offset == pytest.approx(offset.angle_offset, abs=0.02)
+
+def test_measure_offset_with_steps(tmp_path):
+  offset = OffsetData(x_offset=15.5, y_offset=-12.5, angle_offset=-0.2)
+  make_scan(tmp_path / 'scan.jpg', PaperSize.A4, offset, 1, 1, step=0.5, ppi=600)
+
+  measured_offset = measure_offset(str(tmp_path / 'scan.jpg'), PaperSize.A4, step=0.5, ppi=600)
+  assert measured_offset.x_offset == pytest.approx(offset.x_offset, abs=0.5)
+  assert measured_offset.y_offset == pytest.approx(offset.y_offset, abs=0.5)
+  assert measured_offset.angle_offset == pytest.approx(offset.angle_offset, abs=0.02)
+
+def test_measure_offset_without_squares():
+  with pytest.raises(Exception, match='Cannot find any calibration squares'):
+    measure_offset(os.path.join('assets', 'letter_blank.jpg'), PaperSize.LETTER)
@@ -0,0 +1,91 @@
+from click.testing import CliRunner
+import numpy as np
+import pypdfium2 as pdfium
+import pytest
+
+from create_pdf import cli
+from offset_pdf import offset_pdf
+from utilities import get_offset_matrix
+
+
+def get_image_streams(page: pdfium.PdfPage) -> list[bytes]:
+  return [bytes(page_object.get_data(decode_simple=False)) for page_object in page.get_objects(max_depth=2) if isinstance(page_object, pdfium.PdfImage)]
+
+def render_gray(page: pdfium.PdfPage) -> np.ndarray:
+  return np.asarray(page.render(150 / 72).to_pil().convert('L'), dtype=int)
+
+def test_vector_offset_pdf(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/back --ppi 150 --output_path {tmp_path / 'game.pdf'}")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} -x 30 -y -20 -a 0.5")
+  assert result.exit_code == 0
+
+  pdf = pdfium.PdfDocument(str(tmp_path / 'game.pdf'))
+  vector_pdf = pdfium.PdfDocument(str(tmp_path / 'game_offset.pdf'))
+  assert len(vector_pdf) == len(pdf)
+
+  for page_number in range(len(pdf)):
+    assert vector_pdf[page_number].get_size() == pdf[page_number].get_size()
+    assert get_image_streams(vector_pdf[page_number]) == get_image_streams(pdf[page_number])
+
+  # The back page is drawn once, through the offset transform
+  back_objects = list(vector_pdf[1].get_objects(max_depth=0))
+  assert len(back_objects) == 1
+  assert back_objects[0].get_matrix().get() == pytest.approx(get_offset_matrix(*pdf[1].get_size(), 30, -20, 0.5), abs=1e-4)
+
+def test_vector_offset_pdf_fractional_offset(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/back --ppi 150 --output_path {tmp_path / 'game.pdf'}")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} -x 2.5 -y -0.5")
+  assert result.exit_code == 0
+
+  pdf = pdfium.PdfDocument(str(tmp_path / 'game.pdf'))
+  vector_pdf = pdfium.PdfDocument(str(tmp_path / 'game_offset.pdf'))
+  back_object = next(vector_pdf[1].get_objects(max_depth=0))
+  assert back_object.get_matrix().get() == pytest.approx(get_offset_matrix(*pdf[1].get_size(), 2.5, -0.5), abs=1e-4)
+
+def test_vector_offset_pdf_matches_raster(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/back --ppi 150 --output_path {tmp_path / 'game.pdf'}")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} --output_pdf_path {tmp_path / 'vector.pdf'} -x 30 -y -20 -a 0")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} --output_pdf_path {tmp_path / 'raster.pdf'} -x 30 -y -20 -a 0 --raster --ppi 150")
+  assert result.exit_code == 0
+
+  vector_page = render_gray(pdfium.PdfDocument(str(tmp_path / 'vector.pdf'))[1])
+  raster_page = render_gray(pdfium.PdfDocument(str(tmp_path / 'raster.pdf'))[1])
+
+  # The raster offset wraps pixels around the page edges, so only compare the inside of the page
+  different = np.abs(vector_page - raster_page)[30:-30, 30:-30] > 64
+  assert different.mean() < 0.001
+
+def test_raster_offset_pdf_workers(tmp_path):
+  runner = CliRunner()
+  result = runner.invoke(cli, f"--front_dir_path test/basic/front --back_dir_path test/basic/back --ppi 150 --output_path {tmp_path / 'game.pdf'}")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} --output_pdf_path {tmp_path / 'serial.pdf'} -x 30 -y -20 -a 0.5 --raster --ppi 150")
+  assert result.exit_code == 0
+
+  result = runner.invoke(offset_pdf, f"--pdf_path {tmp_path / 'game.pdf'} --output_pdf_path {tmp_path / 'parallel.pdf'} -x 30 -y -20 -a 0.5 --raster --ppi 150 --workers 2")
+  assert result.exit_code == 0
+
+  pdf = pdfium.PdfDocument(str(tmp_path / 'game.pdf'))
+  serial_pdf = pdfium.PdfDocument(str(tmp_path / 'serial.pdf'))
+  parallel_pdf = pdfium.PdfDocument(str(tmp_path / 'parallel.pdf'))
+  assert len(serial_pdf) == len(parallel_pdf) == len(pdf)
+
+  # Front pages are copied without being rendered
+  assert get_image_streams(serial_pdf[0]) == get_image_streams(pdf[0])
+  assert get_image_streams(serial_pdf[1]) != get_image_streams(pdf[1])
+
+  for page_number in range(len(pdf)):
+    assert parallel_pdf[page_number].get_size() == pdf[page_number].get_size()
+    assert get_image_streams(parallel_pdf[page_number]) == get_image_streams(serial_pdf[page_number])
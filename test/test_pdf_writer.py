@@ -0,0 +1,80 @@
+import pypdfium2 as pdfium
+from PIL import Image
+
+from utilities import CardPlacement, PdfPageWriter, VectorPage, encode_image
+
+
+def test_pdf_page_writer(tmp_path):
+    output_path = str(tmp_path / 'pages.pdf')
+
+    with PdfPageWriter(output_path, 300, 90) as page_writer:
+        page_writer.add_page(Image.new('RGB', (600, 300), 'red'))
+        page_writer.add_page(Image.new('L', (300, 600), 'white'))
+
+    pdf = pdfium.PdfDocument(output_path)
+    assert len(pdf) == 2
+    assert pdf[0].get_size() == (144, 72)
+    assert pdf[1].get_size() == (72, 144)
+
+    red = pdf[0].render(scale=1).to_pil().convert('RGB').getpixel((72, 36))
+    assert red[0] > 240 and red[1] < 15 and red[2] < 15
+
+
+def test_pdf_page_writer_removes_partial_file(tmp_path):
+    output_path = tmp_path / 'pages.pdf'
+
+    try:
+        with PdfPageWriter(str(output_path), 300, 90) as page_writer:
+            page_writer.add_page(Image.new('RGB', (600, 300), 'red'))
+            raise RuntimeError('interrupted')
+    except RuntimeError:
+        pass
+
+    assert not output_path.exists()
+
+
+def test_pdf_page_writer_passes_encoded_images_through(tmp_path):
+    output_path = str(tmp_path / 'pages.pdf')
+
+    # A gradient so the PNG predictors have something to do
+    gradient = Image.linear_gradient('L').resize((300, 150)).convert('RGB')
+    jpeg_image = encode_image(gradient, 'DCTDecode', 90)
+    png_image = encode_image(gradient, 'FlateDecode', 90)
+
+    with PdfPageWriter(output_path, 300, 90) as page_writer:
+        page_writer.add_page(jpeg_image)
+        page_writer.add_page(png_image)
+
+    pdf = pdfium.PdfDocument(output_path)
+    jpeg_object, = pdf[0].get_objects()
+    assert bytes(jpeg_object.get_data(decode_simple=False)) == jpeg_image.data
+
+    # Flate images are lossless
+    png_object, = pdf[1].get_objects()
+    assert png_object.get_bitmap().to_pil().convert('RGB').tobytes() == gradient.tobytes()
+
+
+def test_pdf_page_writer_stores_vector_page_images_once(tmp_path):
+    output_path = tmp_path / 'pages.pdf'
+
+    # A blue card with a red left edge
+    card_image = Image.new('RGB', (60, 90), 'blue')
+    card_image.paste((255, 0, 0), (0, 0, 1, 90))
+    placements = [CardPlacement(card_image, 30, 30, (12, 12)), CardPlacement(card_image.copy(), 120, 30, (12, 12))]
+
+    with PdfPageWriter(str(output_path), 72, 95) as page_writer:
+        page_writer.add_page(VectorPage((300, 200), ((10, 10, 20, 20),), placements, None))
+        page_writer.add_page(VectorPage((300, 200), ((10, 10, 20, 20),), placements, None))
+
+    assert output_path.read_bytes().count(b'/Subtype /Image') == 1
+
+    pdf = pdfium.PdfDocument(str(output_path))
+    page_image = pdf[1].render(scale=1).to_pil().convert('RGB')
+
+    # The bleed repeats the edge of the card and stops at the end of the bleed
+    left_bleed = page_image.getpixel((22, 60))
+    assert left_bleed[0] > 220 and left_bleed[2] < 40
+    assert page_image.getpixel((16, 60)) == (255, 255, 255)
+
+    card_middle = page_image.getpixel((60, 60))
+    assert card_middle[2] > 220 and card_middle[0] < 40
@@ -0,0 +1,43 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utilities import Layouts, PaperSize, Registration, asset_directory, get_registration_rects, layouts_path, render_registration_image
+
+
+@pytest.mark.parametrize("paper_size", [PaperSize.LETTER, PaperSize.TABLOID])
+@pytest.mark.parametrize("registration", [Registration.THREE, Registration.FOUR])
+def test_registration_marks_match_assets(paper_size, registration):
+    with open(layouts_path, 'r') as layouts_file:
+        layouts = Layouts(**json.load(layouts_file))
+    paper_layout = layouts.paper_layouts[paper_size]
+
+    rects = get_registration_rects(paper_layout, layouts.registration_marks, registration)
+    registration_image = render_registration_image((paper_layout.width, paper_layout.height), rects, 1.0)
+
+    with Image.open(os.path.join(asset_directory, f'{paper_size.value}_registration_{registration.value}.jpg')) as asset_image:
+        asset_marks = np.asarray(asset_image.convert('L')) < 128
+
+    marks = np.asarray(registration_image.convert('L')) < 128
+
+    # Only the anti-aliased edges of the marks may differ
+    assert marks.sum() > 0
+    assert (marks != asset_marks).sum() < 0.05 * asset_marks.sum()
+
+
+def test_registration_marks_scale_with_ppi():
+    with open(layouts_path, 'r') as layouts_file:
+        layouts = Layouts(**json.load(layouts_file))
+    paper_layout = layouts.paper_layouts[PaperSize.LETTER]
+
+    rects = get_registration_rects(paper_layout, layouts.registration_marks, Registration.FOUR)
+    registration_image = render_registration_image((paper_layout.width * 4, paper_layout.height * 4), rects, 4.0)
+
+    # The top left mark starts at the inset and has no blurred edges
+    marks = np.asarray(registration_image.convert('L'))
+    assert marks[448, 448] == 0
+    assert marks[447, 447] == 255
+    assert set(np.unique(marks)) == {0, 255}
@@ -0,0 +1,158 @@
+import io
+import math
+import os
+
+import numpy as np
+import pypdfium2 as pdfium
+from PIL import Image
+
+import utilities
+from utilities import CardRecord, OffsetData, PageStrips, PdfOptions, PdfPageWriter, create_sheet_renderer, render_cards
+
+
+class PageList:
+  def __init__(self):
+    self.pages = []
+
+  def add_page(self, page):
+    self.pages.append(page)
+
+
+def test_render_cards_pulls_cards_per_sheet():
+  events = []
+  sink = PageList()
+
+  def produce_cards():
+    for i, file in enumerate(sorted(os.listdir('test/basic/front'))):
+      events.append(('card', len(sink.pages)))
+      with open(f'test/basic/front/{file}', 'rb') as card_file:
+        card_bytes = card_file.read()
+
+      # Cards can be image file bytes or images
+      if i % 2 == 0:
+        yield CardRecord(front=card_bytes, name=file)
+      else:
+        yield CardRecord(front=Image.open(io.BytesIO(card_bytes)), quantity=2)
+
+  options = PdfOptions(back='test/basic/back/ZS_card_back.png', skip=[0, 1, 2, 3, 4], ppi=100, prefetch=0)
+  num_sheets = render_cards(produce_cards(), options, sink)
+
+  # 12 cards, 3 per sheet
+  assert num_sheets == 4
+  assert len(sink.pages) == 8
+  assert all(page.size == (1100, 850) for page in sink.pages)
+
+  # The cards of a sheet are only taken when the sheet is rendered
+  assert [pages for _, pages in events] == [0, 0, 2, 2, 4, 4, 6, 6]
+
+
+def get_page_image(page):
+  # Join pages that are drawn in strips
+  if isinstance(page, PageStrips):
+    strips = list(page.strips)
+    page_image = Image.new(strips[0].mode, page.size)
+    top = 0
+    for strip in strips:
+      page_image.paste(strip, (0, top))
+      top += strip.height
+    return page_image
+
+  return page
+
+
+def render_offset_pages(offset, **kwargs):
+  cards = [CardRecord(front=f'test/basic/front/{file}') for file in sorted(os.listdir('test/basic/front'))]
+  options = PdfOptions(back='test/basic/back/ZS_card_back.png', ppi=100, offset=offset, **kwargs)
+  sink = PageList()
+  render_cards(cards, options, sink)
+  return [get_page_image(page) for page in sink.pages]
+
+
+def test_render_cards_offsets_back_cards():
+  pages = render_offset_pages(None)
+  moved_pages = render_offset_pages(OffsetData(x_offset=30, y_offset=-20))
+  rotated_pages = render_offset_pages(OffsetData(x_offset=30, y_offset=-20, angle_offset=1.0))
+  rotated_strip_pages = render_offset_pages(OffsetData(x_offset=30, y_offset=-20, angle_offset=1.0), strip_height=97)
+
+  # Only the back pages are offset
+  assert pages[0].tobytes() == moved_pages[0].tobytes() == rotated_pages[0].tobytes()
+
+  # The cards move by the offset at 300 PPI, which is (10, -7) pixels at 100 PPI
+  card_area = (200, 200, 900, 650)
+  moved_card_area = (210, 193, 910, 643)
+  assert pages[1].crop(card_area).tobytes() == moved_pages[1].crop(moved_card_area).tobytes()
+
+  # Registration marks stay where they are, such as the bottom left corner that the cards moved away from
+  for left, top, right, bottom in create_sheet_renderer(PdfOptions(ppi=100)).registration_rects[3:]:
+    registration_area = (math.floor(left / 3), math.floor(top / 3), math.ceil(right / 3), math.ceil(bottom / 3))
+    assert pages[1].crop(registration_area).tobytes() == moved_pages[1].crop(registration_area).tobytes()
+
+  assert rotated_pages[1].tobytes() != moved_pages[1].tobytes()
+  assert rotated_pages[1].tobytes() == rotated_strip_pages[1].tobytes()
+
+
+def test_render_cards_offsets_vector_back_cards(tmp_path):
+  # Raster pages round the offset down to whole pixels, so use an offset that is whole pixels at 100 PPI
+  offset = OffsetData(x_offset=30, y_offset=-21)
+  raster_pages = render_offset_pages(offset)
+
+  cards = [CardRecord(front=f'test/basic/front/{file}') for file in sorted(os.listdir('test/basic/front'))]
+  options = PdfOptions(back='test/basic/back/ZS_card_back.png', ppi=100, offset=offset, vector=True)
+  with PdfPageWriter(str(tmp_path / 'vector.pdf'), options.ppi, options.quality) as page_writer:
+    render_cards(cards, options, page_writer)
+
+  vector_page = pdfium.PdfDocument(str(tmp_path / 'vector.pdf'))[1].render(100 / 72).to_pil().convert('L').crop((0, 0, 1100, 850))
+  different = np.abs(np.asarray(vector_page, dtype=int) - np.asarray(raster_pages[1].convert('L'), dtype=int)) > 64
+  assert different.mean() < 0.01
+
+
+def test_render_cards_extends_cards_per_strip(monkeypatch):
+  extended_cards = []
+  extend_image_edges = utilities.extend_image_edges
+
+  def count_extend_image_edges(*args, **kwargs):
+    extended_cards.append(args[0])
+    return extend_image_edges(*args, **kwargs)
+
+  monkeypatch.setattr(utilities, 'extend_image_edges', count_extend_image_edges)
+
+  cards = [CardRecord(front=f'test/basic/front/{file}') for file in sorted(os.listdir('test/basic/front'))]
+  options = PdfOptions(back='test/basic/back/ZS_card_back.png', ppi=100, strip_height=97, prefetch=0)
+  sink = PageList()
+  render_cards(cards, options, sink)
+
+  # The cards are only extended when the first strip they reach into is drawn
+  strips = iter(sink.pages[0].strips)
+  assert extended_cards == []
+
+  # The first strip reaches into the top row of 4 cards
+  next(strips)
+  assert len(extended_cards) == 4
+
+  for _ in strips:
+    pass
+
+  # Every card is extended once, even when it crosses several strips
+  assert len(extended_cards) == len(set(map(id, extended_cards))) > 1
+
+
+def test_render_cards_encodes_shared_back_once(tmp_path, monkeypatch):
+  encoded_images = []
+  encode_image = utilities.encode_image
+
+  def count_encode_image(image, *args, **kwargs):
+    encoded_images.append(image)
+    return encode_image(image, *args, **kwargs)
+
+  monkeypatch.setattr(utilities, 'encode_image', count_encode_image)
+
+  cards = [CardRecord(front=f'test/basic/front/{file}') for file in sorted(os.listdir('test/basic/front'))]
+  options = PdfOptions(back='test/basic/back/ZS_card_back.png', skip=[0, 1, 2, 3, 4], ppi=100, prefetch=0)
+  with PdfPageWriter(str(tmp_path / 'game.pdf'), options.ppi, options.quality) as page_writer:
+    num_sheets = render_cards(cards, options, page_writer)
+
+  # The back page that the first sheets share is only encoded once
+  assert num_sheets == 3
+  assert len(encoded_images) < 2 * num_sheets
+  assert len(set(map(id, encoded_images))) == len(encoded_images)
+  assert len(pdfium.PdfDocument(str(tmp_path / 'game.pdf'))) == 2 * num_sheets
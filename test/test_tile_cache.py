@@ -0,0 +1,83 @@
+import os
+from PIL import Image
+
+from utilities import CardTile, DiskTileCache, TileCache
+
+
+def make_tile(width, height):
+    return CardTile(Image.new('RGB', (width, height)), 0, 0, (0, 0))
+
+
+def test_tile_cache_hit():
+    tile_cache = TileCache(1024 * 1024)
+    tile = make_tile(10, 10)
+    tile_cache.put(('hash', False), tile)
+
+    assert tile_cache.get(('hash', False)) is tile
+    assert tile_cache.get(('hash', True)) is None
+
+
+def test_tile_cache_evicts_least_recently_used():
+    # Each tile is 300 bytes, so only two fit
+    tile_cache = TileCache(600)
+    tile_cache.put('a', make_tile(10, 10))
+    tile_cache.put('b', make_tile(10, 10))
+
+    # Using "a" makes "b" the least recently used tile
+    assert tile_cache.get('a') is not None
+    tile_cache.put('c', make_tile(10, 10))
+
+    assert tile_cache.get('a') is not None
+    assert tile_cache.get('b') is None
+    assert tile_cache.get('c') is not None
+    assert tile_cache.num_bytes == 600
+
+
+def test_disk_tile_cache_round_trip(tmp_path):
+    disk_tile_cache = DiskTileCache(str(tmp_path), 1024 * 1024)
+    tile = CardTile(Image.new('RGB', (10, 20), 'blue'), -3, -4, (5, 6))
+    disk_tile_cache.put(('hash', 1.0), tile)
+
+    cached_tile = disk_tile_cache.get(('hash', 1.0))
+    assert cached_tile.image.tobytes() == tile.image.tobytes()
+    assert cached_tile.image.mode == 'RGB'
+    assert (cached_tile.offset_x, cached_tile.offset_y, cached_tile.bleed) == (-3, -4, (5, 6))
+
+    assert disk_tile_cache.get(('hash', 2.0)) is None
+
+
+def test_disk_tile_cache_size_limit(tmp_path):
+    # Each tile takes a little over 300 bytes on disk, so only one fits
+    disk_tile_cache = DiskTileCache(str(tmp_path), 500)
+    disk_tile_cache.put('a', make_tile(10, 10))
+    disk_tile_cache.put('b', make_tile(10, 10))
+
+    assert disk_tile_cache.get('b') is not None
+    assert disk_tile_cache.get('a') is None
+
+
+def test_disk_tile_cache_counts_directory_once(tmp_path, monkeypatch):
+    disk_tile_cache = DiskTileCache(str(tmp_path), 1024 * 1024)
+
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+
+    for key in range(5):
+        disk_tile_cache.put(key, make_tile(10, 10))
+
+    assert len(scans) == 1
+    assert all(disk_tile_cache.get(key) is not None for key in range(5))
+
+
+def test_disk_tile_cache_evicted_while_reading(tmp_path, monkeypatch):
+    disk_tile_cache = DiskTileCache(str(tmp_path), 1024 * 1024)
+    disk_tile_cache.put('a', make_tile(10, 10))
+
+    # Another process evicts the tile after it was loaded but before it is marked as used
+    def evicted_utime(path, *args, **kwargs):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(os, 'utime', evicted_utime)
+
+    assert disk_tile_cache.get('a') is None
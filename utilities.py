@@ -1,18 +1,36 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from enum import Enum
+import functools
+import hashlib
+import bz2
+import gzip
+import io
 import itertools
 import json
+import lzma
 import math
 import filetype
+import fnmatch
 import os
 import re
+import shutil
+import struct
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
 from glob import glob
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Protocol
 from xml.dom import ValidationErr
 
 from natsort import natsorted
-from PIL import Image, ImageChops, ImageDraw, ImageFont, ImageOps
-from pydantic import BaseModel
+import numpy as np
+from PIL import ExifTags, Image, ImageChops, ImageDraw, ImageFont, ImageOps, PdfParser
+from pydantic import BaseModel, ConfigDict
 
 # Specify directory locations
 asset_directory = 'assets'
@@ -20,6 +38,10 @@ asset_directory = 'assets'
 layouts_filename = 'layouts.json'
 layouts_path = os.path.join(asset_directory, layouts_filename)
 
+# Persistent cache of scaled card images
+tile_cache_directory = os.path.join('data', 'tile_cache')
+tile_cache_max_bytes = 2 * 1024 * 1024 * 1024
+
 # Specify valid mimetypes for images
 # List can be found here: https://github.com/h2non/filetype.py?tab=readme-ov-file#image
 # Pillow suported formats: https://pillow.readthedocs.io/en/stable/handbook/image-file-formats.html
@@ -68,6 +90,12 @@ class Registration(str, Enum):
     THREE = "3"
     FOUR = "4"
 
+class Corner(str, Enum):
+    TOP_LEFT = "top_left"
+    TOP_RIGHT = "top_right"
+    BOTTOM_LEFT = "bottom_left"
+    BOTTOM_RIGHT = "bottom_right"
+
 class CardLayoutSize(BaseModel):
     width: int
     height: int
@@ -80,10 +108,21 @@ class CardLayout(BaseModel):
 class PaperLayout(BaseModel):
     width: int
     height: int
+    # Corner with the square mark when using 3-point registration
+    registration_square: Corner = Corner.TOP_LEFT
     card_layouts: Dict[CardSize, CardLayout]
 
+class RegistrationMarks(BaseModel):
+    # Distance from the edges of the paper to the outside of the marks
+    inset: float = 112
+    # Length and thickness of the arms of the L-shaped marks
+    length: float = 96.5
+    thickness: float = 12.5
+    square_size: float = 72
+
 class Layouts(BaseModel):
     card_sizes: Dict[CardSize, CardLayoutSize]
+    registration_marks: RegistrationMarks = RegistrationMarks()
     paper_layouts: Dict[PaperSize, PaperLayout]
 
 # Known junk files across OSes
@@ -129,6 +168,46 @@ def parse_crop_string(crop_string: str | None, card_width: int, card_height: int
 
     raise ValueError(f"Invalid crop format: '{crop_string}'")
 
+def parse_shard_string(shard_string: str | None) -> tuple[int, int] | None:
+    """
+    Parses a shard such as "2/4", the second of four shards.
+    """
+    if shard_string is None:
+        return None
+
+    shard_match = re.fullmatch(r"(\d+)/(\d+)", shard_string.strip())
+    if shard_match is None:
+        raise ValueError(f"Invalid shard format: '{shard_string}'")
+
+    shard_index = int(shard_match.group(1))
+    shard_count = int(shard_match.group(2))
+    if shard_index < 1 or shard_index > shard_count:
+        raise ValueError(f"Invalid shard '{shard_string}'. The shard must be between 1 and {shard_count}.")
+
+    return shard_index, shard_count
+
+def parse_sheets_string(sheets_string: str | None) -> set[int] | None:
+    """
+    Parses sheet numbers and ranges such as "3,7-9", which is sheets 3, 7, 8 and 9.
+    """
+    if sheets_string is None:
+        return None
+
+    sheet_numbers = set()
+    for part in sheets_string.split(','):
+        range_match = re.fullmatch(r"(\d+)(?:-(\d+))?", part.strip())
+        if range_match is None:
+            raise ValueError(f"Invalid sheets format: '{sheets_string}'")
+
+        first_sheet = int(range_match.group(1))
+        last_sheet = int(range_match.group(2) or first_sheet)
+        if first_sheet < 1 or last_sheet < first_sheet:
+            raise ValueError(f"Invalid sheet range '{part.strip()}'. Sheets start at 1 and ranges go from low to high.")
+
+        sheet_numbers.update(range(first_sheet, last_sheet + 1))
+
+    return sheet_numbers
+
 def convertInToCrop(crop_in: float, card_width_px: int, card_height_px: int) -> tuple[float, float]:
     # Convert from pixels to physical mm using DPI
     # Card dimensions are based on 300 ppi
@@ -141,6 +220,10 @@ def convertInToCrop(crop_in: float, card_width_px: int, card_height_px: int) ->
     return (crop_x_percent, crop_y_percent)
 
 def delete_hidden_files_in_directory(path: str):
+    # Hidden files in archives are skipped when the archive is read
+    if parse_archive_path(path) is not None:
+        return
+
     if len(path) > 0:
         for file in os.listdir(path):
             full_path = os.path.join(path, file)
@@ -157,7 +240,174 @@ def get_directory(path):
     else:
         return os.path.abspath(os.path.dirname(path))
 
+# Separates an archive from a directory or image inside it, such as "deck.zip!/front"
+ARCHIVE_SEPARATOR = '!/'
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+class ArchivePath(NamedTuple):
+    archive_path: str
+    member_path: str
+
+def parse_archive_path(path: str) -> ArchivePath | None:
+    """
+    Split a path inside an archive into the archive and the member path, which is empty for the whole archive.
+
+    "deck.zip" -> ("deck.zip", "")
+    "deck.zip!/front" -> ("deck.zip", "front")
+    """
+    archive_path, separator, member_path = str(path).partition(ARCHIVE_SEPARATOR)
+    if separator == '' and not archive_path.lower().endswith(ARCHIVE_EXTENSIONS):
+        return None
+
+    if not os.path.isfile(archive_path):
+        return None
+
+    return ArchivePath(archive_path, member_path.strip('/'))
+
+def join_image_path(dir_path: str, file: str) -> str:
+    archive = parse_archive_path(dir_path)
+    if archive is None:
+        return os.path.join(dir_path, file)
+
+    return archive.archive_path + ARCHIVE_SEPARATOR + '/'.join(part for part in (archive.member_path, file) if part)
+
+# Compressed tars start with the signature of their compression
+compressed_tar_openers: Dict[bytes, Callable[[str, str], BinaryIO]] = {
+    b'\x1f\x8b': gzip.open,
+    b'BZh': bz2.open,
+    b'\xfd7zXZ\x00': lzma.open,
+}
+
+def open_tar_archive(path: str) -> tarfile.TarFile:
+    """
+    Open a tar archive. A compressed tar is decompressed once into a temporary file, since reading its members
+    out of order would decompress it again from the start for every backward seek.
+    """
+    with open(path, 'rb') as archive_file:
+        signature = archive_file.read(6)
+
+    for compressed_signature, open_compressed in compressed_tar_openers.items():
+        if signature.startswith(compressed_signature):
+            tar_file = tempfile.TemporaryFile()
+            with open_compressed(path, 'rb') as compressed_file:
+                shutil.copyfileobj(compressed_file, tar_file)
+            tar_file.seek(0)
+            return tarfile.open(fileobj=tar_file)
+
+    return tarfile.open(path)
+
+class CardArchive:
+    """
+    Reads the images in a zip or tar archive without extracting them.
+
+    All members are read through one file handle, so reads are serialized.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.zip_file: zipfile.ZipFile | None = None
+        self.tar_file: tarfile.TarFile | None = None
+
+        if zipfile.is_zipfile(path):
+            self.zip_file = zipfile.ZipFile(path)
+            names = [info.filename for info in self.zip_file.infolist() if not info.is_dir()]
+        elif tarfile.is_tarfile(path):
+            self.tar_file = open_tar_archive(path)
+            self.tar_members = {member.name: member for member in self.tar_file.getmembers() if member.isfile()}
+            names = list(self.tar_members)
+        else:
+            raise Exception(f'Archive "{path}" is not a zip or tar file.')
+
+        self.member_hashes: Dict[str, str] | None = None
+
+        # Skip files added by macOS and Windows, keeping the order of the archive
+        self.names = [
+            name for name in names
+            if '__MACOSX/' not in name and os.path.basename(name) not in EXTRANEOUS_FILES and not os.path.basename(name).startswith('._')
+        ]
+
+    def read(self, name: str, size: int = -1) -> bytes:
+        with self.lock:
+            if self.zip_file is not None:
+                with self.zip_file.open(name) as member_file:
+                    return member_file.read(size)
+
+            return self.tar_file.extractfile(self.tar_members[name]).read(size)
+
+    def hash(self, name: str) -> str:
+        """
+        Get the SHA-256 of a member. Every member is hashed in one pass in archive order on the first call,
+        instead of seeking back and forth between the members of each sheet.
+        """
+        with self.lock:
+            if self.member_hashes is None:
+                member_hashes = {}
+                for member_name in self.names:
+                    if self.zip_file is not None:
+                        with self.zip_file.open(member_name) as member_file:
+                            member_hashes[member_name] = hashlib.file_digest(member_file, 'sha256').hexdigest()
+                    else:
+                        member_hashes[member_name] = hashlib.file_digest(self.tar_file.extractfile(self.tar_members[member_name]), 'sha256').hexdigest()
+
+                self.member_hashes = member_hashes
+
+            return self.member_hashes[name]
+
+    def get_image_names(self, dir_name: str) -> List[str]:
+        """
+        Get the images in a directory of the archive and its subdirectories, relative to the directory.
+        """
+        prefix = dir_name + '/' if dir_name else ''
+        return [
+            name[len(prefix):] for name in self.names
+            if name.startswith(prefix) and filetype.guess_mime(self.read(name, 261)) in valid_mimetypes
+        ]
+
+    def has_dir(self, dir_name: str) -> bool:
+        return dir_name == '' or any(name.startswith(dir_name + '/') for name in self.names)
+
+    def resolve(self, name: str) -> str:
+        """
+        Get the member with the name, or otherwise the member with the same name and any extension.
+        """
+        if name in self.names:
+            return name
+
+        stem = os.path.splitext(name)[0]
+        matches = [member_name for member_name in self.names if os.path.splitext(member_name)[0] == stem]
+
+        if len(matches) == 0:
+            raise FileNotFoundError(f'Missing image: {self.path}{ARCHIVE_SEPARATOR}{stem}.*')
+
+        if len(matches) > 1:
+            raise ValueError(f'Ambiguous image match: {matches}')
+
+        return matches[0]
+
+@functools.lru_cache(maxsize=None)
+def _open_card_archive(path: str, pid: int) -> CardArchive:
+    return CardArchive(path)
+
+def open_card_archive(path: str) -> CardArchive:
+    # Worker processes must not share the file position of their parent's handle
+    return _open_card_archive(os.path.abspath(path), os.getpid())
+
+def read_archive_image(path: str) -> bytes:
+    archive = parse_archive_path(path)
+    return open_card_archive(archive.archive_path).read(archive.member_path)
+
+def image_directory_exists(path: str) -> bool:
+    archive = parse_archive_path(path)
+    if archive is None:
+        return os.path.isdir(path)
+
+    return open_card_archive(archive.archive_path).has_dir(archive.member_path)
+
 def get_image_file_paths(dir_path: str) -> List[str]:
+    archive = parse_archive_path(dir_path)
+    if archive is not None:
+        return open_card_archive(archive.archive_path).get_image_names(archive.member_path)
+
     result = []
 
     for current_folder, _, files in os.walk(dir_path):
@@ -176,7 +426,10 @@ def get_image_file_paths(dir_path: str) -> List[str]:
 def get_back_card_image_path(back_dir_path) -> str | None:
     # List all files in the directory that are pngs and jpegs
     # The directory may contain markdown and/or other files
-    files = [f for f in Path(back_dir_path).glob("*") if f.is_file() and filetype.guess_mime(f) in valid_mimetypes]
+    if parse_archive_path(back_dir_path) is not None:
+        files = [join_image_path(back_dir_path, name) for name in get_image_file_paths(back_dir_path) if '/' not in name]
+    else:
+        files = [str(f) for f in Path(back_dir_path).glob("*") if f.is_file() and filetype.guess_mime(f) in valid_mimetypes]
 
     if len(files) == 0:
         return None
@@ -200,26 +453,43 @@ def get_back_card_image_path(back_dir_path) -> str | None:
 
     return files[index]
 
-def crop_and_scale_image(
-    card_image: Image.Image,
+class Resample(str, Enum):
+    FAST = "fast"
+    STANDARD = "standard"
+    HIGH = "high"
+
+# Resampling filter and reducing gap used when scaling card images
+# A reducing gap lets Pillow shrink large images by an integer factor before the final resample
+resample_presets: Dict[Resample, tuple[Image.Resampling, float | None]] = {
+    Resample.FAST: (Image.Resampling.BILINEAR, 1.0),
+    Resample.STANDARD: (Image.Resampling.BICUBIC, 2.0),
+    Resample.HIGH: (Image.Resampling.LANCZOS, None),
+}
+
+def calculate_crop_box(
+    card_width: int,
+    card_height: int,
     crop_percent_x: float,
     crop_percent_y: float,
     scaled_width: int,
     scaled_height: int,
     scaled_bleed_width: int,
     scaled_bleed_height: int
-) -> tuple[Image.Image, int, int, tuple[int, int]]:
+) -> tuple[tuple[float, float, float, float], tuple[int, int], int, int, tuple[int, int]]:
     """
-    Crop and scale a card image, returning the processed image and bleed offsets.
+    Calculate the region of a card image to keep and the size to scale it to.
 
     Returns:
         tuple of:
-        - processed_image: The cropped and scaled card image
+        - crop_box: The region of the card image to keep
+        - scaled_size: The size of the region after scaling
         - bleed_offset_x: X position adjustment when bleed is included in image (negative or 0)
         - bleed_offset_y: Y position adjustment when bleed is included in image (negative or 0)
         - synthetic_bleed: (width, height) of bleed to generate artificially, (0, 0) if real bleed was used
     """
-    card_width, card_height = card_image.size
+    # Without a crop, the whole image is scaled to the card size
+    if crop_percent_x <= 0 and crop_percent_y <= 0:
+        return (0, 0, card_width, card_height), (scaled_width, scaled_height), 0, 0, (scaled_bleed_width, scaled_bleed_height)
 
     # Calculate the original size minus the desired crop: "cropped size"
     cropped_width = math.floor(card_width * (1 - (crop_percent_x / 100)))
@@ -242,88 +512,105 @@ def crop_and_scale_image(
     if unscaled_width_with_bleed < card_width and unscaled_height_with_bleed < card_height:
         crop_x = (card_width - unscaled_width_with_bleed) // 2
         crop_y = (card_height - unscaled_height_with_bleed) // 2
-        card_image = card_image.crop((
-            crop_x,
-            crop_y,
-            card_width - crop_x,
-            card_height - crop_y,
-        ))
-        card_image = card_image.resize((scaled_width_with_bleed, scaled_height_with_bleed))
+        crop_box = (crop_x, crop_y, card_width - crop_x, card_height - crop_y)
 
         # Offset position to account for bleed included in image
-        return card_image, -scaled_bleed_width, -scaled_bleed_height, (0, 0)
+        return crop_box, (scaled_width_with_bleed, scaled_height_with_bleed), -scaled_bleed_width, -scaled_bleed_height, (0, 0)
 
     # Otherwise, crop the card to the cropped size, then resize it to the scaled size
     crop_x = card_width * (crop_percent_x / 100) // 2
     crop_y = card_height * (crop_percent_y / 100) // 2
-    card_image = card_image.crop((
-        crop_x,
-        crop_y,
-        card_width - crop_x,
-        card_height - crop_y,
-    ))
-    card_image = card_image.resize((scaled_width, scaled_height))
+    crop_box = (crop_x, crop_y, card_width - crop_x, card_height - crop_y)
 
-    return card_image, 0, 0, (scaled_bleed_width, scaled_bleed_height)
+    return crop_box, (scaled_width, scaled_height), 0, 0, (scaled_bleed_width, scaled_bleed_height)
 
+def crop_and_scale_image(
+    card_image: Image.Image,
+    crop_percent_x: float,
+    crop_percent_y: float,
+    scaled_width: int,
+    scaled_height: int,
+    scaled_bleed_width: int,
+    scaled_bleed_height: int,
+    resample: Resample = Resample.STANDARD
+) -> tuple[Image.Image, int, int, tuple[int, int]]:
+    """
+    Crop and scale a card image, returning the processed image and bleed offsets.
 
-def draw_card_with_bleed(card_image: Image.Image, base_image: Image.Image, x: int, y: int, print_bleed: tuple[int, int]):
-    bleed_width, bleed_height = print_bleed
-
-    width, height = card_image.size
-    base_image.paste(card_image, (x, y))
+    Returns:
+        tuple of:
+        - processed_image: The cropped and scaled card image
+        - bleed_offset_x: X position adjustment when bleed is included in image (negative or 0)
+        - bleed_offset_y: Y position adjustment when bleed is included in image (negative or 0)
+        - synthetic_bleed: (width, height) of bleed to generate artificially, (0, 0) if real bleed was used
+    """
+    crop_box, scaled_size, bleed_offset_x, bleed_offset_y, synthetic_bleed = calculate_crop_box(
+        card_image.width,
+        card_image.height,
+        crop_percent_x,
+        crop_percent_y,
+        scaled_width,
+        scaled_height,
+        scaled_bleed_width,
+        scaled_bleed_height
+    )
+
+    resample_filter, reducing_gap = resample_presets[resample]
+    card_image = card_image.resize(scaled_size, resample_filter, box=crop_box, reducing_gap=reducing_gap)
+
+    return card_image, bleed_offset_x, bleed_offset_y, synthetic_bleed
+
+def extend_image_edges(card_image: Image.Image, bleed_width: int, bleed_height: int) -> Image.Image:
+    """
+    Return a copy of the card image with its edge pixels replicated outwards by the bleed on every side.
 
-    class Axis(int, Enum):
-        X = 0
-        Y = 1
+    Corners are filled with the nearest corner pixel.
+    """
+    if bleed_width <= 0 and bleed_height <= 0:
+        return card_image
 
-    def extend_edge(crop_box: tuple[int, int, int, int], start: tuple[int, int], bleed: int, axis: Axis):
-        for bleed_i in range(bleed):
-            pos = (
-                start[0] + (bleed_i if axis == Axis.X else 0),
-                start[1] + (bleed_i if axis == Axis.Y else 0)
-            )
+    # NumPy cannot represent palette and bilevel images faithfully, so convert them like paste() would
+    if card_image.mode not in ('L', 'RGB', 'RGBA'):
+        card_image = card_image.convert('RGB')
 
-            base_image.paste(card_image.crop(crop_box), pos)
+    card_array = np.asarray(card_image)
+    padding = [(bleed_height, bleed_height), (bleed_width, bleed_width)]
+    padding += [(0, 0)] * (card_array.ndim - 2)
 
-    # Extend the edges of the cards to create print bleed
-    # Top and bottom
-    extend_edge((0, 0, width, 1), (x, y - bleed_height), bleed_height, Axis.Y)
-    extend_edge((0, height - 1, width, height), (x, y + height), bleed_height, Axis.Y)
+    return Image.fromarray(np.pad(card_array, padding, mode='edge'))
 
-    # Left and right
-    extend_edge((0, 0, 1, height), (x - bleed_width, y), bleed_width, Axis.X)
-    extend_edge((width - 1, 0, width, height), (x + width, y), bleed_width, Axis.X)
+def draw_card_with_bleed(card_image: Image.Image, base_image: Image.Image, x: int, y: int, print_bleed: tuple[int, int]):
+    bleed_width, bleed_height = print_bleed
 
-    # Corners
-    for bleed_width, crop_x, pos_x in [(bleed_width, 0, x - bleed_width), (bleed_width, width - 1, x + width)]:
-        for bleed_height, crop_y, pos_y in [(bleed_height, 0, y - bleed_height), (bleed_height, height - 1, y + height)]:
-            for x_bleed_i in range(bleed_width):
-                for y_bleed_i in range(bleed_height):
-                    base_image.paste(card_image.crop((crop_x, crop_y, crop_x + 1, crop_y + 1)), (pos_x + x_bleed_i, pos_y + y_bleed_i))
+    # Extend the edges of the cards to create print bleed in a single paste
+    bleed_image = extend_image_edges(card_image, bleed_width, bleed_height)
+    base_image.paste(bleed_image, (x - bleed_width, y - bleed_height))
 
     return base_image
 
-def draw_card_layout(
-    card_images: List[Image.Image | None],
-    single_back_image: Image.Image,
-    base_image: Image.Image,
-    num_rows: int,
-    num_cols: int,
-    x_pos: List[int],
-    y_pos: List[int],
+class CardTile(NamedTuple):
+    """
+    A card image that has been cropped, scaled and flipped, ready to be drawn in any slot.
+    """
+    image: Image.Image
+    # Position adjustment relative to the slot position
+    offset_x: int
+    offset_y: int
+    # Bleed to generate artificially around the image
+    bleed: tuple[int, int]
+
+def render_card_tile(
+    card_image: Image.Image,
     width: int,
     height: int,
     print_bleed: tuple[int, int],
     crop: tuple[float, float],
-    crop_backs: tuple[float, float],
     ppi_ratio: float,
     extend_corners: int,
-    flip: bool
-):
-    num_cards = num_rows * num_cols
+    flip: bool,
+    resample: Resample = Resample.STANDARD
+) -> CardTile:
     crop_percent_x, crop_percent_y = crop
-    crop_backs_percent_x, crop_backs_percent_y = crop_backs
 
     extend_corners_thickness = math.floor(extend_corners * ppi_ratio)
 
@@ -334,83 +621,731 @@ def draw_card_layout(
     scaled_bleed_width = math.ceil(print_bleed[0] * ppi_ratio)
     scaled_bleed_height = math.ceil(print_bleed[1] * ppi_ratio)
 
+    crop_box, scaled_size, bleed_offset_x, bleed_offset_y, synthetic_bleed = calculate_crop_box(
+        card_image.width,
+        card_image.height,
+        crop_percent_x,
+        crop_percent_y,
+        scaled_width,
+        scaled_height,
+        scaled_bleed_width,
+        scaled_bleed_height
+    )
+
+    # Extend the corners if required
+    # Shrink the crop box by the thickness instead of cropping the scaled image again
+    if extend_corners_thickness > 0:
+        left, top, right, bottom = crop_box
+        inset_x = extend_corners_thickness * (right - left) / scaled_size[0]
+        inset_y = extend_corners_thickness * (bottom - top) / scaled_size[1]
+
+        crop_box = (left + inset_x, top + inset_y, right - inset_x, bottom - inset_y)
+        scaled_size = (scaled_size[0] - 2 * extend_corners_thickness, scaled_size[1] - 2 * extend_corners_thickness)
+
+    # Crop and scale in a single resampling pass
+    resample_filter, reducing_gap = resample_presets[resample]
+    card_image = card_image.resize(scaled_size, resample_filter, box=crop_box, reducing_gap=reducing_gap)
+
+    if flip:
+        card_image = card_image.transpose(Image.Transpose.ROTATE_180)
+
+    return CardTile(
+        card_image,
+        bleed_offset_x + extend_corners_thickness,
+        bleed_offset_y + extend_corners_thickness,
+        (synthetic_bleed[0] + extend_corners_thickness, synthetic_bleed[1] + extend_corners_thickness)
+    )
+
+def get_registration_rects(paper_layout: PaperLayout, registration_marks: RegistrationMarks, registration: Registration) -> tuple[tuple[float, float, float, float], ...]:
+    """
+    Get the rectangles that make up the registration marks as (left, top, right, bottom) at 300 PPI.
+
+    Every corner has an L-shaped mark. With 3-point registration, the square corner has a square
+    instead and the opposite corner is left empty.
+    """
+    inset = registration_marks.inset
+    length = registration_marks.length
+    thickness = registration_marks.thickness
+
+    opposite_corners = {
+        Corner.TOP_LEFT: Corner.BOTTOM_RIGHT,
+        Corner.TOP_RIGHT: Corner.BOTTOM_LEFT,
+        Corner.BOTTOM_LEFT: Corner.TOP_RIGHT,
+        Corner.BOTTOM_RIGHT: Corner.TOP_LEFT
+    }
+
+    rects = []
+    for corner in Corner:
+        # Outside corner of the mark and the directions its arms point to
+        left = corner in (Corner.TOP_LEFT, Corner.BOTTOM_LEFT)
+        top = corner in (Corner.TOP_LEFT, Corner.TOP_RIGHT)
+        x = inset if left else paper_layout.width - inset
+        y = inset if top else paper_layout.height - inset
+        direction_x = 1 if left else -1
+        direction_y = 1 if top else -1
+
+        if Registration(registration) == Registration.THREE:
+            if corner == opposite_corners[paper_layout.registration_square]:
+                continue
+
+            if corner == paper_layout.registration_square:
+                size = registration_marks.square_size
+                rects.append((x, y, x + direction_x * size, y + direction_y * size))
+                continue
+
+        # Horizontal and vertical arms
+        rects.append((x, y, x + direction_x * length, y + direction_y * thickness))
+        rects.append((x, y, x + direction_x * thickness, y + direction_y * length))
+
+    # Normalize so that left <= right and top <= bottom
+    return tuple((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)) for x0, y0, x1, y1 in rects)
+
+def draw_registration_marks(base_image: Image.Image, rects: Iterable[tuple[float, float, float, float]], ppi_ratio: float, top: int = 0):
+    """
+    Draw registration mark rectangles at the output PPI. `top` is the position of the image on the page when drawing on a strip.
+
+    Edges are rounded to whole pixels so the marks stay sharp.
+    """
+    draw = ImageDraw.Draw(base_image)
+    for left, upper, right, lower in rects:
+        x0, y0, x1, y1 = [round(v * ppi_ratio) for v in (left, upper, right, lower)]
+        if x1 > x0 and y1 > y0:
+            draw.rectangle((x0, y0 - top, x1 - 1, y1 - 1 - top), fill=(0, 0, 0))
+
+@functools.lru_cache(maxsize=4)
+def render_registration_image(page_size: tuple[int, int], rects: tuple[tuple[float, float, float, float], ...], ppi_ratio: float) -> Image.Image:
+    """
+    Draw a blank page with registration marks. The result is shared between callers, so copy it before drawing on it.
+    """
+    registration_image = Image.new('RGB', page_size, (255, 255, 255))
+    draw_registration_marks(registration_image, rects, ppi_ratio)
+    return registration_image
+
+def get_card_position(index: int, num_rows: int, num_cols: int, x_pos: List[int], y_pos: List[int], ppi_ratio: float, flip: bool) -> tuple[int, int]:
+    num_cards = num_rows * num_cols
+
+    col = index % num_cards % num_cols
+    row = (index % num_cards) // num_cols
+    if flip:
+        row = num_rows - row - 1
+
+    return math.floor(x_pos[col] * ppi_ratio), math.floor(y_pos[row] * ppi_ratio)
+
+def draw_card_layout(
+    card_images: List[Image.Image | CardTile | None],
+    single_back_image: Image.Image,
+    base_image: Image.Image,
+    num_rows: int,
+    num_cols: int,
+    x_pos: List[int],
+    y_pos: List[int],
+    width: int,
+    height: int,
+    print_bleed: tuple[int, int],
+    crop: tuple[float, float],
+    crop_backs: tuple[float, float],
+    ppi_ratio: float,
+    extend_corners: int,
+    flip: bool,
+    resample: Resample = Resample.STANDARD
+):
     # Fill all the spaces with the card back
     for i, card_image in enumerate(card_images):
         if card_image is None:
             continue
 
         # Calculate base position from layout
-        col = i % num_cards % num_cols
-        row = (i % num_cards) // num_cols
-        if flip:
-            row = num_rows - row - 1
-
-        base_x = math.floor(x_pos[col] * ppi_ratio)
-        base_y = math.floor(y_pos[row] * ppi_ratio)
-
-        # Default: use synthetic bleed, no position offset needed
-        bleed_offset_x = 0
-        bleed_offset_y = 0
-        synthetic_bleed = (scaled_bleed_width, scaled_bleed_height)
-
-        # Determine which crop percentages to use
-        if card_image is single_back_image:
-            active_crop_x, active_crop_y = crop_backs_percent_x, crop_backs_percent_y
-        else:
-            active_crop_x, active_crop_y = crop_percent_x, crop_percent_y
-
-        # Apply cropping and scaling if required
-        if active_crop_x > 0 or active_crop_y > 0:
-            # Returns: (image, x_offset, y_offset, synthetic_bleed_to_generate)
-            card_image, bleed_offset_x, bleed_offset_y, synthetic_bleed = crop_and_scale_image(
-                card_image,
-                active_crop_x,
-                active_crop_y,
-                scaled_width,
-                scaled_height,
-                scaled_bleed_width,
-                scaled_bleed_height
-            )
-        else:
-            card_image = card_image.resize((scaled_width, scaled_height))
-
-        # Extend the corners if required
-        card_image = card_image.crop((
-            extend_corners_thickness,
-            extend_corners_thickness,
-            card_image.width - extend_corners_thickness,
-            card_image.height - extend_corners_thickness
-        ))
+        base_x, base_y = get_card_position(i, num_rows, num_cols, x_pos, y_pos, ppi_ratio, flip)
 
-        if flip:
-            card_image = card_image.rotate(180)
+        # Tiles have already been cropped and scaled
+        if isinstance(card_image, CardTile):
+            card_tile = card_image
+        else:
+            # Determine which crop percentages to use
+            active_crop = crop_backs if card_image is single_back_image else crop
+            card_tile = render_card_tile(card_image, width, height, print_bleed, active_crop, ppi_ratio, extend_corners, flip, resample)
 
         # Calculate final position
-        x = base_x + bleed_offset_x + extend_corners_thickness
-        y = base_y + bleed_offset_y + extend_corners_thickness
+        x = base_x + card_tile.offset_x
+        y = base_y + card_tile.offset_y
 
-        draw_card_with_bleed(card_image, base_image, x, y, (synthetic_bleed[0] + extend_corners_thickness, synthetic_bleed[1] + extend_corners_thickness))
+        draw_card_with_bleed(card_tile.image, base_image, x, y, card_tile.bleed)
 
-def add_front_back_pages(front_page: Image.Image, back_page: Image.Image, pages: List[Image.Image], page_width: int, page_height: int, ppi_ratio: float, template: str, only_fronts: bool, name: str):
-    # Add template version number to the back
-    draw = ImageDraw.Draw(front_page)
-    font = ImageFont.truetype(os.path.join(asset_directory, 'arial.ttf'), 40 * ppi_ratio)
+class SheetLabel(NamedTuple):
+    text: str
+    # Middle of the top of the text
+    x: int
+    y: int
+    font_size: float
 
+def get_sheet_label(num_sheet: int, page_width: int, page_height: int, ppi_ratio: float, template: str, name: str | None) -> SheetLabel:
     # "Raw" specified location
-    num_sheet = len(pages) + 1
-    if not only_fronts:
-        num_sheet = int(len(pages) / 2) + 1
-
     label = f'sheet: {num_sheet}, template: {template}'
     if name is not None:
         label = f'name: {name}, {label}'
 
-    draw.text((math.floor((page_width / 2) * ppi_ratio), math.floor((page_height - 140) * ppi_ratio)), label, fill = (0, 0, 0), anchor="ma", font=font)
+    return SheetLabel(label, math.floor((page_width / 2) * ppi_ratio), math.floor((page_height - 140) * ppi_ratio), 40 * ppi_ratio)
+
+@functools.lru_cache(maxsize=4)
+def get_label_font(font_size: float) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(os.path.join(asset_directory, 'arial.ttf'), font_size)
+
+def draw_sheet_label(image: Image.Image, label: SheetLabel, top: int = 0):
+    """
+    Label the front page of a sheet. `top` is the position of the image on the page when drawing on a strip.
+    """
+    # Add template version number to the back
+    draw = ImageDraw.Draw(image)
+    draw.text((label.x, label.y - top), label.text, fill = (0, 0, 0), anchor="ma", font=get_label_font(label.font_size))
+
+class EncodedImage(NamedTuple):
+    """
+    An image that is already compressed, so it can be written to a PDF or PNG file without touching its pixels again.
+
+    "DCTDecode" images hold a JPEG file. "FlateDecode" images hold the data of PNG IDAT chunks,
+    which PDF readers decode with PNG predictors.
+    """
+    size: tuple[int, int]
+    # 'RGB' or 'L'
+    mode: str
+    filter: str
+    data: bytes
+
+class PageStrips(NamedTuple):
+    """
+    A page that is composed as horizontal strips, from top to bottom, so the whole page never has to be in memory.
+    """
+    size: tuple[int, int]
+    strips: Iterable[Image.Image | EncodedImage]
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# PNG color types for the image modes that can be passed through
+PNG_COLOR_TYPES = {'L': 0, 'RGB': 2}
+
+def write_png_chunk(png_file: BinaryIO, chunk_type: bytes, data: bytes):
+    png_file.write(struct.pack('>I', len(data)) + chunk_type + data)
+    png_file.write(struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+def read_png_stream(png_bytes: bytes) -> EncodedImage | None:
+    """
+    Get the compressed pixel data of a PNG file. Returns None if a PDF cannot use the data as it is,
+    such as for palette, transparent, 16-bit or interlaced images.
+    """
+    if not png_bytes.startswith(PNG_SIGNATURE):
+        return None
+
+    size = None
+    mode = None
+    idat_chunks = []
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(png_bytes):
+        length, chunk_type = struct.unpack('>I4s', png_bytes[position:position + 8])
+        data = png_bytes[position + 8:position + 8 + length]
+        position += 12 + length
+
+        if chunk_type == b'IHDR':
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', data)
+            modes = {color: mode for mode, color in PNG_COLOR_TYPES.items()}
+            if bit_depth != 8 or interlace != 0 or color_type not in modes:
+                return None
+
+            size = (width, height)
+            mode = modes[color_type]
+        elif chunk_type == b'IDAT':
+            idat_chunks.append(data)
+        elif chunk_type == b'tRNS':
+            return None
+        elif chunk_type == b'IEND':
+            break
+
+    if size is None or len(idat_chunks) == 0:
+        return None
+
+    return EncodedImage(size, mode, 'FlateDecode', b''.join(idat_chunks))
+
+def compress_png_rows(strips: Iterable[Image.Image], width: int) -> Iterator[bytes]:
+    """
+    Compress RGB strips into PNG IDAT data one strip at a time.
+    """
+    compressor = zlib.compressobj()
+    row_size = width * 3
+    for strip in strips:
+        if strip.mode != 'RGB':
+            strip = strip.convert('RGB')
+
+        # Every row starts with its filter type, which is always "none"
+        strip_bytes = strip.tobytes()
+        rows = b''.join(b'\x00' + strip_bytes[i:i + row_size] for i in range(0, len(strip_bytes), row_size))
+
+        compressed_rows = compressor.compress(rows)
+        if compressed_rows:
+            yield compressed_rows
+
+    yield compressor.flush()
+
+def save_png_stream(path: str, size: tuple[int, int], mode: str, idat_chunks: Iterable[bytes]):
+    width, height = size
+
+    with open(path, 'wb') as png_file:
+        png_file.write(PNG_SIGNATURE)
+        write_png_chunk(png_file, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, PNG_COLOR_TYPES[mode], 0, 0, 0))
+
+        for idat_chunk in idat_chunks:
+            write_png_chunk(png_file, b'IDAT', idat_chunk)
+
+        write_png_chunk(png_file, b'IEND', b'')
+
+def encode_image(image: Image.Image, filter: str, quality: int) -> EncodedImage:
+    if image.mode not in PNG_COLOR_TYPES:
+        image = image.convert('RGB')
+
+    stream = io.BytesIO()
+    if filter == 'FlateDecode':
+        image.save(stream, format='PNG')
+        return read_png_stream(stream.getvalue())
+
+    # Encode the same way as Pillow's PDF plugin
+    image.save(stream, format='JPEG', quality=quality, subsampling=0)
+    return EncodedImage(image.size, image.mode, filter, stream.getvalue())
+
+def encode_page(page: Image.Image | EncodedImage | PageStrips, filter: str, quality: int) -> EncodedImage | PageStrips:
+    """
+    Compress a page so it can be sent between processes and written without being encoded again.
+
+    Pages drawn in strips stay in strips for JPEG, but are combined into a single image for PNG.
+    Pages and strips that are already encoded are kept as they are.
+    """
+    if isinstance(page, EncodedImage):
+        return page
+
+    if not isinstance(page, PageStrips):
+        return encode_image(page, filter, quality)
+
+    if filter == 'FlateDecode':
+        return EncodedImage(page.size, 'RGB', filter, b''.join(compress_png_rows(page.strips, page.size[0])))
+
+    return PageStrips(page.size, [strip if isinstance(strip, EncodedImage) else encode_image(strip, filter, quality) for strip in page.strips])
+
+class CardPlacement(NamedTuple):
+    image: Image.Image
+    # Position of the top left corner of the image on the page
+    x: int
+    y: int
+    # Bleed to generate artificially around the image
+    bleed: tuple[int, int]
+
+class VectorPage(NamedTuple):
+    """
+    A page that is written to a PDF as separate registration marks, card images and label,
+    so images that repeat across pages are only stored once.
+    """
+    size: tuple[int, int]
+    # Rectangles of the registration marks at 300 PPI
+    registration_rects: tuple[tuple[float, float, float, float], ...]
+    placements: List[CardPlacement]
+    label: SheetLabel | None
+    # PDF transform of the card images, such as the offset of back pages
+    card_matrix: tuple[float, float, float, float, float, float] | None = None
+
+class ShapeText(NamedTuple):
+    text: str
+    # Position of the anchor of the text, in pixels at 300 PPI
+    x: float
+    y: float
+    font_size: float
+    # RGB color from 0 to 1
+    color: tuple[float, float, float]
+    # Pillow text anchor, such as 'mm' for the middle of the text
+    anchor: str = 'la'
+
+class ShapePage(NamedTuple):
+    """
+    A page of filled rectangles and text, written to a PDF as vector shapes, such as a calibration sheet.
+    """
+    # Size in pixels at 300 PPI
+    size: tuple[float, float]
+    # Rectangles as (left, top, right, bottom) at 300 PPI with their RGB color from 0 to 1
+    rects: List[tuple[tuple[float, float, float, float], tuple[float, float, float]]]
+    texts: List[ShapeText]
+
+def get_pdf_rects_contents(rects: Iterable[tuple[float, float, float, float]], page_height: float) -> bytes:
+    """
+    Get the PDF content that fills rectangles given as (left, top, right, bottom) at 300 PPI with the origin at the top left.
+    """
+    scale = 72.0 / 300
+    return b''.join(
+        b'%f %f %f %f re f\n' % (left * scale, page_height - bottom * scale, (right - left) * scale, (bottom - top) * scale)
+        for left, top, right, bottom in rects
+    )
+
+def escape_pdf_string(text: str) -> bytes:
+    text_bytes = text.encode('cp1252', errors='replace')
+    return text_bytes.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+class PdfPageWriter:
+    """
+    Writes a PDF one page at a time.
+
+    Each page is encoded and written to disk as soon as it is added, so no page needs to be kept in memory.
+    Pages that are already encoded are copied into the PDF as they are.
+
+    With `append`, an existing PDF is updated in place, so its pages can be replaced one at a time instead of added.
+    """
+    page_filter = 'DCTDecode'
+
+    def __init__(self, path: str, resolution: float, quality: int, keywords: str | None = None, append: bool = False):
+        self.path = path
+        self.resolution = resolution
+        self.quality = quality
+        self.append = append
+
+        if append:
+            # New objects are written after the existing ones, and replace them where they share an object number
+            self.pdf = PdfParser.PdfParser(filename=path, mode='r+b')
+            self.media_boxes = [self.pdf.read_indirect(page_ref).get(b'MediaBox') for page_ref in self.pdf.pages]
+            self.pdf.start_writing()
+        else:
+            self.pdf = PdfParser.PdfParser(filename=path, mode='w+b')
+            self.pdf.start_writing()
+            self.pdf.write_header()
+            self.pdf.write_comment('created by Silhouette Card Maker')
+
+            # The page tree is written last, but every page needs to reference it
+            self.pdf.pages_ref = self.pdf.next_object_id(0)
+
+        # Objects shared between vector pages
+        self.card_image_refs: Dict[bytes, PdfParser.IndirectReference] = {}
+        self.recent_card_images: OrderedDict[int, tuple[Image.Image, PdfParser.IndirectReference]] = OrderedDict()
+        self.registration_refs: Dict[tuple, PdfParser.IndirectReference] = {}
+        self.font_ref: PdfParser.IndirectReference | None = None
+
+        self.pdf.info['Title'] = os.path.splitext(os.path.basename(path))[0]
+        if keywords is not None:
+            self.pdf.info['Keywords'] = keywords
+        self.pdf.info['CreationDate'] = time.gmtime()
+        self.pdf.info['ModDate'] = time.gmtime()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+
+        # Do not leave an unreadable PDF behind
+        self.pdf.close()
+        os.remove(self.path)
+
+    def write_image(self, image: Image.Image | EncodedImage) -> PdfParser.IndirectReference:
+        if not isinstance(image, EncodedImage):
+            image = encode_image(image, self.page_filter, self.quality)
+
+        width, height = image.size
+        colors = 3 if image.mode == 'RGB' else 1
+
+        image_params = {}
+        if image.filter == 'FlateDecode':
+            # The data is PNG IDAT data, where every row starts with its PNG filter type
+            image_params['DecodeParms'] = PdfParser.PdfDict(Predictor=15, Colors=colors, BitsPerComponent=8, Columns=width)
+
+        return self.pdf.write_obj(
+            None,
+            stream=image.data,
+            Type=PdfParser.PdfName('XObject'),
+            Subtype=PdfParser.PdfName('Image'),
+            Width=width,
+            Height=height,
+            Filter=PdfParser.PdfName(image.filter),
+            BitsPerComponent=8,
+            ColorSpace=PdfParser.PdfName('DeviceRGB' if colors == 3 else 'DeviceGray'),
+            **image_params
+        )
+
+    def add_page(self, page: Image.Image | EncodedImage | PageStrips | VectorPage | ShapePage, page_index: int | None = None):
+        """
+        Add a page at the end, or replace the page at `page_index` of an appended PDF with a raster page.
+        """
+        if self.append != (page_index is not None):
+            raise Exception('Pages can only be replaced in an appended PDF, and only added to a new one.')
+
+        if page_index is not None and isinstance(page, (VectorPage, ShapePage)):
+            raise Exception('Only raster pages can replace a page.')
+
+        if isinstance(page, VectorPage):
+            self.add_vector_page(page)
+            return
+
+        if isinstance(page, ShapePage):
+            self.add_shape_page(page)
+            return
+
+        width, height = page.size
+        page_width = width * 72.0 / self.resolution
+        page_height = height * 72.0 / self.resolution
+
+        # A replaced page keeps its size, which may not be a whole number of pixels
+        if page_index is not None:
+            media_box = self.media_boxes[page_index]
+            if media_box is not None:
+                page_width, page_height = media_box[2] - media_box[0], media_box[3] - media_box[1]
+
+        if isinstance(page, PageStrips):
+            # Write every strip as soon as it is drawn and stack them from the top of the page
+            images = {}
+            page_contents = b''
+            top = 0
+            for i, strip in enumerate(page.strips):
+                strip_name = f'strip{i}'
+                images[strip_name] = self.write_image(strip)
+
+                strip_pixel_height = strip.size[1]
+                strip_height = strip_pixel_height * 72.0 / self.resolution
+                strip_y = page_height - top * 72.0 / self.resolution - strip_height
+                page_contents += b'q %f 0 0 %f 0 %f cm /%s Do Q\n' % (page_width, strip_height, strip_y, strip_name.encode())
+
+                top += strip_pixel_height
+        else:
+            images = {'image': self.write_image(page)}
+            page_contents = b'q %f 0 0 %f 0 0 cm /image Do Q\n' % (page_width, page_height)
+
+        contents_ref = self.pdf.write_obj(None, stream=page_contents)
+
+        page_ref = self.pdf.write_page(
+            page_index,
+            Resources=PdfParser.PdfDict(
+                ProcSet=[PdfParser.PdfName('PDF'), PdfParser.PdfName('ImageC')],
+                XObject=PdfParser.PdfDict(images)
+            ),
+            MediaBox=[0, 0, page_width, page_height],
+            Contents=contents_ref
+        )
+        if page_index is None:
+            self.pdf.pages.append(page_ref)
+
+    def get_card_image_ref(self, image: Image.Image) -> PdfParser.IndirectReference:
+        """
+        Write a card image the first time it is seen and reuse it after that.
+        """
+        # The same image object is usually reused, such as the shared back, so check that before hashing
+        if id(image) in self.recent_card_images:
+            self.recent_card_images.move_to_end(id(image))
+            return self.recent_card_images[id(image)][1]
+
+        image_hash = hashlib.sha256(image.tobytes()).digest() + repr((image.mode, image.size)).encode()
+        image_ref = self.card_image_refs.get(image_hash)
+        if image_ref is None:
+            image_ref = self.write_image(image)
+            self.card_image_refs[image_hash] = image_ref
+
+        # Keep the image alive while it is remembered so its id cannot be reused
+        self.recent_card_images[id(image)] = (image, image_ref)
+        if len(self.recent_card_images) > 64:
+            self.recent_card_images.popitem(last=False)
+
+        return image_ref
+
+    def get_registration_ref(self, page_width: float, page_height: float, registration_rects: tuple[tuple[float, float, float, float], ...]) -> PdfParser.IndirectReference:
+        """
+        Write the registration marks once as a form that every page draws.
+        """
+        key = (page_width, page_height, registration_rects)
+        if key not in self.registration_refs:
+            registration_contents = b'0 g\n' + get_pdf_rects_contents(registration_rects, page_height)
+
+            self.registration_refs[key] = self.pdf.write_obj(
+                None,
+                stream=registration_contents,
+                Type=PdfParser.PdfName('XObject'),
+                Subtype=PdfParser.PdfName('Form'),
+                BBox=[0, 0, page_width, page_height]
+            )
+
+        return self.registration_refs[key]
+
+    def get_font_ref(self) -> PdfParser.IndirectReference:
+        # Helvetica is one of the standard PDF fonts and has the same widths as Arial
+        if self.font_ref is None:
+            self.font_ref = self.pdf.write_obj(
+                None,
+                Type=PdfParser.PdfName('Font'),
+                Subtype=PdfParser.PdfName('Type1'),
+                BaseFont=PdfParser.PdfName('Helvetica'),
+                Encoding=PdfParser.PdfName('WinAnsiEncoding')
+            )
+
+        return self.font_ref
+
+    def add_vector_page(self, page: VectorPage):
+        width, height = page.size
+        scale = 72.0 / self.resolution
+        page_width = width * scale
+        page_height = height * scale
+
+        def to_pdf_rect(left: float, top: float, right: float, bottom: float) -> tuple[float, float, float, float]:
+            # Convert pixels from the top left to points from the bottom left
+            return left * scale, page_height - bottom * scale, (right - left) * scale, (bottom - top) * scale
+
+        images = {'registration': self.get_registration_ref(page_width, page_height, page.registration_rects)}
+        page_contents = b'/registration Do\n'
+
+        if page.card_matrix is not None:
+            page_contents += b'q %f %f %f %f %f %f cm\n' % page.card_matrix
+
+        image_names: Dict[int, str] = {}
+        for placement in page.placements:
+            image_ref = self.get_card_image_ref(placement.image)
+            if image_ref.object_id not in image_names:
+                image_names[image_ref.object_id] = f'card{len(image_names)}'
+                images[image_names[image_ref.object_id]] = image_ref
+            image_name = image_names[image_ref.object_id].encode()
+
+            x, y = placement.x, placement.y
+            image_width, image_height = placement.image.size
+            bleed_width, bleed_height = placement.bleed
+
+            # The horizontal and vertical extent of the clip and the image for the left, middle and right parts.
+            # The bleed repeats the outermost pixels, so the image is stretched until one pixel covers the bleed.
+            horizontal_parts = [(x, x + image_width, x, x + image_width)]
+            if bleed_width > 0:
+                horizontal_parts.append((x - bleed_width, x, x - bleed_width, x - bleed_width + image_width * bleed_width))
+                horizontal_parts.append((x + image_width, x + image_width + bleed_width, x + image_width - (image_width - 1) * bleed_width, x + image_width + bleed_width))
+
+            vertical_parts = [(y, y + image_height, y, y + image_height)]
+            if bleed_height > 0:
+                vertical_parts.append((y - bleed_height, y, y - bleed_height, y - bleed_height + image_height * bleed_height))
+                vertical_parts.append((y + image_height, y + image_height + bleed_height, y + image_height - (image_height - 1) * bleed_height, y + image_height + bleed_height))
+
+            for clip_left, clip_right, image_left, image_right in horizontal_parts:
+                for clip_top, clip_bottom, image_top, image_bottom in vertical_parts:
+                    image_x, image_y, image_pdf_width, image_pdf_height = to_pdf_rect(image_left, image_top, image_right, image_bottom)
+                    page_contents += b'q %f %f %f %f re W n ' % to_pdf_rect(clip_left, clip_top, clip_right, clip_bottom)
+                    page_contents += b'%f 0 0 %f %f %f cm /%s Do Q\n' % (image_pdf_width, image_pdf_height, image_x, image_y, image_name)
+
+        if page.card_matrix is not None:
+            page_contents += b'Q\n'
+
+        resources = PdfParser.PdfDict(
+            ProcSet=[PdfParser.PdfName('PDF'), PdfParser.PdfName('ImageC')],
+            XObject=PdfParser.PdfDict(images)
+        )
+
+        if page.label is not None:
+            # Match the position of the label drawn on raster pages, which is anchored at the top of the text
+            font = get_label_font(page.label.font_size)
+            text_width = font.getlength(page.label.text)
+            ascent, _ = font.getmetrics()
+
+            page_contents += b'BT 0 g /label %f Tf %f %f Td (%s) Tj ET\n' % (
+                page.label.font_size * scale,
+                (page.label.x - text_width / 2) * scale,
+                page_height - (page.label.y + ascent) * scale,
+                escape_pdf_string(page.label.text)
+            )
+            resources['ProcSet'].append(PdfParser.PdfName('Text'))
+            resources['Font'] = PdfParser.PdfDict(label=self.get_font_ref())
+
+        contents_ref = self.pdf.write_obj(None, stream=page_contents)
+
+        page_ref = self.pdf.write_page(
+            None,
+            Resources=resources,
+            MediaBox=[0, 0, page_width, page_height],
+            Contents=contents_ref
+        )
+        self.pdf.pages.append(page_ref)
+
+    def add_shape_page(self, page: ShapePage):
+        scale = 72.0 / 300
+        page_width = page.size[0] * scale
+        page_height = page.size[1] * scale
+
+        # Fill rectangles of the same color together
+        page_contents = b''
+        rects_by_color: Dict[tuple[float, float, float], List[tuple[float, float, float, float]]] = {}
+        for rect, color in page.rects:
+            rects_by_color.setdefault(color, []).append(rect)
+
+        for color, rects in rects_by_color.items():
+            page_contents += b'%f %f %f rg\n' % color + get_pdf_rects_contents(rects, page_height)
+
+        resources = PdfParser.PdfDict(ProcSet=[PdfParser.PdfName('PDF')])
+
+        if len(page.texts) > 0:
+            page_contents += b'BT\n'
+            for text in page.texts:
+                # The PDF text position is the left of the baseline, so find how far the anchor is from there
+                font = get_label_font(text.font_size)
+                anchor_left, anchor_top, _, _ = font.getbbox(text.text, anchor=text.anchor)
+                baseline_left, baseline_top, _, _ = font.getbbox(text.text, anchor='ls')
+
+                page_contents += b'%f %f %f rg /label %f Tf 1 0 0 1 %f %f Tm (%s) Tj\n' % (
+                    *text.color,
+                    text.font_size * scale,
+                    (text.x + anchor_left - baseline_left) * scale,
+                    page_height - (text.y + anchor_top - baseline_top) * scale,
+                    escape_pdf_string(text.text)
+                )
+            page_contents += b'ET\n'
+
+            resources['ProcSet'].append(PdfParser.PdfName('Text'))
+            resources['Font'] = PdfParser.PdfDict(label=self.get_font_ref())
+
+        contents_ref = self.pdf.write_obj(None, stream=page_contents)
+
+        page_ref = self.pdf.write_page(
+            None,
+            Resources=resources,
+            MediaBox=[0, 0, page_width, page_height],
+            Contents=contents_ref
+        )
+        self.pdf.pages.append(page_ref)
+
+    def close(self):
+        # An appended PDF keeps its page tree, since its pages are only replaced
+        if self.append:
+            self.pdf.write_xref_and_trailer()
+            self.pdf.close()
+            return
+
+        # Write the page tree and catalog now that all pages are known
+        self.pdf.write_obj(self.pdf.pages_ref, Type=PdfParser.PdfName('Pages'), Count=len(self.pdf.pages), Kids=self.pdf.pages)
+        self.pdf.root_ref = self.pdf.write_obj(None, Type=PdfParser.PdfName('Catalog'), Pages=self.pdf.pages_ref)
+        self.pdf.write_xref_and_trailer()
+        self.pdf.close()
+
+class ImagePageWriter:
+    """
+    Writes every page to its own image file in a directory.
+    """
+    page_filter = 'FlateDecode'
+
+    def __init__(self, dir_path: str, resolution: float, quality: int, first_page: int = 1):
+        self.dir_path = dir_path
+        self.resolution = resolution
+        self.quality = quality
+        self.num_pages = first_page - 1
+
+    def __enter__(self):
+        return self
 
-    # Add a back page for every front page template
-    pages.append(front_page)
-    if not only_fronts:
-        pages.append(back_page)
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def add_page(self, page: Image.Image | EncodedImage | PageStrips):
+        self.num_pages += 1
+        page_path = os.path.join(self.dir_path, f'page{self.num_pages}.png')
+
+        if isinstance(page, EncodedImage) and page.filter != 'FlateDecode':
+            page = Image.open(io.BytesIO(page.data))
+
+        if isinstance(page, EncodedImage):
+            save_png_stream(page_path, page.size, page.mode, [page.data])
+        elif isinstance(page, PageStrips):
+            save_png_stream(page_path, page.size, 'RGB', compress_png_rows(page.strips, page.size[0]))
+        else:
+            page.save(page_path, resolution=self.resolution, speed=0, subsampling=0, quality=self.quality)
 
 def check_paths_subset(subset: set[str], mainset: set[str]) -> set[str]:
     """Return the items in `subset` whose basenames do NOT appear in `mainset`,
@@ -426,6 +1361,11 @@ def resolve_image_with_any_extension(path: str) -> str:
     Otherwise search for files with the same stem (basename)
     but any extension. Returns the resolved path or raises.
     """
+    # Images in an archive are resolved among its members
+    archive = parse_archive_path(path)
+    if archive is not None:
+        return archive.archive_path + ARCHIVE_SEPARATOR + open_card_archive(archive.archive_path).resolve(archive.member_path)
+
     p = Path(path)
 
     # Case 1: exact file exists
@@ -444,290 +1384,1596 @@ def resolve_image_with_any_extension(path: str) -> str:
 
     return matches[0]
 
-def generate_pdf(
-    front_dir_path: str,
-    back_dir_path: str,
-    ds_dir_path: str,
-    output_path: str,
-    output_images: bool,
-    card_size: CardSize,
-    paper_size: PaperSize,
-    registration: Registration,
-    only_fronts: bool,
-    crop_string: str | None,
-    crop_backs_string: str | None,
-    extend_corners: int,
-    ppi: int,
-    quality: int,
-    skip_indices: List[int],
-    load_offset: bool,
-    name: str
-):
-    # Sanity checks for the different directories
-    f_path = Path(front_dir_path)
-    if not f_path.exists() or not f_path.is_dir():
-        raise Exception(f'Front image directory path "{f_path}" is invalid.')
-
-    b_path = Path(back_dir_path)
-    if not b_path.exists() or not b_path.is_dir():
-        raise Exception(f'Back image directory path "{b_path}" is invalid.')
+# A card image can be a file path, the bytes of an image file or an image
+CardSource = str | bytes | Image.Image
 
-    ds_path = Path(ds_dir_path)
-    if not ds_path.exists() or not ds_path.is_dir():
-        raise Exception(f'Double-sided image directory path "{ds_path}" is invalid.')
+class CardRecord(BaseModel):
+    """
+    A card with `quantity` copies. The copies share their images, so the images are only read and scaled once.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    # Delete hidden files that may affect image fetching
-    delete_hidden_files_in_directory(front_dir_path)
-    delete_hidden_files_in_directory(back_dir_path)
-    delete_hidden_files_in_directory(ds_dir_path)
+    front: CardSource
+    back: CardSource | None = None
+    quantity: int = 1
+    crop: str | None = None
+    name: str | None = None
 
-    # Sanity check for output images
-    if output_images:
-        output_path = get_directory(output_path)
-    else:
-        if not output_path.lower().endswith(".pdf"):
-            raise Exception(f'Cannot save PDF to output path "{output_path}" because it is not a valid PDF file path.')
+class SheetSlot(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
-    # Get the back image, if it exists
-    back_card_image_path = None
-    use_default_back_page = True
-    if not only_fronts:
-        back_card_image_path = get_back_card_image_path(back_dir_path)
-        use_default_back_page = back_card_image_path is None
-        if use_default_back_page:
-            print(f'No back image provided in back image directory \"{back_dir_path}\". Using default instead.')
+    name: str
+    front: CardSource
+    back: CardSource | None = None
+    crop: tuple[float, float] | None = None
 
-    front_image_filenames = get_image_file_paths(front_dir_path)
-    ds_image_filenames = get_image_file_paths(ds_dir_path)
+class Sheet(BaseModel):
+    number: int
+    slots: List[SheetSlot | None]
 
-    # Check if double-sided back images has matching front images
-    front_set = set(front_image_filenames)
-    ds_set = set(ds_image_filenames)
-    diff = check_paths_subset(ds_set, front_set)
-    if len(diff) > 0:
-        raise Exception(f'Double-sided backs "{ds_set - front_set}" do not have matching fronts. Add the missing fronts to front image directory "{front_dir_path}".')
+class ShardInfo(NamedTuple):
+    index: int
+    count: int
+    first_sheet: int
+    last_sheet: int
 
-    if only_fronts:
-        if len(ds_set) > 0:
-            raise Exception(f'Cannot use "--only_fronts" with double-sided cards. Remove cards from double-side image directory "{ds_dir_path}".')
+def get_shard_sheets(sheets: List[Sheet], shard_index: int, shard_count: int) -> List[Sheet]:
+    """
+    Get the sheets of a shard. Every shard gets a contiguous block of sheets, so the shards can be merged in order.
+    """
+    start = (shard_index - 1) * len(sheets) // shard_count
+    end = shard_index * len(sheets) // shard_count
+    return sheets[start:end]
 
-    with open(layouts_path, 'r') as layouts_file:
-        try:
-            layouts_data = json.load(layouts_file)
-            layouts = Layouts(**layouts_data)
+def format_shard_keywords(shard_info: ShardInfo) -> str:
+    return f'shard {shard_info.index}/{shard_info.count}, sheets {shard_info.first_sheet}-{shard_info.last_sheet}'
 
-        except ValidationErr as e:
-            raise Exception(f'Cannot parse layouts.json: {e}.')
+def parse_shard_keywords(keywords: str) -> ShardInfo | None:
+    shard_match = re.search(r"shard (\d+)/(\d+), sheets (\d+)-(\d+)", keywords)
+    if shard_match is None:
+        return None
 
-        # paper_layout represents the size of a paper and all possible card layouts
-        if paper_size not in layouts.paper_layouts:
-            raise Exception(f'Unsupported paper size "{paper_size}".')
-        paper_layout = layouts.paper_layouts[paper_size]
+    return ShardInfo(*[int(group) for group in shard_match.groups()])
 
-        # card_layout_size represents the size of a card
-        if card_size not in layouts.card_sizes:
-            raise Exception(f'Unsupported card size "{card_size}". Try card sizes: {paper_layout.card_layouts.keys()}.')
-        card_layout_size = layouts.card_sizes[card_size]
+def get_directory_cards(
+    front_dir_path: str,
+    ds_dir_path: str,
+    front_set: set[str],
+    ds_set: set[str],
+    only_fronts: bool
+) -> List[CardRecord]:
+    """
+    Get a card for every front image. Double-sided cards are paired with the back image of the same name.
+    """
+    cards = []
 
-        # card_layout represents the position of cards
-        if card_size not in paper_layout.card_layouts:
-            raise Exception(f'Unsupported card size "{card_size}" with paper size "{paper_size}". Try card sizes: {paper_layout.card_layouts.keys()}.')
-        card_layout = paper_layout.card_layouts[card_size]
+    # First iterate on single-sided cards, then iterate on double-sided cards
+    for file in natsorted(list(check_paths_subset(front_set, ds_set))) + natsorted(list(ds_set)):
+        # Add double-sided back image
+        ds_card_image_path = None
+        if not only_fronts and file in ds_set:
+            ds_card_image_path = join_image_path(ds_dir_path, file)
 
-        # Determine the amount of x and y crop
-        crop = parse_crop_string(crop_string, card_layout_size.width, card_layout_size.height)
-        crop_backs = parse_crop_string(crop_backs_string, card_layout_size.width, card_layout_size.height)
+        cards.append(CardRecord(front=join_image_path(front_dir_path, file), back=ds_card_image_path, name=file))
 
-        num_rows = len(card_layout.y_pos)
-        num_cols = len(card_layout.x_pos)
-        num_cards = num_rows * num_cols
+    return cards
 
-        # Check skip indices
-        # You can only skip valid indices (within the max card count per page)
-        clean_skip_indices = [n for n in skip_indices if n < num_cards]
-        ignore_skip_indices = [n for n in skip_indices if n >= num_cards]
+def plan_card_sheets(
+    cards: Iterable[CardRecord],
+    num_cards: int,
+    skip_indices: List[int],
+    only_fronts: bool,
+    card_width: int,
+    card_height: int
+) -> Iterator[Sheet]:
+    """
+    Assign every copy of every card to a sheet and slot without loading any images.
 
-        if len(ignore_skip_indices) > 0:
-            print(f'Ignoring skip indices that are outside range 0-{num_cards - 1}: {ignore_skip_indices}')
+    Cards are only taken from `cards` when a sheet needs them, so they can be produced while the sheets are rendered.
+    Slots in `skip_indices` are left empty. A slot without a back uses the shared back image.
+    """
+    def get_card_slots() -> Iterator[SheetSlot]:
+        for index, card in enumerate(cards):
+            name = card.name
+            if name is None:
+                name = os.path.basename(card.front) if isinstance(card.front, str) else f'card {index + 1}'
 
-        # If all possible cards are skipped, this may result in an infinite loop
-        if len(clean_skip_indices) == num_cards:
-            raise Exception(f'You cannot skip all cards per page')
+            if card.quantity < 0:
+                raise Exception(f'Card "{name}" has a negative quantity.')
 
-        registration_filename =  f'{paper_size}_registration_{registration}.jpg'
-        registration_path = os.path.join(asset_directory, registration_filename)
+            if only_fronts and card.back is not None:
+                raise Exception(f'Cannot use "--only_fronts" with double-sided cards. Remove the back of "{name}".')
 
-        # The baseline PPI is 300
-        ppi_ratio = ppi / 300
+            crop = parse_crop_string(card.crop, card_width, card_height) if card.crop is not None else None
+            slot = SheetSlot(name=name, front=card.front, back=card.back, crop=crop)
+            yield from itertools.repeat(slot, card.quantity)
 
-        # Load an image with the registration marks
-        with Image.open(registration_path) as reg_im:
-            reg_im = reg_im.resize([math.floor(reg_im.width * ppi_ratio), math.floor(reg_im.height * ppi_ratio)])
+    return assign_sheet_slots(get_card_slots(), num_cards, skip_indices)
 
-            # Create the array that will store the filled templates
-            pages: List[Image.Image] = []
+def assign_sheet_slots(slots: Iterable[SheetSlot], num_cards: int, skip_indices: List[int]) -> Iterator[Sheet]:
+    """
+    Fill the sheets in order with `slots`, leaving the slots in `skip_indices` empty.
+    """
+    num_sheets = 0
 
-            max_print_bleed = calculate_max_print_bleed(card_layout.x_pos, card_layout.y_pos, card_layout_size.width, card_layout_size.height)
+    it = iter(slots)
+    while True:
+        slot_group = list(itertools.islice(it, num_cards - len(skip_indices)))
+        if not slot_group:
+            break
 
-            # Load and cache the single back image for reuse
-            # Do this if we expect both front and back pages and if we have a back image
-            # use_default_back_page indicates no back image was found
-            single_back_image = None
-            if not only_fronts and not use_default_back_page:
-                try:
-                    # We know the exact image path so we do not need resolve_image_with_any_extension()
-                    single_back_image = Image.open(back_card_image_path)
-                    single_back_image = ImageOps.exif_transpose(single_back_image)
-                except FileNotFoundError:
-                    print(f'Cannot get back image "{back_card_image_path}". Using default instead.')
-                    single_back_image = None
-                except OSError as e:
-                    raise OSError(f'Failed to load back image "{back_card_image_path}": {e}') from e
-
-            # Create card layout
-            num_image = 1
-            # First iterate on single-sided cards, then iterate on double-sided cards
-            it = iter(natsorted(list(check_paths_subset(front_set, ds_set))) + natsorted(list(ds_set)))
-            while True:
-                file_group = list(itertools.islice(it, num_cards - len(clean_skip_indices)))
-                if not file_group:
-                    break
-
-                # Fetch card art in batches
-                # Batch size is based on cards per page
-                front_card_images = []
-                back_card_images = []
-                file_group_iterator = iter(file_group)
-                for i in range(num_cards):
-                    if i in clean_skip_indices:
-                        front_card_images.append(None)
-                        back_card_images.append(None)
-                        continue
-
-                    try:
-                        file = next(file_group_iterator)
-                    except StopIteration:
-                        break
-
-                    print(f'Image {num_image}: {file}')
-                    num_image += 1
-
-                    front_card_image_path = os.path.join(front_dir_path, file)
-                    # Allow differing extensions for double-sided images
-                    # Iteration is a combination of front and double-sided image paths
-                    front_card_image_path = resolve_image_with_any_extension(front_card_image_path)
-                    try:
-                        front_card_image = Image.open(front_card_image_path)
-                        front_card_image = ImageOps.exif_transpose(front_card_image)
-                    except OSError as e:
-                        raise OSError(f'Failed to load front image "{front_card_image_path}": {e}') from e
-                    front_card_images.append(front_card_image)
-
-                    if only_fronts:
-                        back_card_images.append(None)
-                        continue
-
-                    # Add double-sided back image
-                    if file in ds_set:
-                        ds_card_image_path = os.path.join(ds_dir_path, file)
-                        # Allow differing extensions for double-sided images
-                        # Iteration is a combination of front and double-sided image paths
-                        ds_card_image_path = resolve_image_with_any_extension(ds_card_image_path)
-                        try:
-                            ds_card_image = Image.open(ds_card_image_path)
-                            ds_card_image = ImageOps.exif_transpose(ds_card_image)
-                        except OSError as e:
-                            raise OSError(f'Failed to load double-sided image "{ds_card_image_path}": {e}') from e
-                        back_card_images.append(ds_card_image)
-                        continue
-
-                    back_card_images.append(single_back_image)
-
-                front_page = reg_im.copy()
-                back_page = reg_im.copy()
-
-                # Create front layout
-                draw_card_layout(
-                    front_card_images,
-                    single_back_image,
-                    front_page,
-                    num_rows,
-                    num_cols,
-                    card_layout.x_pos,
-                    card_layout.y_pos,
-                    card_layout_size.width,
-                    card_layout_size.height,
-                    max_print_bleed,
-                    crop,
-                    crop_backs,
-                    ppi_ratio,
-                    extend_corners,
-                    flip=False
-                )
+        # Batch size is based on cards per page
+        sheet_slots: List[SheetSlot | None] = []
+        slot_group_iterator = iter(slot_group)
+        for i in range(num_cards):
+            if i in skip_indices:
+                sheet_slots.append(None)
+                continue
 
-                # Create back layout
-                draw_card_layout(
-                    back_card_images,
-                    single_back_image,
-                    back_page,
-                    num_rows,
-                    num_cols,
-                    card_layout.x_pos,
-                    card_layout.y_pos,
-                    card_layout_size.width,
-                    card_layout_size.height,
-                    max_print_bleed,
-                    crop,
-                    crop_backs,
-                    ppi_ratio,
-                    extend_corners,
-                    flip=True # Flip the back sides
-                )
+            try:
+                sheet_slots.append(next(slot_group_iterator))
+            except StopIteration:
+                break
+
+        num_sheets += 1
+        yield Sheet(number=num_sheets, slots=sheet_slots)
+
+def matches_card_pattern(name: str, card_patterns: Iterable[str]) -> bool:
+    return any(fnmatch.fnmatch(name, pattern) or Path(name).stem == pattern for pattern in card_patterns)
+
+def select_sheets(
+    sheets: List[Sheet],
+    sheet_numbers: set[int] | None,
+    card_patterns: List[str],
+    repack: bool,
+    num_cards: int,
+    skip_indices: List[int]
+) -> List[Sheet]:
+    """
+    Keep only the requested sheets and cards of a sheet plan, such as for a reprint.
 
-                # Add the front and back layouts
-                add_front_back_pages(
-                    front_page,
-                    back_page,
-                    pages,
-                    paper_layout.width,
-                    paper_layout.height,
-                    ppi_ratio,
-                    card_layout.template,
-                    only_fronts,
-                    name
-                )
+    Cards are matched by filename, filename without extension, or wildcard pattern. Without `repack`,
+    the cards keep their sheet numbers and slots and the other slots are left empty. With `repack`,
+    the cards are placed on as few new sheets as possible.
+    """
+    if sheet_numbers is not None:
+        missing_sheet_numbers = sheet_numbers - {sheet.number for sheet in sheets}
+        if len(missing_sheet_numbers) > 0:
+            print(f'Ignoring sheets that are outside range 1-{len(sheets)}: {sorted(missing_sheet_numbers)}')
+
+        sheets = [sheet for sheet in sheets if sheet.number in sheet_numbers]
+
+    if len(card_patterns) > 0:
+        for pattern in card_patterns:
+            if not any(slot is not None and matches_card_pattern(slot.name, [pattern]) for sheet in sheets for slot in sheet.slots):
+                print(f'No cards match "{pattern}"')
+
+        selected_sheets = []
+        for sheet in sheets:
+            slots = [slot if slot is not None and matches_card_pattern(slot.name, card_patterns) else None for slot in sheet.slots]
+            if any(slot is not None for slot in slots):
+                selected_sheets.append(Sheet(number=sheet.number, slots=slots))
+        sheets = selected_sheets
+
+    if repack:
+        slots = [slot for sheet in sheets for slot in sheet.slots if slot is not None]
+        sheets = list(assign_sheet_slots(slots, num_cards, skip_indices))
+
+    return sheets
 
-            if len(pages) == 0:
-                print('No pages were generated')
+class ManifestEntry(BaseModel):
+    front: str
+    back: str | None = None
+    quantity: int = 1
+    crop: str | None = None
+
+class Manifest(BaseModel):
+    cards: List[ManifestEntry]
+
+def load_manifest(manifest_path: str) -> List[CardRecord]:
+    """
+    Load the cards of a manifest. Relative image paths are relative to the manifest file.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        try:
+            manifest = Manifest(**json.load(manifest_file))
+        except (json.JSONDecodeError, ValueError) as e:
+            raise Exception(f'Cannot parse manifest "{manifest_path}": {e}.')
+
+    manifest_dir_path = os.path.dirname(manifest_path)
+    cards = []
+    for entry in manifest.cards:
+        back = os.path.join(manifest_dir_path, entry.back) if entry.back is not None else None
+        cards.append(CardRecord(front=os.path.join(manifest_dir_path, entry.front), back=back, quantity=entry.quantity, crop=entry.crop))
+
+    return cards
+
+def calculate_source_size(
+    width: int,
+    height: int,
+    print_bleed: tuple[int, int],
+    crop: tuple[float, float],
+    ppi_ratio: float
+) -> tuple[int, int]:
+    """
+    Calculate the smallest card image size that still covers the scaled card, including bleed and crop.
+    """
+    scaled_width = math.floor(width * ppi_ratio) + 2 * math.ceil(print_bleed[0] * ppi_ratio)
+    scaled_height = math.floor(height * ppi_ratio) + 2 * math.ceil(print_bleed[1] * ppi_ratio)
+
+    crop_percent_x, crop_percent_y = crop
+    return (
+        math.ceil(scaled_width / (1 - min(crop_percent_x, 99) / 100)),
+        math.ceil(scaled_height / (1 - min(crop_percent_y, 99) / 100))
+    )
+
+def reduce_card_image(card_image: Image.Image, source_size: tuple[int, int]) -> Image.Image:
+    """
+    Decode a smaller version of a card image if it is more than twice as large as needed.
+
+    JPEG images are decoded at a reduced scale, other images are reduced right after decoding.
+    The result is always at least twice the source size so no detail is lost when scaling.
+    """
+    min_width, min_height = source_size
+
+    # The source size is in display orientation, so swap it for rotated images
+    if card_image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+        min_width, min_height = min_height, min_width
+
+    if card_image.width <= 2 * min_width or card_image.height <= 2 * min_height:
+        return card_image
+
+    if card_image.format == 'JPEG':
+        card_image.draft(None, (2 * min_width, 2 * min_height))
+        return card_image
+
+    factor = min(card_image.width // (2 * min_width), card_image.height // (2 * min_height))
+    if factor < 2:
+        return card_image
+
+    reduced_image = card_image.reduce(factor)
+    # Keep the metadata so the orientation can still be applied
+    reduced_image.info = card_image.info
+
+    return reduced_image
+
+def open_card_image(source: CardSource, description: str, source_size: tuple[int, int] | None = None) -> Image.Image:
+    # Allow differing extensions for double-sided images
+    # Iteration is a combination of front and double-sided image paths
+    location = ''
+    if isinstance(source, str):
+        source = resolve_image_with_any_extension(source)
+        location = f' "{source}"'
+
+    try:
+        if isinstance(source, Image.Image):
+            card_image = source
+        elif isinstance(source, bytes):
+            card_image = Image.open(io.BytesIO(source))
+        elif parse_archive_path(source) is not None:
+            # Decode the image straight from the archive
+            card_image = Image.open(io.BytesIO(read_archive_image(source)))
+        else:
+            card_image = Image.open(source)
+
+        if source_size is not None:
+            card_image = reduce_card_image(card_image, source_size)
+
+        return ImageOps.exif_transpose(card_image)
+    except OSError as e:
+        raise OSError(f'Failed to load {description} image{location}: {e}') from e
+
+def hash_image_file(path: str) -> str:
+    with open(path, 'rb') as image_file:
+        return hashlib.file_digest(image_file, 'sha256').hexdigest()
+
+def hash_card_source(source: CardSource) -> str:
+    if isinstance(source, Image.Image):
+        image_hash = hashlib.sha256(f'{source.mode} {source.size}'.encode())
+        image_hash.update(source.tobytes())
+        return image_hash.hexdigest()
+
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+
+    archive = parse_archive_path(source)
+    if archive is not None:
+        return open_card_archive(archive.archive_path).hash(archive.member_path)
+
+    return hash_image_file(source)
+
+class TileCache:
+    """
+    Least recently used cache of card tiles, limited by the total size of the tile images.
+
+    Keys combine the hash of the source image with the parameters used to render the tile.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.tiles: OrderedDict[tuple, CardTile] = OrderedDict()
+
+        # Tiles may be loaded from several threads at once
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be sent to worker processes
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def tile_bytes(tile: CardTile) -> int:
+        return tile.image.width * tile.image.height * len(tile.image.getbands())
+
+    def get(self, key: tuple) -> CardTile | None:
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+
+            return tile
+
+    def put(self, key: tuple, tile: CardTile):
+        with self.lock:
+            if key in self.tiles:
                 return
 
-            # Load saved offset if available
-            if load_offset:
-                saved_offset = load_saved_offset()
+            self.tiles[key] = tile
+            self.num_bytes += self.tile_bytes(tile)
 
-                if saved_offset is None:
-                    print('Offset cannot be applied')
-                else:
-                    print(f'Loaded x offset: {saved_offset.x_offset}, y offset: {saved_offset.y_offset}, angle offset: {saved_offset.angle_offset}')
-                    pages = offset_images(pages, saved_offset.x_offset, saved_offset.y_offset, ppi, saved_offset.angle_offset)
+            # Evict the least recently used tiles, but always keep the newest one
+            while self.num_bytes > self.max_bytes and len(self.tiles) > 1:
+                _, evicted_tile = self.tiles.popitem(last=False)
+                self.num_bytes -= self.tile_bytes(evicted_tile)
 
-            # Save the pages array as a PDF
-            if output_images:
-                for index, page in enumerate(pages):
-                    page.save(os.path.join(output_path, f'page{index + 1}.png'), resolution=math.floor(300 * ppi_ratio), speed=0, subsampling=0, quality=quality)
+class DiskTileCache:
+    """
+    Persistent cache of card tiles shared between runs.
+
+    Tile images are stored as NumPy arrays so they can be memory-mapped instead of decoded.
+    The least recently used tiles are deleted when the cache grows beyond its size limit.
+    """
+    def __init__(self, dir_path: str, max_bytes: int):
+        self.dir_path = dir_path
+        self.max_bytes = max_bytes
 
-                print(f'Generated images: {output_path}')
+        # Size of the cache, counted from the directory once and then kept up to date as tiles are written.
+        # Other processes can also write tiles, so the directory is counted again before deleting anything.
+        self.num_bytes: int | None = None
 
-            else:
-                pages[0].save(output_path, format='PDF', save_all=True, append_images=pages[1:], resolution=math.floor(300 * ppi_ratio), speed=0, subsampling=0, quality=quality)
-                print(f'Generated PDF: {output_path}')
+        os.makedirs(dir_path, exist_ok=True)
+
+    def get_tile_path(self, key: tuple) -> str:
+        return os.path.join(self.dir_path, hashlib.sha256(repr(key).encode()).hexdigest())
+
+    def get(self, key: tuple) -> CardTile | None:
+        tile_path = self.get_tile_path(key)
+
+        try:
+            with open(f'{tile_path}.json', 'r') as tile_info_file:
+                tile_info = json.load(tile_info_file)
+
+            tile_array = np.load(f'{tile_path}.npy', mmap_mode='r')
+
+            # Mark the tile as recently used, which fails like a miss if another process just evicted it
+            os.utime(f'{tile_path}.npy')
+        except (OSError, ValueError):
+            return None
+
+        return CardTile(Image.fromarray(tile_array), tile_info['offset_x'], tile_info['offset_y'], tuple(tile_info['bleed']))
+
+    def put(self, key: tuple, tile: CardTile):
+        tile_path = self.get_tile_path(key)
+
+        tile_image = tile.image
+        if tile_image.mode not in ('L', 'RGB', 'RGBA'):
+            tile_image = tile_image.convert('RGB')
+
+        # Write to temporary files first so other processes and threads never read a partial tile
+        temporary_path = f'{tile_path}.{os.getpid()}-{threading.get_ident()}'
+        with open(f'{temporary_path}.npy', 'wb') as tile_array_file:
+            np.save(tile_array_file, np.asarray(tile_image))
+            tile_bytes = tile_array_file.tell()
+
+        with open(f'{temporary_path}.json', 'w') as tile_info_file:
+            json.dump({'offset_x': tile.offset_x, 'offset_y': tile.offset_y, 'bleed': list(tile.bleed)}, tile_info_file)
+
+        os.replace(f'{temporary_path}.json', f'{tile_path}.json')
+        os.replace(f'{temporary_path}.npy', f'{tile_path}.npy')
+
+        if self.num_bytes is None:
+            self.evict()
+        else:
+            self.num_bytes += tile_bytes
+            if self.num_bytes > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Count the tiles in the cache directory and delete the least recently used ones until the cache fits its size limit.
+        """
+        tile_files = []
+        total_bytes = 0
+        for entry in os.scandir(self.dir_path):
+            if entry.name.endswith('.npy') and entry.name.count('.') == 1:
+                stat = entry.stat()
+                tile_files.append((stat.st_mtime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+        # Delete the least recently used tiles first
+        for _, size, path in sorted(tile_files):
+            if total_bytes <= self.max_bytes:
+                break
+
+            for tile_file_path in [path, f'{path.removesuffix(".npy")}.json']:
+                try:
+                    os.remove(tile_file_path)
+                except OSError:
+                    # Another process may have removed the tile or still have it open
+                    pass
+
+            total_bytes -= size
+
+        self.num_bytes = total_bytes
 
 class OffsetData(BaseModel):
-    x_offset: int
-    y_offset: int
+    # Offsets are in pixels at 300 PPI and can be fractions of a pixel
+    x_offset: float
+    y_offset: float
     angle_offset: float = 0.0
 
-def save_offset(x_offset: int, y_offset: int, angle_offset: float = 0.0) -> None:
+class SheetRenderer:
+    """
+    Draws the front and back pages of a sheet.
+
+    Everything needed to render a sheet is stored on the renderer so it can be sent to worker processes.
+
+    When `strip_height` is set, pages are drawn as strips of that many rows instead of as whole images.
+    When `vector` is set, pages are not drawn at all, but laid out for the PDF writer to place the card images.
+    When `offset` is set, the cards on back pages are moved by the offset as they are placed. Registration marks stay where they are.
+    """
+    def __init__(
+        self,
+        registration_rects: tuple[tuple[float, float, float, float], ...],
+        single_back_image: Image.Image | None,
+        paper_layout: PaperLayout,
+        card_layout: CardLayout,
+        card_layout_size: CardLayoutSize,
+        print_bleed: tuple[int, int],
+        crop: tuple[float, float],
+        crop_backs: tuple[float, float],
+        ppi_ratio: float,
+        extend_corners: int,
+        skip_indices: List[int],
+        only_fronts: bool,
+        resample: Resample = Resample.STANDARD,
+        tile_cache_size: int = 256 * 1024 * 1024,
+        disk_tile_cache: DiskTileCache | None = None,
+        name: str | None = None,
+        strip_height: int = 0,
+        vector: bool = False,
+        offset: OffsetData | None = None
+    ):
+        # Registration marks at the baseline PPI, drawn at the output PPI when the pages are drawn
+        self.registration_rects = registration_rects
+        self.single_back_image = single_back_image
+        self.paper_layout = paper_layout
+        self.card_layout = card_layout
+        self.card_layout_size = card_layout_size
+        self.print_bleed = print_bleed
+        self.crop = crop
+        self.crop_backs = crop_backs
+        self.ppi_ratio = ppi_ratio
+        self.extend_corners = extend_corners
+        self.skip_indices = skip_indices
+        self.only_fronts = only_fronts
+        self.resample = Resample(resample)
+        self.name = name
+        self.strip_height = strip_height
+        self.vector = vector
+        self.offset = offset
+
+        self.page_size = (
+            math.floor(paper_layout.width * ppi_ratio),
+            math.floor(paper_layout.height * ppi_ratio)
+        )
+
+        # The shared back is identical in every slot, so it is only cropped, scaled and flipped once, on first use
+        self.back_tile: CardTile | None = None
+
+        # Back page for sheets without double-sided cards, built on first use
+        self.shared_back_page: Image.Image | None = None
+
+        # Copies of the same card image are only decoded and scaled once
+        self.tile_cache = TileCache(tile_cache_size)
+        self.disk_tile_cache = disk_tile_cache
+
+    def get_back_tile(self) -> CardTile | None:
+        if self.back_tile is None and self.single_back_image is not None:
+            self.back_tile = render_card_tile(
+                self.single_back_image,
+                self.card_layout_size.width,
+                self.card_layout_size.height,
+                self.print_bleed,
+                self.crop_backs,
+                self.ppi_ratio,
+                self.extend_corners,
+                flip=True,
+                resample=self.resample
+            )
+
+        return self.back_tile
+
+    @property
+    def num_cards(self) -> int:
+        return len(self.card_layout.x_pos) * len(self.card_layout.y_pos)
+
+    def get_registration_image(self) -> Image.Image:
+        return render_registration_image(self.page_size, self.registration_rects, self.ppi_ratio)
+
+    def get_registration_strip(self, top: int, bottom: int) -> Image.Image:
+        """
+        Get the rows `top` to `bottom` of the registration page without drawing the whole page.
+        """
+        registration_strip = Image.new('RGB', (self.page_size[0], bottom - top), (255, 255, 255))
+        draw_registration_marks(registration_strip, self.registration_rects, self.ppi_ratio, top)
+        return registration_strip
+
+    def get_label(self, sheet: Sheet) -> SheetLabel:
+        return get_sheet_label(
+            sheet.number,
+            self.paper_layout.width,
+            self.paper_layout.height,
+            self.ppi_ratio,
+            self.card_layout.template,
+            self.name
+        )
+
+    def draw_label(self, base_image: Image.Image, sheet: Sheet, top: int = 0):
+        draw_sheet_label(base_image, self.get_label(sheet), top)
+
+    def draw_layout(self, card_images: List[Image.Image | CardTile | None], base_image: Image.Image, flip: bool):
+        draw_card_layout(
+            card_images,
+            self.single_back_image,
+            base_image,
+            len(self.card_layout.y_pos),
+            len(self.card_layout.x_pos),
+            self.card_layout.x_pos,
+            self.card_layout.y_pos,
+            self.card_layout_size.width,
+            self.card_layout_size.height,
+            self.print_bleed,
+            self.crop,
+            self.crop_backs,
+            self.ppi_ratio,
+            self.extend_corners,
+            flip,
+            self.resample
+        )
+
+    def get_card_tile(self, source: CardSource, description: str, flip: bool, crop: tuple[float, float] | None = None) -> CardTile:
+        if isinstance(source, str):
+            source = resolve_image_with_any_extension(source)
+
+        # A card can override the crop of the other cards
+        if crop is None:
+            crop = self.crop
+
+        key = (
+            hash_card_source(source),
+            crop,
+            self.ppi_ratio,
+            self.card_layout_size.width,
+            self.card_layout_size.height,
+            self.print_bleed,
+            self.extend_corners,
+            flip,
+            self.resample.value
+        )
+
+        card_tile = self.tile_cache.get(key)
+        if card_tile is not None:
+            return card_tile
+
+        if self.disk_tile_cache is not None:
+            card_tile = self.disk_tile_cache.get(key)
+
+        if card_tile is None:
+            source_size = calculate_source_size(
+                self.card_layout_size.width,
+                self.card_layout_size.height,
+                self.print_bleed,
+                crop,
+                self.ppi_ratio
+            )
+
+            card_tile = render_card_tile(
+                open_card_image(source, description, source_size),
+                self.card_layout_size.width,
+                self.card_layout_size.height,
+                self.print_bleed,
+                crop,
+                self.ppi_ratio,
+                self.extend_corners,
+                flip,
+                self.resample
+            )
+
+            if self.disk_tile_cache is not None:
+                self.disk_tile_cache.put(key, card_tile)
+
+        self.tile_cache.put(key, card_tile)
+
+        return card_tile
+
+    def load(self, sheet: Sheet) -> tuple[List[CardTile | None], List[CardTile | None]]:
+        """
+        Fetch the card art of a sheet. This is safe to call from other threads.
+        """
+        front_card_tiles = []
+        back_card_tiles = []
+        for slot in sheet.slots:
+            if slot is None:
+                front_card_tiles.append(None)
+                back_card_tiles.append(None)
+                continue
+
+            front_card_tiles.append(self.get_card_tile(slot.front, 'front', flip=False, crop=slot.crop))
+
+            if slot.back is not None:
+                back_card_tiles.append(self.get_card_tile(slot.back, 'double-sided', flip=True, crop=slot.crop))
+            else:
+                back_card_tiles.append(self.get_back_tile())
+
+        return front_card_tiles, back_card_tiles
+
+    def render(self, sheet: Sheet) -> tuple[Image.Image | PageStrips | VectorPage, Image.Image | PageStrips | VectorPage | None]:
+        return self.compose(sheet, self.load(sheet))
+
+    def compose(self, sheet: Sheet, card_tiles: tuple[List[CardTile | None], List[CardTile | None]]) -> tuple[Image.Image | PageStrips | VectorPage, Image.Image | PageStrips | VectorPage | None]:
+        front_card_images, back_card_images = card_tiles
+
+        if self.vector:
+            front_page = VectorPage(self.page_size, self.registration_rects, self.get_card_placements(front_card_images, flip=False), self.get_label(sheet))
+            if self.only_fronts:
+                return front_page, None
+
+            return front_page, VectorPage(self.page_size, self.registration_rects, self.get_card_placements(back_card_images, flip=True), None, self.get_back_matrix())
+
+        if self.strip_height > 0:
+            front_page = PageStrips(self.page_size, self.draw_strips(sheet, front_card_images, flip=False))
+            if self.only_fronts:
+                return front_page, None
+
+            return front_page, PageStrips(self.page_size, self.draw_strips(sheet, back_card_images, flip=True))
+
+        # Create front layout
+        front_page = self.get_registration_image().copy()
+        self.draw_layout(front_card_images, front_page, flip=False)
+        self.draw_label(front_page, sheet)
+
+        if self.only_fronts:
+            return front_page, None
+
+        # Reuse the prebuilt back page if every slot has the shared back
+        if self.is_shared_back_sheet(sheet):
+            return front_page, self.get_shared_back_page()
+
+        # Create back layout
+        back_page = self.get_registration_image().copy()
+        self.draw_back_layout(back_card_images, back_page)
+
+        return front_page, back_page
+
+    def is_shared_back_sheet(self, sheet: Sheet) -> bool:
+        """
+        Check if the back page of the sheet is the same as a full sheet of shared backs.
+        """
+        if len(sheet.slots) != self.num_cards:
+            return False
+
+        for i, slot in enumerate(sheet.slots):
+            if (slot is None) != (i in self.skip_indices):
+                return False
+
+            if slot is not None and slot.back is not None:
+                return False
+
+        return True
+
+    def get_shared_back_page(self) -> Image.Image:
+        if self.shared_back_page is None:
+            self.shared_back_page = self.get_registration_image().copy()
+            back_tiles = [None if i in self.skip_indices else self.get_back_tile() for i in range(self.num_cards)]
+            self.draw_back_layout(back_tiles, self.shared_back_page)
+
+        return self.shared_back_page
+
+    def get_card_placements(self, card_tiles: List[CardTile | None], flip: bool) -> List[CardPlacement]:
+        card_placements = []
+        for i, card_tile in enumerate(card_tiles):
+            if card_tile is None:
+                continue
+
+            base_x, base_y = get_card_position(
+                i,
+                len(self.card_layout.y_pos),
+                len(self.card_layout.x_pos),
+                self.card_layout.x_pos,
+                self.card_layout.y_pos,
+                self.ppi_ratio,
+                flip
+            )
+
+            card_placements.append(CardPlacement(card_tile.image, base_x + card_tile.offset_x, base_y + card_tile.offset_y, card_tile.bleed))
+
+        return card_placements
+
+    def get_back_matrix(self) -> tuple[float, float, float, float, float, float] | None:
+        """
+        Get the PDF transform of the cards on vector back pages.
+        """
+        if self.offset is None:
+            return None
+
+        scale = 72.0 / 300
+        return get_offset_matrix(
+            self.paper_layout.width * scale,
+            self.paper_layout.height * scale,
+            self.offset.x_offset,
+            self.offset.y_offset,
+            self.offset.angle_offset
+        )
+
+    def get_bleed_image(self, card_placement: CardPlacement, flip: bool) -> tuple[Image.Image, int, int, Image.Image | None]:
+        """
+        Extend the edges of a card and find where to paste it, along with the mask to paste it with.
+        """
+        bleed_width, bleed_height = card_placement.bleed
+        bleed_image = extend_image_edges(card_placement.image, bleed_width, bleed_height)
+        x = card_placement.x - bleed_width
+        y = card_placement.y - bleed_height
+
+        # Move the cards on the back pages instead of the whole page afterwards
+        if flip and self.offset is not None:
+            return offset_card_image(
+                bleed_image,
+                x,
+                y,
+                self.page_size,
+                self.offset.x_offset * self.ppi_ratio,
+                self.offset.y_offset * self.ppi_ratio,
+                self.offset.angle_offset
+            )
+
+        return bleed_image, x, y, None
+
+    def get_bleed_rows(self, card_placement: CardPlacement, flip: bool) -> tuple[int, int]:
+        """
+        Find the top and bottom rows that get_bleed_image() pastes a card between, without extending its edges.
+        """
+        bleed_width, bleed_height = card_placement.bleed
+        width = card_placement.image.width + 2 * bleed_width
+        height = card_placement.image.height + 2 * bleed_height
+        x = card_placement.x - bleed_width
+        y = card_placement.y - bleed_height
+
+        if flip and self.offset is not None:
+            _, top, _, bottom = get_offset_card_box(
+                (width, height),
+                x,
+                y,
+                self.page_size,
+                self.offset.x_offset * self.ppi_ratio,
+                self.offset.y_offset * self.ppi_ratio,
+                self.offset.angle_offset
+            )
+            return top, bottom
+
+        return y, y + height
+
+    def get_bleed_images(self, card_tiles: List[CardTile | None], flip: bool) -> List[tuple[Image.Image, int, int, Image.Image | None]]:
+        """
+        Extend the edges of every card and find where to paste it, along with the mask to paste it with.
+        """
+        return [self.get_bleed_image(card_placement, flip) for card_placement in self.get_card_placements(card_tiles, flip)]
+
+    def draw_back_layout(self, card_tiles: List[CardTile | None], base_image: Image.Image):
+        if self.offset is None:
+            self.draw_layout(card_tiles, base_image, flip=True) # Flip the back sides
+            return
+
+        for bleed_image, x, y, mask in self.get_bleed_images(card_tiles, flip=True):
+            base_image.paste(bleed_image, (x, y), mask)
+
+    def draw_strips(self, sheet: Sheet, card_tiles: List[CardTile | None], flip: bool) -> Iterator[Image.Image]:
+        """
+        Draw a page from top to bottom in strips. Cards that cross the edge of a strip are clipped by the paste.
+        """
+        # Cards waiting for their first strip, from the top of the page down
+        waiting_cards = deque(sorted(
+            (self.get_bleed_rows(card_placement, flip) + (i, card_placement) for i, card_placement in enumerate(self.get_card_placements(card_tiles, flip))),
+            key=lambda waiting_card: waiting_card[0]
+        ))
+        # Extended cards that reach into the current strip by their place on the page, kept until a strip is drawn below them
+        bleed_images: dict[int, tuple[Image.Image, int, int, Image.Image | None]] = {}
+
+        page_height = self.page_size[1]
+        for top in range(0, page_height, self.strip_height):
+            bottom = min(top + self.strip_height, page_height)
+            strip = self.get_registration_strip(top, bottom)
+
+            while waiting_cards and waiting_cards[0][0] < bottom:
+                _, card_bottom, i, card_placement = waiting_cards.popleft()
+                if card_bottom > top:
+                    bleed_images[i] = self.get_bleed_image(card_placement, flip)
+
+            # Paste in the order of the cards so overlapping bleed is drawn like on a whole page
+            for i in sorted(bleed_images):
+                bleed_image, x, y, mask = bleed_images[i]
+                if y < bottom and y + bleed_image.height > top:
+                    strip.paste(bleed_image, (x, y - top), mask)
+
+                # Extend the edges of each card once, and drop it after its last strip
+                if y + bleed_image.height <= bottom:
+                    del bleed_images[i]
+
+            # Only the front page is labelled
+            if not flip:
+                self.draw_label(strip, sheet, top)
+
+            yield strip
+
+# Renderer used by worker processes, set once per process by _init_render_worker()
+_worker_renderer: SheetRenderer | None = None
+_worker_page_encoder: Callable[[Image.Image | PageStrips], EncodedImage | PageStrips] | None = None
+
+def _init_render_worker(renderer: SheetRenderer, page_encoder: Callable[[Image.Image | PageStrips], EncodedImage | PageStrips] | None = None):
+    global _worker_renderer, _worker_page_encoder
+    _worker_renderer = renderer
+    _worker_page_encoder = page_encoder
+
+def _render_sheet_in_worker(sheet: Sheet) -> tuple[Image.Image | EncodedImage | PageStrips, Image.Image | EncodedImage | PageStrips | None, bool]:
+    front_page, back_page = _worker_renderer.render(sheet)
+
+    # Avoid sending the shared back page to the main process for every sheet
+    shared_back_page = back_page is not None and back_page is _worker_renderer.shared_back_page
+    if shared_back_page:
+        back_page = None
+
+    # Compress the pages here so the main process only has to copy them into the output
+    if _worker_page_encoder is not None:
+        front_page = _worker_page_encoder(front_page)
+        if back_page is not None:
+            back_page = _worker_page_encoder(back_page)
+
+    return front_page, back_page, shared_back_page
+
+def submit_in_order(executor: Executor, function: Callable, items: Iterable, max_pending: int) -> Iterator[tuple[Any, Any]]:
+    """
+    Run a function on every item with an executor and yield (item, result) in submission order.
+
+    Only `max_pending` items are in flight at a time so finished results do not pile up in memory.
+    """
+    pending: deque[tuple[Any, Future]] = deque()
+    item_iterator = iter(items)
+    while True:
+        while len(pending) < max_pending:
+            try:
+                item = next(item_iterator)
+            except StopIteration:
+                break
+
+            pending.append((item, executor.submit(function, item)))
+
+        if not pending:
+            break
+
+        item, future = pending.popleft()
+        yield item, future.result()
+
+def render_sheets(
+    renderer: SheetRenderer,
+    sheets: Iterable[Sheet],
+    workers: int,
+    prefetch: int = 0,
+    page_encoder: Callable[[Image.Image | PageStrips], EncodedImage | PageStrips] | None = None
+) -> Iterator[tuple[Sheet, Image.Image | EncodedImage | PageStrips, Image.Image | EncodedImage | PageStrips | None]]:
+    """
+    Render sheets in order, either serially or with a pool of worker processes.
+
+    When rendering serially, the card art of the next `prefetch` sheets is loaded in background threads
+    while the current sheet is drawn. Worker processes encode their pages with `page_encoder`,
+    which is required when the pages are drawn in strips.
+    """
+    # Do not start more workers than there are sheets, if the sheets can be counted
+    if isinstance(sheets, list):
+        workers = min(workers, len(sheets))
+
+    if workers <= 1:
+        if prefetch <= 0:
+            for sheet in sheets:
+                yield sheet, *renderer.render(sheet)
+            return
+
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            # The current sheet plus the lookahead
+            for sheet, card_tiles in submit_in_order(executor, renderer.load, sheets, prefetch + 1):
+                yield sheet, *renderer.compose(sheet, card_tiles)
+        return
+
+    encoded_shared_back_page = None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker, initargs=(renderer, page_encoder)) as executor:
+        for sheet, (front_page, back_page, shared_back_page) in submit_in_order(executor, _render_sheet_in_worker, sheets, 2 * workers):
+            if shared_back_page:
+                back_page = renderer.get_shared_back_page()
+
+                # Encode the shared back page once and reuse it
+                if page_encoder is not None:
+                    if encoded_shared_back_page is None:
+                        encoded_shared_back_page = page_encoder(back_page)
+                    back_page = encoded_shared_back_page
+
+            yield sheet, front_page, back_page
+
+class PdfOptions(BaseModel):
+    """
+    Options for turning cards into pages. These match the options of create_pdf.py.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    card_size: CardSize = CardSize.STANDARD
+    paper_size: PaperSize = PaperSize.LETTER
+    registration: Registration = Registration.THREE
+    only_fronts: bool = False
+    crop: str | None = None
+    crop_backs: str | None = None
+    extend_corners: int = 0
+    ppi: int = 300
+    quality: int = 75
+    skip: List[int] = []
+    name: str | None = None
+    back: CardSource | None = None
+    offset: OffsetData | None = None
+    workers: int = 1
+    tile_cache: bool = False
+    resample: Resample = Resample.STANDARD
+    prefetch: int = 2
+    strip_height: int = 0
+    vector: bool = False
+
+class PageSink(Protocol):
+    def add_page(self, page: Image.Image | EncodedImage | PageStrips | VectorPage): ...
+
+# Increase when a change to the renderer changes the pages, so older build caches are not reused
+BUILD_CACHE_VERSION = 1
+
+class CachedImage(BaseModel):
+    size: tuple[int, int]
+    mode: str
+    filter: str
+    # Hash of the encoded image, which is also the name of its file
+    data: str
+
+class CachedPage(BaseModel):
+    size: tuple[int, int]
+    images: List[CachedImage]
+    strips: bool
+
+class CachedSheet(BaseModel):
+    number: int
+    key: str
+    pages: List[CachedPage]
+
+class BuildManifest(BaseModel):
+    version: int = BUILD_CACHE_VERSION
+    sheets: List[CachedSheet] = []
+
+class BuildCache:
+    """
+    Encoded pages of the previous build, reused for sheets whose card images and options did not change.
+
+    The build manifest records the key of every sheet, a hash of its card images and the render options.
+    Encoded images are stored once per content hash, so identical pages such as the shared back are stored once.
+    """
+    manifest_filename = 'build.json'
+
+    def __init__(self, dir_path: str, renderer: SheetRenderer, options: PdfOptions, page_filter: str, partial: bool = False, read_only: bool = False):
+        self.dir_path = dir_path
+        # A build of only some of the sheets keeps the other sheets of the previous build
+        self.partial = partial
+        # A build whose sheets are not the sheets of the full build, such as a repack, only reuses pages
+        self.read_only = read_only
+        os.makedirs(dir_path, exist_ok=True)
+
+        self.previous_sheets: Dict[str, CachedSheet] = {}
+        try:
+            with open(os.path.join(dir_path, self.manifest_filename), 'r') as manifest_file:
+                manifest = BuildManifest(**json.load(manifest_file))
+
+            if manifest.version == BUILD_CACHE_VERSION:
+                self.previous_sheets = {cached_sheet.key: cached_sheet for cached_sheet in manifest.sheets}
+        except (OSError, ValueError):
+            pass
+
+        self.sheets: List[CachedSheet] = []
+        self.sheet_keys: Dict[int, str] = {}
+        self.source_hashes: Dict[str, str] = {}
+
+        # Everything other than the card images that changes how the pages look
+        self.render_key = json.dumps({
+            'options': options.model_dump(mode='json', exclude={'back', 'workers', 'prefetch', 'tile_cache'}),
+            'back': self.hash_source(options.back) if options.back is not None else None,
+            'page_filter': page_filter,
+            'paper_layout': renderer.paper_layout.model_dump(mode='json'),
+            'card_layout': renderer.card_layout.model_dump(mode='json'),
+            'card_layout_size': renderer.card_layout_size.model_dump(mode='json'),
+            'print_bleed': renderer.print_bleed,
+            'registration_rects': renderer.registration_rects
+        }, sort_keys=True)
+
+    def hash_source(self, source: CardSource) -> str:
+        # Copies of a card share their image path, so each file is only hashed once
+        if not isinstance(source, str):
+            return hash_card_source(source)
+
+        if source not in self.source_hashes:
+            self.source_hashes[source] = hash_card_source(resolve_image_with_any_extension(source))
+
+        return self.source_hashes[source]
+
+    def get_sheet_key(self, sheet: Sheet) -> str:
+        if sheet.number not in self.sheet_keys:
+            slot_hashes = [
+                None if slot is None else [
+                    self.hash_source(slot.front),
+                    self.hash_source(slot.back) if slot.back is not None else None,
+                    slot.crop
+                ]
+                for slot in sheet.slots
+            ]
+
+            sheet_key = json.dumps([self.render_key, sheet.number, slot_hashes])
+            self.sheet_keys[sheet.number] = hashlib.sha256(sheet_key.encode()).hexdigest()
+
+        return self.sheet_keys[sheet.number]
+
+    def find(self, sheet: Sheet) -> CachedSheet | None:
+        """
+        Find the cached pages of an unchanged sheet, without reading them.
+        """
+        cached_sheet = self.previous_sheets.get(self.get_sheet_key(sheet))
+        if cached_sheet is None:
+            return None
+
+        for cached_page in cached_sheet.pages:
+            for cached_image in cached_page.images:
+                if not os.path.isfile(os.path.join(self.dir_path, cached_image.data)):
+                    return None
+
+        return cached_sheet
+
+    def get(self, cached_sheet: CachedSheet) -> List[EncodedImage | PageStrips]:
+        pages = []
+        for cached_page in cached_sheet.pages:
+            images = []
+            for cached_image in cached_page.images:
+                with open(os.path.join(self.dir_path, cached_image.data), 'rb') as image_file:
+                    images.append(EncodedImage(cached_image.size, cached_image.mode, cached_image.filter, image_file.read()))
+
+            pages.append(PageStrips(cached_page.size, images) if cached_page.strips else images[0])
+
+        self.sheets.append(cached_sheet)
+        return pages
+
+    def put(self, sheet: Sheet, pages: List[EncodedImage | PageStrips]):
+        if self.read_only:
+            return
+
+        cached_pages = []
+        for page in pages:
+            strips = isinstance(page, PageStrips)
+            images = page.strips if strips else [page]
+
+            cached_images = []
+            for image in images:
+                data_hash = hashlib.sha256(image.data).hexdigest()
+                data_path = os.path.join(self.dir_path, data_hash)
+
+                if not os.path.exists(data_path):
+                    # Write to a temporary file first so an interrupted build never leaves a partial image
+                    temporary_path = f'{data_path}.{os.getpid()}'
+                    with open(temporary_path, 'wb') as image_file:
+                        image_file.write(image.data)
+                    os.replace(temporary_path, data_path)
+
+                cached_images.append(CachedImage(size=image.size, mode=image.mode, filter=image.filter, data=data_hash))
+
+            cached_pages.append(CachedPage(size=page.size, images=cached_images, strips=strips))
+
+        self.sheets.append(CachedSheet(number=sheet.number, key=self.get_sheet_key(sheet), pages=cached_pages))
+
+    def save(self):
+        """
+        Record the sheets of this build and delete the images that no sheet uses anymore.
+
+        A partial build also keeps the sheets of the previous build that it did not write,
+        and a read only build leaves the cache as it is.
+        """
+        if self.read_only:
+            return
+
+        sheets = self.sheets
+        if self.partial:
+            sheet_numbers = {cached_sheet.number for cached_sheet in sheets}
+            sheets = sorted(
+                sheets + [cached_sheet for cached_sheet in self.previous_sheets.values() if cached_sheet.number not in sheet_numbers],
+                key=lambda cached_sheet: cached_sheet.number
+            )
+
+        manifest_path = os.path.join(self.dir_path, self.manifest_filename)
+        with open(f'{manifest_path}.{os.getpid()}', 'w') as manifest_file:
+            manifest_file.write(BuildManifest(sheets=sheets).model_dump_json(indent=4))
+        os.replace(f'{manifest_path}.{os.getpid()}', manifest_path)
+
+        used_files = {cached_image.data for cached_sheet in sheets for cached_page in cached_sheet.pages for cached_image in cached_page.images}
+        for entry in os.scandir(self.dir_path):
+            if entry.name != self.manifest_filename and entry.name not in used_files:
+                os.remove(entry.path)
+
+def load_layouts() -> Layouts:
+    with open(layouts_path, 'r') as layouts_file:
+        try:
+            layouts_data = json.load(layouts_file)
+            return Layouts(**layouts_data)
+
+        except ValidationErr as e:
+            raise Exception(f'Cannot parse layouts.json: {e}.')
+
+def create_sheet_renderer(options: PdfOptions, open_back: bool = True) -> SheetRenderer:
+    """
+    Load the layout of the paper and card size and prepare a renderer for the options.
+
+    Without `open_back`, the back image is not opened, so the renderer can only plan sheets.
+    """
+    # Vector pages are only laid out, so they are not drawn in strips or by workers
+    if options.vector:
+        if options.strip_height > 0:
+            raise Exception('Cannot draw vector pages in strips.')
+
+        if options.workers > 1:
+            raise Exception('Cannot lay out vector pages with workers.')
+
+    layouts = load_layouts()
+
+    card_size = options.card_size
+    paper_size = options.paper_size
+
+    # paper_layout represents the size of a paper and all possible card layouts
+    if paper_size not in layouts.paper_layouts:
+        raise Exception(f'Unsupported paper size "{paper_size}".')
+    paper_layout = layouts.paper_layouts[paper_size]
+
+    # card_layout_size represents the size of a card
+    if card_size not in layouts.card_sizes:
+        raise Exception(f'Unsupported card size "{card_size}". Try card sizes: {paper_layout.card_layouts.keys()}.')
+    card_layout_size = layouts.card_sizes[card_size]
+
+    # card_layout represents the position of cards
+    if card_size not in paper_layout.card_layouts:
+        raise Exception(f'Unsupported card size "{card_size}" with paper size "{paper_size}". Try card sizes: {paper_layout.card_layouts.keys()}.')
+    card_layout = paper_layout.card_layouts[card_size]
+
+    # Determine the amount of x and y crop
+    crop = parse_crop_string(options.crop, card_layout_size.width, card_layout_size.height)
+    crop_backs = parse_crop_string(options.crop_backs, card_layout_size.width, card_layout_size.height)
+
+    num_rows = len(card_layout.y_pos)
+    num_cols = len(card_layout.x_pos)
+    num_cards = num_rows * num_cols
+
+    # Check skip indices
+    # You can only skip valid indices (within the max card count per page)
+    clean_skip_indices = [n for n in options.skip if n < num_cards]
+    ignore_skip_indices = [n for n in options.skip if n >= num_cards]
+
+    if len(ignore_skip_indices) > 0:
+        print(f'Ignoring skip indices that are outside range 0-{num_cards - 1}: {ignore_skip_indices}')
+
+    # If all possible cards are skipped, this may result in an infinite loop
+    if len(clean_skip_indices) == num_cards:
+        raise Exception(f'You cannot skip all cards per page')
+
+    registration_rects = get_registration_rects(paper_layout, layouts.registration_marks, options.registration)
+
+    # The baseline PPI is 300
+    ppi_ratio = options.ppi / 300
+
+    max_print_bleed = calculate_max_print_bleed(card_layout.x_pos, card_layout.y_pos, card_layout_size.width, card_layout_size.height)
+
+    # Load the single back image once for reuse
+    # Without a back image, the back pages only have registration marks
+    single_back_image = None
+    if open_back and not options.only_fronts and options.back is not None:
+        single_back_image = open_card_image(options.back, 'back')
+
+    return SheetRenderer(
+        registration_rects,
+        single_back_image,
+        paper_layout,
+        card_layout,
+        card_layout_size,
+        max_print_bleed,
+        crop,
+        crop_backs,
+        ppi_ratio,
+        options.extend_corners,
+        clean_skip_indices,
+        options.only_fronts,
+        resample=options.resample,
+        disk_tile_cache=DiskTileCache(tile_cache_directory, tile_cache_max_bytes) if options.tile_cache else None,
+        name=options.name,
+        strip_height=options.strip_height,
+        vector=options.vector,
+        offset=options.offset
+    )
+
+def plan_renderer_sheets(renderer: SheetRenderer, cards: Iterable[CardRecord]) -> Iterator[Sheet]:
+    return plan_card_sheets(
+        cards,
+        renderer.num_cards,
+        renderer.skip_indices,
+        renderer.only_fronts,
+        renderer.card_layout_size.width,
+        renderer.card_layout_size.height
+    )
+
+class SheetPlan(BaseModel):
+    """
+    Which card goes in which slot of which sheet, and where the slots are on the pages.
+
+    Positions are the top left corners of the cards, without print bleed, in pixels at the output PPI.
+    The pages are rendered from this plan, so it always matches the output.
+    """
+    paper_size: PaperSize
+    card_size: CardSize
+    template: str
+    ppi: int
+    page_size: tuple[int, int]
+    card_pixel_size: tuple[int, int]
+    print_bleed: tuple[int, int]
+    front_positions: List[tuple[int, int]]
+    back_positions: List[tuple[int, int]]
+    sheets: List[Sheet]
+
+def create_sheet_plan(renderer: SheetRenderer, options: PdfOptions, sheets: List[Sheet]) -> SheetPlan:
+    def get_positions(flip: bool) -> List[tuple[int, int]]:
+        return [
+            get_card_position(
+                i,
+                len(renderer.card_layout.y_pos),
+                len(renderer.card_layout.x_pos),
+                renderer.card_layout.x_pos,
+                renderer.card_layout.y_pos,
+                renderer.ppi_ratio,
+                flip
+            )
+            for i in range(renderer.num_cards)
+        ]
+
+    return SheetPlan(
+        paper_size=options.paper_size,
+        card_size=options.card_size,
+        template=renderer.card_layout.template,
+        ppi=options.ppi,
+        page_size=renderer.page_size,
+        card_pixel_size=(math.floor(renderer.card_layout_size.width * renderer.ppi_ratio), math.floor(renderer.card_layout_size.height * renderer.ppi_ratio)),
+        print_bleed=(math.ceil(renderer.print_bleed[0] * renderer.ppi_ratio), math.ceil(renderer.print_bleed[1] * renderer.ppi_ratio)),
+        front_positions=get_positions(flip=False),
+        back_positions=get_positions(flip=True),
+        sheets=sheets
+    )
+
+def write_sheets(renderer: SheetRenderer, sheets: Iterable[Sheet], options: PdfOptions, page_sink: PageSink, build_cache: BuildCache | None = None) -> int:
+    """
+    Render sheets in order and add their pages to `page_sink`. Returns the number of sheets.
+
+    With a `build_cache`, the pages of unchanged sheets are taken from the cache instead of being rendered.
+    """
+    if options.vector and not isinstance(page_sink, PdfPageWriter):
+        raise Exception('Vector pages can only be written to a PDF.')
+
+    # Worker processes send back pages that are ready to be written
+    page_encoder = None
+    page_filter = getattr(page_sink, 'page_filter', None)
+    if options.workers > 1 and page_filter is not None:
+        page_encoder = functools.partial(encode_page, filter=page_filter, quality=options.quality)
+
+    # Workers cannot send back strips that are not drawn yet
+    if options.workers > 1 and options.strip_height > 0 and page_encoder is None:
+        raise Exception('Cannot draw pages in strips with workers unless the page sink has a page filter.')
+
+    # Vector pages share their card images, so they cannot be cached one sheet at a time
+    if build_cache is not None and (options.vector or page_filter is None):
+        raise Exception('Only encoded raster pages can be cached between builds.')
+
+    def get_sheet_pages() -> Iterator[tuple[Sheet, Any, Any, bool]]:
+        if build_cache is None:
+            for sheet, front_page, back_page in render_sheets(renderer, sheets, options.workers, options.prefetch, page_encoder):
+                yield sheet, front_page, back_page, False
+            return
+
+        # Only find the unchanged sheets here, and read their pages when they are written
+        all_sheets = list(sheets)
+        cached_sheets = {sheet.number: build_cache.find(sheet) for sheet in all_sheets}
+        changed_sheets = [sheet for sheet in all_sheets if cached_sheets[sheet.number] is None]
+        print(f'Reusing {len(all_sheets) - len(changed_sheets)} unchanged sheets, rendering {len(changed_sheets)} sheets')
+
+        rendered_sheets = render_sheets(renderer, changed_sheets, options.workers, options.prefetch, page_encoder)
+        for sheet in all_sheets:
+            cached_sheet = cached_sheets[sheet.number]
+            if cached_sheet is None:
+                yield *next(rendered_sheets), False
+            else:
+                pages = build_cache.get(cached_sheet)
+                yield sheet, pages[0], pages[1] if len(pages) > 1 else None, True
+
+    # Create card layout
+    num_sheets = 0
+    num_image = 1
+    encoded_shared_back_page = None
+    for sheet, front_page, back_page, cached in get_sheet_pages():
+        for slot in sheet.slots:
+            if slot is None:
+                continue
+
+            print(f'Image {num_image}: {slot.name}')
+            num_image += 1
+
+        # Encode the shared back page once and reuse it, instead of letting the page sink encode it for every sheet
+        if back_page is not None and back_page is renderer.shared_back_page and page_filter is not None:
+            if encoded_shared_back_page is None:
+                encoded_shared_back_page = encode_page(back_page, page_filter, options.quality)
+            back_page = encoded_shared_back_page
+
+        if build_cache is not None and not cached:
+            # Encode the pages here if the workers did not, such as when there were too few sheets to start them
+            pages = [encode_page(page, page_filter, options.quality) for page in (front_page, back_page) if page is not None]
+
+            build_cache.put(sheet, pages)
+            front_page, back_page = pages[0], pages[1] if len(pages) > 1 else None
+
+        # Add a back page for every front page template
+        page_sink.add_page(front_page)
+        if back_page is not None:
+            page_sink.add_page(back_page)
+
+        num_sheets += 1
+
+    return num_sheets
+
+def render_cards(cards: Iterable[CardRecord], options: PdfOptions, page_sink: PageSink) -> int:
+    """
+    Render cards into pages and add the pages to `page_sink`, such as a `PdfPageWriter`. Returns the number of sheets.
+
+    Cards are taken from `cards` one sheet at a time, so they can come from a generator that is still producing them.
+    """
+    renderer = create_sheet_renderer(options)
+    return write_sheets(renderer, plan_renderer_sheets(renderer, cards), options, page_sink)
+
+def generate_pdf(
+    front_dir_path: str,
+    back_dir_path: str,
+    ds_dir_path: str,
+    output_path: str,
+    output_images: bool,
+    card_size: CardSize,
+    paper_size: PaperSize,
+    registration: Registration,
+    only_fronts: bool,
+    crop_string: str | None,
+    crop_backs_string: str | None,
+    extend_corners: int,
+    ppi: int,
+    quality: int,
+    skip_indices: List[int],
+    load_offset: bool,
+    name: str,
+    workers: int = 1,
+    tile_cache: bool = False,
+    resample: Resample = Resample.STANDARD,
+    prefetch: int = 2,
+    strip_height: int = 0,
+    vector: bool = False,
+    shard_string: str | None = None,
+    manifest_path: str | None = None,
+    incremental: bool = False,
+    sheets_string: str | None = None,
+    card_patterns: List[str] = [],
+    repack: bool = False,
+    plan_path: str | None = None
+):
+    # A manifest replaces the front and double-sided image directories
+    manifest_cards = None
+    if manifest_path is not None:
+        if not os.path.isfile(manifest_path):
+            raise Exception(f'Manifest path "{manifest_path}" is invalid.')
+
+        manifest_cards = load_manifest(manifest_path)
+
+    # Sanity checks for the different directories, which can also be in archives
+    if manifest_cards is None and not image_directory_exists(front_dir_path):
+        raise Exception(f'Front image directory path "{front_dir_path}" is invalid.')
+
+    if not image_directory_exists(back_dir_path):
+        raise Exception(f'Back image directory path "{back_dir_path}" is invalid.')
+
+    if manifest_cards is None and not image_directory_exists(ds_dir_path):
+        raise Exception(f'Double-sided image directory path "{ds_dir_path}" is invalid.')
+
+    # Delete hidden files that may affect image fetching
+    delete_hidden_files_in_directory(back_dir_path)
+    if manifest_cards is None:
+        delete_hidden_files_in_directory(front_dir_path)
+        delete_hidden_files_in_directory(ds_dir_path)
+
+    # Vector pages are only laid out, so they need a PDF and are not drawn in strips or by workers
+    if vector:
+        if output_images:
+            raise Exception('Cannot use "--vector" with "--output_images".')
+
+        if strip_height > 0:
+            raise Exception('Cannot use "--vector" with "--strip_height".')
+
+        if workers > 1:
+            raise Exception('Cannot use "--vector" with "--workers".')
+
+        if incremental:
+            raise Exception('Cannot use "--vector" with "--incremental".')
+
+    # Sanity check for output images, which are not written when only the plan is needed
+    if plan_path is None:
+        if output_images:
+            output_path = get_directory(output_path)
+        elif not output_path.lower().endswith(".pdf"):
+            raise Exception(f'Cannot save PDF to output path "{output_path}" because it is not a valid PDF file path.')
+
+    # Get the back image, if it exists and the pages are rendered
+    back_card_image_path = None
+    if not only_fronts and plan_path is None:
+        back_card_image_path = get_back_card_image_path(back_dir_path)
+        if back_card_image_path is None:
+            print(f'No back image provided in back image directory \"{back_dir_path}\". Using default instead.')
+
+    if manifest_cards is None:
+        front_image_filenames = get_image_file_paths(front_dir_path)
+        ds_image_filenames = get_image_file_paths(ds_dir_path)
+
+        # Check if double-sided back images has matching front images
+        front_set = set(front_image_filenames)
+        ds_set = set(ds_image_filenames)
+        diff = check_paths_subset(ds_set, front_set)
+        if len(diff) > 0:
+            raise Exception(f'Double-sided backs "{ds_set - front_set}" do not have matching fronts. Add the missing fronts to front image directory "{front_dir_path}".')
+
+        if only_fronts:
+            if len(ds_set) > 0:
+                raise Exception(f'Cannot use "--only_fronts" with double-sided cards. Remove cards from double-side image directory "{ds_dir_path}".')
+
+    # Load saved offset if available
+    saved_offset = None
+    if load_offset:
+        saved_offset = load_saved_offset()
+
+        if saved_offset is None:
+            print('Offset cannot be applied')
+        else:
+            print(f'Loaded x offset: {saved_offset.x_offset}, y offset: {saved_offset.y_offset}, angle offset: {saved_offset.angle_offset}')
+
+    options = PdfOptions(
+        card_size=card_size,
+        paper_size=paper_size,
+        registration=registration,
+        only_fronts=only_fronts,
+        crop=crop_string,
+        crop_backs=crop_backs_string,
+        extend_corners=extend_corners,
+        ppi=ppi,
+        quality=quality,
+        skip=list(skip_indices),
+        name=name,
+        back=back_card_image_path,
+        offset=saved_offset,
+        workers=workers,
+        tile_cache=tile_cache,
+        resample=resample,
+        prefetch=prefetch,
+        strip_height=strip_height,
+        vector=vector
+    )
+
+    shard = parse_shard_string(shard_string)
+    sheet_numbers = parse_sheets_string(sheets_string)
+
+    # Stop before loading any images when only the plan is needed
+    renderer = create_sheet_renderer(options, open_back=plan_path is None)
+
+    if manifest_cards is None:
+        cards = get_directory_cards(front_dir_path, ds_dir_path, front_set, ds_set, only_fronts)
+    else:
+        cards = manifest_cards
+
+    # Assign every card to a sheet before loading any images
+    sheets = list(plan_renderer_sheets(renderer, cards))
+
+    # Only render the requested sheets and cards of the full plan, so they keep their places
+    if sheet_numbers is not None or len(card_patterns) > 0 or repack:
+        sheets = select_sheets(sheets, sheet_numbers, list(card_patterns), repack, renderer.num_cards, renderer.skip_indices)
+
+    # Only render the sheets of the shard, keeping their sheet numbers
+    shard_info = None
+    if shard is not None:
+        shard_index, shard_count = shard
+        sheets = get_shard_sheets(sheets, shard_index, shard_count)
+
+        if len(sheets) > 0:
+            shard_info = ShardInfo(shard_index, shard_count, sheets[0].number, sheets[-1].number)
+            print(f'Rendering shard {shard_index}/{shard_count}: sheets {shard_info.first_sheet}-{shard_info.last_sheet}')
+
+    plan = create_sheet_plan(renderer, options, sheets)
+
+    if plan_path is not None:
+        with open(plan_path, 'w') as plan_file:
+            plan_file.write(plan.model_dump_json(indent=4))
+
+        pages_per_sheet = 1 if only_fronts else 2
+        print(f'Planned {len(plan.sheets)} sheets ({len(plan.sheets) * pages_per_sheet} pages) of {paper_size} paper: {plan_path}')
+        return
+
+    if len(plan.sheets) == 0:
+        print('No pages were generated')
+        return
+
+    # Pages are written as soon as they are rendered
+    if output_images:
+        # Number the images of a shard as they would be numbered without shards
+        pages_per_sheet = 1 if only_fronts else 2
+        page_writer = ImagePageWriter(output_path, math.floor(300 * renderer.ppi_ratio), quality, first_page=(plan.sheets[0].number - 1) * pages_per_sheet + 1)
+    else:
+        keywords = format_shard_keywords(shard_info) if shard_info is not None else None
+        page_writer = PdfPageWriter(output_path, math.floor(300 * renderer.ppi_ratio), quality, keywords)
+
+    # Keep the encoded pages next to the output so the next build can reuse unchanged sheets
+    build_cache = None
+    if incremental:
+        if output_images:
+            build_cache_path = os.path.join(output_path, 'build')
+        else:
+            build_cache_path = f'{os.path.splitext(output_path)[0]}.build'
+
+        # Selected sheets and shards only replace their own sheets in the cache, and repacked sheets are numbered
+        # from 1 again, so they would replace the cached pages of other sheets
+        partial = sheet_numbers is not None or len(card_patterns) > 0 or shard is not None
+        build_cache = BuildCache(build_cache_path, renderer, options, page_writer.page_filter, partial, read_only=repack)
+
+    with page_writer:
+        write_sheets(renderer, plan.sheets, options, page_writer, build_cache)
+
+    if build_cache is not None:
+        build_cache.save()
+
+    if output_images:
+        print(f'Generated images: {output_path}')
+    else:
+        print(f'Generated PDF: {output_path}')
+
+def save_offset(x_offset: float, y_offset: float, angle_offset: float = 0.0) -> None:
     # Create the directory if it doesn't exist
     os.makedirs('data', exist_ok=True)
 
@@ -752,24 +2998,166 @@ def load_saved_offset() -> OffsetData:
 
     return None
 
-def offset_images(images: List[Image.Image], x_offset: int, y_offset: int, ppi: int, angle_offset: float = 0.0) -> List[Image.Image]:
-    result_images = []
-
-    add_offset = False
-    for image in images:
-        if add_offset:
-            result = ImageChops.offset(image, math.floor(x_offset * ppi / 300), math.floor(y_offset * ppi / 300))
-            # Apply angle rotation if specified
-            # Negative angle because PIL rotates counter-clockwise, but we want positive = clockwise
-            if angle_offset != 0.0:
-                result = result.rotate(-angle_offset, center=(image.width / 2, image.height / 2), fillcolor='white')
-            result_images.append(result)
-        else:
-            result_images.append(image)
+def offset_image(image: Image.Image, x_offset: float, y_offset: float, ppi: int, angle_offset: float = 0.0) -> Image.Image:
+    result = ImageChops.offset(image, math.floor(x_offset * ppi / 300), math.floor(y_offset * ppi / 300))
+    # Apply angle rotation if specified
+    # Negative angle because PIL rotates counter-clockwise, but we want positive = clockwise
+    if angle_offset != 0.0:
+        result = result.rotate(-angle_offset, center=(image.width / 2, image.height / 2), fillcolor='white')
 
-        add_offset = not add_offset
+    return result
+
+def get_offset_matrix(page_width: float, page_height: float, x_offset: float, y_offset: float, angle_offset: float = 0.0) -> tuple[float, float, float, float, float, float]:
+    """
+    Get the PDF transform that matches offset_image() for a page of the given size in points.
 
-    return result_images
+    Offsets are in pixels at 300 PPI with y pointing down, and positive angles rotate clockwise about the page center.
+    """
+    angle = math.radians(angle_offset)
+    cos, sin = math.cos(angle), math.sin(angle)
+    center_x, center_y = page_width / 2, page_height / 2
+
+    # Move by the offset, then rotate about the page center
+    move_x = x_offset * 72 / 300 - center_x
+    move_y = -y_offset * 72 / 300 - center_y
+    return (cos, -sin, sin, cos, move_x * cos + move_y * sin + center_x, -move_x * sin + move_y * cos + center_y)
+
+def get_offset_card_box(size: tuple[int, int], x: int, y: int, page_size: tuple[int, int], x_offset: float, y_offset: float, angle_offset: float = 0.0) -> tuple[int, int, int, int]:
+    """
+    Find the (left, top, right, bottom) area that offset_card_image() places an image of the given size in.
+    """
+    width, height = size
+    if angle_offset == 0.0:
+        left, top = x + math.floor(x_offset), y + math.floor(y_offset)
+        return left, top, left + width, top + height
+
+    angle = math.radians(angle_offset)
+    cos, sin = math.cos(angle), math.sin(angle)
+    center_x, center_y = page_size[0] / 2, page_size[1] / 2
+
+    # Where the corners of the image end up, to find the area the rotated image covers
+    corners = []
+    for corner_x, corner_y in ((0, 0), (width, 0), (0, height), (width, height)):
+        move_x = x + corner_x + x_offset - center_x
+        move_y = y + corner_y + y_offset - center_y
+        corners.append((center_x + move_x * cos - move_y * sin, center_y + move_x * sin + move_y * cos))
+
+    return (
+        math.floor(min(corner_x for corner_x, _ in corners)),
+        math.floor(min(corner_y for _, corner_y in corners)),
+        math.ceil(max(corner_x for corner_x, _ in corners)),
+        math.ceil(max(corner_y for _, corner_y in corners))
+    )
+
+def offset_card_image(image: Image.Image, x: int, y: int, page_size: tuple[int, int], x_offset: float, y_offset: float, angle_offset: float = 0.0) -> tuple[Image.Image, int, int, Image.Image | None]:
+    """
+    Move an image that is placed at (x, y) on a page like offset_image() would move the whole page.
+    Offsets are in pixels at the resolution of the page.
+
+    Returns the image, its new position and the mask to paste it with. Rotated images have transparent corners.
+    """
+    if angle_offset == 0.0:
+        return image, x + math.floor(x_offset), y + math.floor(y_offset), None
+
+    angle = math.radians(angle_offset)
+    cos, sin = math.cos(angle), math.sin(angle)
+    center_x, center_y = page_size[0] / 2, page_size[1] / 2
+    left, top, right, bottom = get_offset_card_box(image.size, x, y, page_size, x_offset, y_offset, angle_offset)
+
+    # The transform maps every pixel of the covered area back to the image
+    move_x = left - center_x
+    move_y = top - center_y
+    inverse = (
+        cos, sin, move_x * cos + move_y * sin + center_x - x - x_offset,
+        -sin, cos, -move_x * sin + move_y * cos + center_y - y - y_offset
+    )
+
+    # Nearest neighbor, like the rotation in offset_image(), so the mask has no soft edges to blend
+    size = (right - left, bottom - top)
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    rotated_image = image.transform(size, Image.Transform.AFFINE, inverse, resample=Image.Resampling.NEAREST)
+    mask = Image.new('L', image.size, 255).transform(size, Image.Transform.AFFINE, inverse, resample=Image.Resampling.NEAREST)
+
+    return rotated_image, left, top, mask
+
+class CalibrationSquare(NamedTuple):
+    """
+    A square of the calibration grid. Positions are of the top left corner on the front page, in pixels at 300 PPI.
+    """
+    x: float
+    y: float
+    # How far the square is moved on the back page, which is also its label
+    x_offset: float
+    y_offset: float
+    # The squares of the middle row and column are blue
+    center: bool
+    # How many squares the square is from the middle column and row
+    column: int
+    row: int
+
+class CalibrationGrid(NamedTuple):
+    size: tuple[int, int]
+    square_size: int
+    columns: int
+    rows: int
+    squares: List[CalibrationSquare]
+
+def get_calibration_page_size(paper_size: PaperSize) -> tuple[int, int]:
+    """
+    Get the landscape size of the calibration sheet of a paper size, in pixels at 300 PPI.
+    """
+    paper_layout = load_layouts().paper_layouts[paper_size]
+    return max(paper_layout.width, paper_layout.height), min(paper_layout.width, paper_layout.height)
+
+def get_calibration_grid(page_width: int, page_height: int, square_size: int = 25, square_distance: int = 75, step: float = 1, ppi: int = 300) -> CalibrationGrid:
+    """
+    Lay out the squares of a calibration sheet on a landscape page. The grid is centered on the page,
+    and every square on the back page is moved by `step` more pixels than its neighbor towards the edges.
+
+    Squares are placed on whole dots of a printer with the given PPI, so `step` must be a whole number of dots.
+    """
+    step_dots = step * ppi / 300
+    if step_dots < 1 or abs(step_dots - round(step_dots)) > 1e-6:
+        raise Exception(f'step must be a whole number of printer dots; received: {step:g} pixels at 300 PPI, which is {step_dots:g} dots at {ppi} PPI')
+
+    def snap_to_dot(position: float) -> float:
+        return math.floor(position * ppi / 300 + 0.5) * 300 / ppi
+
+    square_spacing = square_size + square_distance
+
+    def get_axis(page_length: int) -> tuple[int, float]:
+        matrix_size = math.floor(page_length / square_spacing) - 6
+        if matrix_size <= 0:
+            raise Exception(f'matrix_size must be greater than 0; received: {matrix_size}')
+
+        matrix_half_size = math.floor(matrix_size / 2)
+        if matrix_size % 2 > 0:
+            start = math.floor(page_length / 2) - (matrix_half_size * square_distance) - ((matrix_half_size + .5) * square_size)
+        else:
+            start = math.floor(page_length / 2) - ((matrix_half_size - .5) * square_distance) - (matrix_half_size * square_size)
+
+        return matrix_size, start
+
+    columns, start_x = get_axis(page_width)
+    rows, start_y = get_axis(page_height)
+
+    squares = []
+    for x_index in range(columns):
+        for y_index in range(rows):
+            column = x_index - columns // 2
+            row = y_index - rows // 2
+            squares.append(CalibrationSquare(
+                snap_to_dot(start_x + x_index * square_spacing),
+                snap_to_dot(start_y + y_index * square_spacing),
+                column * step,
+                row * step,
+                column == 0 or row == 0,
+                column,
+                row
+            ))
+
+    return CalibrationGrid((page_width, page_height), square_size, columns, rows, squares)
 
 def calculate_max_print_bleed(x_pos: List[int], y_pos: List[int], width: int, height: int) -> tuple[int, int]:
     if len(x_pos) == 1 & len(y_pos) == 1: